@@ -1,57 +1,74 @@
 from datetime import date
 
-from fastapi import FastAPI, HTTPException
-from sqlalchemy import func
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import Response
+from sqlalchemy import Select, func, select
 
-from shared.db_connection import get_session
-from shared.db_models import ProductsModel
+from api.responses import FastJSONResponse
+from api.schemas import (
+    DailyCountrySalesSchema,
+    DailySalesSchema,
+    DailySkuSalesSchema,
+    OrderSchema,
+    ProductSchema,
+    UserSchema,
+    schema_columns,
+)
+from api.streaming import JSON_MEDIA_TYPE, negotiate_media_type, stream_rows
+from shared.db_connection import get_pool_metrics, get_read_session
+from shared.db_models import (
+    DailyCountrySalesModel,
+    DailySalesModel,
+    DailySkuSalesModel,
+    OrdersModel,
+    ProductsModel,
+    UsersModel,
+)
 from shared.logger import get_logger
 
 log = get_logger(__name__)
 
-app = FastAPI(title="Fake Ecommerce Data")
+app = FastAPI(title="Fake Ecommerce Data", default_response_class=FastJSONResponse)
 
+MAX_LIMIT = 100_000
 
-@app.get("/")
-def root() -> dict:
-    return {"message": "Welcome to the Fake Ecommerce Data API"}
 
-
-@app.get("/products")
-def get_products(date_updated: date | None = None) -> list[dict] | dict:
+def _query_response(
+    statement: Select,
+    schema: type,
+    accept: str | None,
+    not_found_detail: str,
+    *,
+    stream: bool = False,
+) -> Response:
     """
-    Retrieve products based on the date they were updated.
+    Execute a select statement and build the response negotiated by the Accept header.
+
+    JSON responses are built from the row tuples with the response schema and rendered with orjson, or streamed as
+    a JSON array if stream is set. NDJSON and CSV responses are always streamed from a server side cursor.
+
+    Args:
+        statement (Select): The select statement, its columns in the same order as the schema fields.
+        schema (type): The response schema dataclass.
+        accept (str | None): The raw Accept header value.
+        not_found_detail (str): The error detail returned when no rows match.
+        stream (bool): Whether to stream JSON responses too, for tables whose results can be large.
+
+    Raises:
+        HTTPException: 404 if no rows match, 500 on database errors.
+
+    Returns:
+        Response: The JSON or streaming response.
 
-    - **date_updated**: Optional date query string in the format YYYY-MM-DD.
     """
     try:
-        with get_session() as db:
-            query_result = db.query(
-                ProductsModel.item_sku,
-                ProductsModel.item_price,
-                ProductsModel.release_date,
-                ProductsModel.date_created,
-                ProductsModel.date_updated,
-                ProductsModel.active,
-            )
-
-            if date_updated:
-                query_result = query_result.filter(
-                    func.date(ProductsModel.date_updated) == date_updated,
-                )
-
-            products_rows = query_result.all()
-            if not products_rows:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"No products found matching date_updated={date_updated}.",
-                )
-
-            products_as_dict = [row._asdict() for row in products_rows]
-            return products_as_dict
-
-    except HTTPException:
-        raise
+        media_type = negotiate_media_type(accept) or (JSON_MEDIA_TYPE if stream else None)
+        if media_type:
+            response = stream_rows(statement, media_type)
+        else:
+            with get_read_session() as db:
+                rows = db.execute(statement).all()
+            response = FastJSONResponse([schema(*row) for row in rows]) if rows else None
 
     except Exception:
         log.exception("Database error")
@@ -59,3 +76,244 @@ def get_products(date_updated: date | None = None) -> list[dict] | dict:
             status_code=500,
             detail="Internal server error. Please try again later.",
         )
+
+    if response is None:
+        raise HTTPException(status_code=404, detail=not_found_detail)
+    return response
+
+
+def _filter_sales_dates(statement: Select, model: type, start_date: date | None, end_date: date | None) -> Select:
+    """
+    Restrict a daily sales summary query to an inclusive date range, ordered by date.
+
+    Args:
+        statement (Select): The select statement.
+        model (type): The summary table model.
+        start_date (date | None): Start date (inclusive).
+        end_date (date | None): End date (inclusive).
+
+    Returns:
+        Select: The filtered and ordered select statement.
+
+    """
+    if start_date:
+        statement = statement.where(model.sales_date >= start_date)
+    if end_date:
+        statement = statement.where(model.sales_date <= end_date)
+    return statement.order_by(model.sales_date)
+
+
+def _filter_created_dates(
+    statement: Select,
+    model: type,
+    start_date: date | None,
+    end_date: date | None,
+    limit: int | None,
+) -> Select:
+    """
+    Restrict an orders or users query to an inclusive creation date range and/or a number of rows.
+
+    Both tables grow with every generated day, so either a complete date range or a limit is required.
+
+    Args:
+        statement (Select): The select statement.
+        model (type): The table model, with a date_created column.
+        start_date (date | None): Start date (inclusive).
+        end_date (date | None): End date (inclusive).
+        limit (int | None): Maximum number of rows.
+
+    Raises:
+        HTTPException: 400 if neither both dates nor a limit are given.
+
+    Returns:
+        Select: The filtered and limited select statement.
+
+    """
+    if limit is None and (start_date is None or end_date is None):
+        raise HTTPException(status_code=400, detail="Pass both start_date and end_date, or limit.")
+
+    if start_date:
+        statement = statement.where(func.date(model.date_created) >= start_date)
+    if end_date:
+        statement = statement.where(func.date(model.date_created) <= end_date)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+@app.get("/")
+def root() -> dict:
+    return {"message": "Welcome to the Fake Ecommerce Data API"}
+
+
+@app.get("/health/pool")
+def get_pool_health() -> dict:
+    """
+    Report the database connection pool's usage.
+
+    Returns the pool size, the connections checked in, checked out and in overflow, and how long checkouts have
+    waited for a connection. Waits that grow with load mean the pool is too small for the request concurrency.
+    """
+    return get_pool_metrics()
+
+
+@app.get("/products", response_model=list[ProductSchema])
+def get_products(
+    date_updated: date | None = None,
+    accept: str | None = Header(default=None),
+) -> Response:
+    """
+    Retrieve products based on the date they were updated.
+
+    - **date_updated**: Optional date query string in the format YYYY-MM-DD.
+
+    Send `Accept: application/x-ndjson` or `Accept: text/csv` to stream the result instead of returning a JSON array.
+    """
+    statement = select(*schema_columns(ProductSchema, ProductsModel))
+
+    if date_updated:
+        statement = statement.where(
+            func.date(ProductsModel.date_updated) == date_updated,
+        )
+
+    return _query_response(
+        statement,
+        ProductSchema,
+        accept,
+        f"No products found matching date_updated={date_updated}.",
+    )
+
+
+@app.get("/orders", response_model=list[OrderSchema])
+def get_orders(
+    start_date: date | None = None,
+    end_date: date | None = None,
+    limit: int | None = Query(default=None, ge=1, le=MAX_LIMIT),
+    accept: str | None = Header(default=None),
+) -> Response:
+    """
+    Retrieve order lines created within a date range, ordered by order line ID.
+
+    - **start_date**: Start date (inclusive) in the format YYYY-MM-DD.
+    - **end_date**: End date (inclusive) in the format YYYY-MM-DD.
+    - **limit**: Maximum number of order lines, up to 100,000.
+
+    Pass both dates, a limit, or both. The result is streamed from a server side cursor.
+    Send `Accept: application/x-ndjson` or `Accept: text/csv` to stream NDJSON or CSV instead of a JSON array.
+    """
+    statement = select(*schema_columns(OrderSchema, OrdersModel)).order_by(OrdersModel.order_line_id)
+    statement = _filter_created_dates(statement, OrdersModel, start_date, end_date, limit)
+
+    return _query_response(
+        statement,
+        OrderSchema,
+        accept,
+        f"No orders found between start_date={start_date} and end_date={end_date}.",
+        stream=True,
+    )
+
+
+@app.get("/users", response_model=list[UserSchema])
+def get_users(
+    start_date: date | None = None,
+    end_date: date | None = None,
+    limit: int | None = Query(default=None, ge=1, le=MAX_LIMIT),
+    accept: str | None = Header(default=None),
+) -> Response:
+    """
+    Retrieve users created within a date range, ordered by user ID.
+
+    - **start_date**: Start date (inclusive) in the format YYYY-MM-DD.
+    - **end_date**: End date (inclusive) in the format YYYY-MM-DD.
+    - **limit**: Maximum number of users, up to 100,000.
+
+    Pass both dates, a limit, or both. The result is streamed from a server side cursor.
+    Send `Accept: application/x-ndjson` or `Accept: text/csv` to stream NDJSON or CSV instead of a JSON array.
+    """
+    statement = select(*schema_columns(UserSchema, UsersModel)).order_by(UsersModel.user_id)
+    statement = _filter_created_dates(statement, UsersModel, start_date, end_date, limit)
+
+    return _query_response(
+        statement,
+        UserSchema,
+        accept,
+        f"No users found between start_date={start_date} and end_date={end_date}.",
+        stream=True,
+    )
+
+
+@app.get("/sales/daily", response_model=list[DailySalesSchema])
+def get_daily_sales(
+    start_date: date | None = None,
+    end_date: date | None = None,
+    accept: str | None = Header(default=None),
+) -> Response:
+    """
+    Retrieve daily sales totals: orders, order lines, units, revenue and new vs returning customers.
+
+    - **start_date**: Optional start date (inclusive) in the format YYYY-MM-DD.
+    - **end_date**: Optional end date (inclusive) in the format YYYY-MM-DD.
+    """
+    statement = select(*schema_columns(DailySalesSchema, DailySalesModel))
+    statement = _filter_sales_dates(statement, DailySalesModel, start_date, end_date)
+
+    return _query_response(
+        statement,
+        DailySalesSchema,
+        accept,
+        f"No daily sales found between start_date={start_date} and end_date={end_date}.",
+    )
+
+
+@app.get("/sales/daily/skus", response_model=list[DailySkuSalesSchema])
+def get_daily_sku_sales(
+    start_date: date | None = None,
+    end_date: date | None = None,
+    item_sku: str | None = None,
+    accept: str | None = Header(default=None),
+) -> Response:
+    """
+    Retrieve daily sales totals per product SKU.
+
+    - **start_date**: Optional start date (inclusive) in the format YYYY-MM-DD.
+    - **end_date**: Optional end date (inclusive) in the format YYYY-MM-DD.
+    - **item_sku**: Optional product SKU.
+    """
+    statement = select(*schema_columns(DailySkuSalesSchema, DailySkuSalesModel))
+    if item_sku:
+        statement = statement.where(DailySkuSalesModel.item_sku == item_sku)
+    statement = _filter_sales_dates(statement, DailySkuSalesModel, start_date, end_date)
+
+    return _query_response(
+        statement,
+        DailySkuSalesSchema,
+        accept,
+        f"No daily SKU sales found between start_date={start_date} and end_date={end_date}, item_sku={item_sku}.",
+    )
+
+
+@app.get("/sales/daily/countries", response_model=list[DailyCountrySalesSchema])
+def get_daily_country_sales(
+    start_date: date | None = None,
+    end_date: date | None = None,
+    user_country: str | None = None,
+    accept: str | None = Header(default=None),
+) -> Response:
+    """
+    Retrieve daily sales totals per customer country.
+
+    - **start_date**: Optional start date (inclusive) in the format YYYY-MM-DD.
+    - **end_date**: Optional end date (inclusive) in the format YYYY-MM-DD.
+    - **user_country**: Optional customer country.
+    """
+    statement = select(*schema_columns(DailyCountrySalesSchema, DailyCountrySalesModel))
+    if user_country:
+        statement = statement.where(DailyCountrySalesModel.user_country == user_country)
+    statement = _filter_sales_dates(statement, DailyCountrySalesModel, start_date, end_date)
+
+    return _query_response(
+        statement,
+        DailyCountrySalesSchema,
+        accept,
+        f"No daily country sales found between start_date={start_date} and end_date={end_date}, user_country={user_country}.",
+    )
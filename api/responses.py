@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _orjson_default(value: object) -> object:
+    """
+    Serialise values orjson can't handle natively.
+
+    Args:
+        value (object): The value to serialise.
+
+    Raises:
+        TypeError: If the value type is not supported.
+
+    Returns:
+        object: A JSON serialisable representation of the value.
+
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    error_msg = f"Object of type {type(value).__name__} is not JSON serializable"
+    raise TypeError(error_msg)
+
+
+def dumps(content: object) -> bytes:
+    """
+    Serialise content to JSON bytes with orjson.
+
+    Dataclasses, datetimes and dates are encoded natively, Decimals are encoded as numbers.
+
+    Args:
+        content (object): The content to serialise.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON document.
+
+    """
+    return orjson.dumps(content, default=_orjson_default)
+
+
+class FastJSONResponse(JSONResponse):
+    """A JSON response rendered with orjson, bypassing jsonable_encoder and the stdlib json module."""
+
+    def render(self, content: object) -> bytes:
+        return dumps(content)
@@ -0,0 +1,82 @@
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy.orm import InstrumentedAttribute
+
+
+@dataclass(slots=True)
+class ProductSchema:
+    item_sku: str
+    item_price: Decimal
+    release_date: datetime
+    date_created: datetime
+    date_updated: datetime
+    active: bool
+
+
+@dataclass(slots=True)
+class OrderSchema:
+    order_line_id: int
+    order_id: int
+    user_id: int
+    item_sku: str
+    qty: int
+    item_price: Decimal
+    date_created: datetime
+
+
+@dataclass(slots=True)
+class UserSchema:
+    user_id: int
+    user_name: str
+    user_address: str
+    user_country: str
+    user_email: str
+    date_created: datetime
+
+
+@dataclass(slots=True)
+class DailySalesSchema:
+    sales_date: date
+    num_orders: int
+    num_order_lines: int
+    units: int
+    revenue: Decimal
+    new_customers: int
+    returning_customers: int
+
+
+@dataclass(slots=True)
+class DailySkuSalesSchema:
+    sales_date: date
+    item_sku: str
+    num_orders: int
+    units: int
+    revenue: Decimal
+
+
+@dataclass(slots=True)
+class DailyCountrySalesSchema:
+    sales_date: date
+    user_country: str
+    num_orders: int
+    units: int
+    revenue: Decimal
+
+
+def schema_columns(schema: type, model: type) -> list[InstrumentedAttribute]:
+    """
+    Get the model columns matching the fields of a response schema, in field order.
+
+    Selecting these columns lets each result row be passed positionally to the schema, schema(*row).
+
+    Args:
+        schema (type): A response schema dataclass.
+        model (type): The SQLAlchemy model to select from.
+
+    Returns:
+        list[InstrumentedAttribute]: The model columns in schema field order.
+
+    """
+    return [getattr(model, field.name) for field in fields(schema)]
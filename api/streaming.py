@@ -0,0 +1,172 @@
+import csv
+import io
+from collections.abc import Iterator
+from itertools import chain
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row, Select
+
+from api.responses import dumps
+from shared.db_connection import get_read_session
+from shared.logger import get_logger
+
+log = get_logger(__name__)
+
+JSON_MEDIA_TYPE = "application/json"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+STREAM_BATCH_SIZE = 1000
+
+_MEDIA_TYPE_ALIASES = {
+    "application/x-ndjson": NDJSON_MEDIA_TYPE,
+    "application/ndjson": NDJSON_MEDIA_TYPE,
+    "application/jsonl": NDJSON_MEDIA_TYPE,
+    "text/csv": CSV_MEDIA_TYPE,
+}
+
+
+def negotiate_media_type(accept: str | None) -> str | None:
+    """
+    Choose a streaming media type from an Accept header.
+
+    Entries are ranked by their q-value. A JSON or wildcard entry ranked at least as high as any
+    streaming type keeps the default JSON response.
+
+    Args:
+        accept (str | None): The raw Accept header value.
+
+    Returns:
+        str | None: NDJSON_MEDIA_TYPE or CSV_MEDIA_TYPE, or None for a regular JSON response.
+
+    """
+    if not accept:
+        return None
+
+    ranked = []
+    for position, entry in enumerate(accept.split(",")):
+        media_type, *params = (part.strip() for part in entry.split(";"))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        ranked.append((-quality, position, media_type.lower()))
+
+    for negative_quality, _, media_type in sorted(ranked):
+        if negative_quality == 0:
+            break
+        if media_type in _MEDIA_TYPE_ALIASES:
+            return _MEDIA_TYPE_ALIASES[media_type]
+        if media_type in ("application/json", "*/*", "application/*"):
+            return None
+    return None
+
+
+def _encode_ndjson(rows: list[Row]) -> bytes:
+    """
+    Encode a batch of rows as newline delimited JSON objects.
+
+    Args:
+        rows (list[Row]): A batch of result rows.
+
+    Returns:
+        bytes: One JSON object per line.
+
+    """
+    return b"".join(dumps(row._asdict()) + b"\n" for row in rows)
+
+
+def _encode_json(rows: list[Row]) -> bytes:
+    """
+    Encode a batch of rows as comma separated JSON objects, a slice of a JSON array.
+
+    Args:
+        rows (list[Row]): A batch of result rows.
+
+    Returns:
+        bytes: The JSON objects without the enclosing brackets.
+
+    """
+    return b",".join(dumps(row._asdict()) for row in rows)
+
+
+def _encode_csv(rows: list[Row]) -> str:
+    """
+    Encode a batch of rows as CSV lines.
+
+    Args:
+        rows (list[Row]): A batch of result rows.
+
+    Returns:
+        str: The CSV encoded rows without a header.
+
+    """
+    csv_buffer = io.StringIO()
+    writer = csv.writer(csv_buffer)
+    writer.writerows(rows)
+    return csv_buffer.getvalue()
+
+
+def _iter_partitions(statement: Select, batch_size: int) -> Iterator[list[Row]]:
+    """
+    Execute a statement with a server side cursor and yield the result in batches.
+
+    The session stays open until the iterator is exhausted or closed.
+
+    Args:
+        statement (Select): The select statement to execute.
+        batch_size (int): Number of rows fetched from the cursor per batch.
+
+    Yields:
+        list[Row]: A batch of result rows.
+
+    """
+    with get_read_session() as db:
+        result = db.execute(statement.execution_options(yield_per=batch_size))
+        yield from result.partitions()
+
+
+def stream_rows(statement: Select, media_type: str, batch_size: int = STREAM_BATCH_SIZE) -> StreamingResponse | None:
+    """
+    Build a streaming JSON array, NDJSON or CSV response for a select statement.
+
+    The first batch is fetched before the response is created so an empty result can still be reported as a 404.
+    Memory use is bounded by batch_size rather than the size of the result.
+
+    Args:
+        statement (Select): The select statement to execute.
+        media_type (str): JSON_MEDIA_TYPE, NDJSON_MEDIA_TYPE or CSV_MEDIA_TYPE.
+        batch_size (int): Number of rows fetched and encoded per chunk.
+
+    Returns:
+        StreamingResponse | None: The streaming response, or None if the statement returned no rows.
+
+    """
+    partitions = _iter_partitions(statement, batch_size)
+    first_batch = next(partitions, None)
+    if first_batch is None:
+        return None
+
+    columns = list(first_batch[0]._fields)
+
+    def body() -> Iterator[str | bytes]:
+        try:
+            if media_type == JSON_MEDIA_TYPE:
+                yield b"[" + _encode_json(first_batch)
+                for rows in partitions:
+                    yield b"," + _encode_json(rows)
+                yield b"]"
+                return
+            encode = _encode_csv if media_type == CSV_MEDIA_TYPE else _encode_ndjson
+            if media_type == CSV_MEDIA_TYPE:
+                yield _encode_csv([columns])
+            for rows in chain([first_batch], partitions):
+                yield encode(rows)
+        finally:
+            partitions.close()
+
+    log.debug("Streaming %s response with columns %s.", media_type, columns)
+    return StreamingResponse(body(), media_type=media_type)
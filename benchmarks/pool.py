@@ -0,0 +1,217 @@
+"""
+Benchmark concurrent API style readers against the generator's writer to validate the connection pool defaults.
+
+Reader threads repeatedly fetch one day's order lines through the read engine, the way the /orders endpoint does,
+while a writer thread inserts batches of order lines in transactions like the generator. Each configuration runs in
+a fresh subprocess against its own temporary SQLite database, or against --db-url. Reported per configuration:
+reads and writes per second, read latency percentiles, errors such as "database is locked", the wait statistics of
+the write and read pools, and whether the read engine rejects writes. The shared_engine configuration reads through
+the write engine, for comparison with the separate read-only engine.
+
+Usage:
+    python -m benchmarks.pool
+    python -m benchmarks.pool --readers 16 --pool_sizes 2 5 10 --duration 10
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+NUM_DAYS = 30
+WRITE_BATCH_SIZE = 500
+# SQLite's own defaults, i.e. what connect_with_sqlite() used before the pragmas were configurable.
+SQLITE_DEFAULTS = {
+    "SQLITE_JOURNAL_MODE": "DELETE",
+    "SQLITE_SYNCHRONOUS": "FULL",
+    "SQLITE_CACHE_SIZE_KB": "2000",
+    "SQLITE_MMAP_SIZE_MB": "0",
+}
+
+
+def _order_lines(start_id: int, count: int, rng: random.Random) -> list[dict]:
+    first_day = datetime(2025, 6, 1)
+    return [
+        {
+            "order_id": order_line_id // 2,
+            "user_id": rng.randint(1, 10_000),
+            "item_sku": f"BENCH-{rng.randint(1, 500):04}",
+            "qty": rng.randint(1, 3),
+            "item_price": 19.99,
+            "date_created": first_day + timedelta(seconds=rng.randrange(NUM_DAYS * 86_400)),
+        }
+        for order_line_id in range(start_id, start_id + count)
+    ]
+
+
+def run_configuration(rows: int, readers: int, duration: float) -> dict:
+    """
+    Run the readers and writer against the database configured by the environment.
+
+    Must run in its own process, the engine is created once per process from DB_URL and the pool settings.
+
+    Args:
+        rows (int): Order lines inserted before the measurement.
+        readers (int): Number of reader threads.
+        duration (float): Seconds to measure for.
+
+    Returns:
+        dict: The measured metrics and the pool status.
+
+    """
+    from sqlalchemy import func, insert, select
+
+    from shared.db_connection import (
+        Base,
+        get_engine,
+        get_pool_metrics,
+        get_read_session,
+        get_session,
+        init_db,
+        unit_of_work,
+    )
+    from shared.db_models import OrdersModel
+
+    Base.metadata.drop_all(bind=get_engine())
+    init_db()
+    rng = random.Random(20250618)
+    with get_session() as db:
+        for start in range(0, rows, 10_000):
+            db.execute(insert(OrdersModel), _order_lines(start, min(10_000, rows - start), rng))
+
+    stop = threading.Event()
+    latencies: list[list[float]] = [[] for _ in range(readers)]
+    errors: list[str] = []
+    writes = 0
+
+    def read(index: int) -> None:
+        reader_rng = random.Random(index)
+        while not stop.is_set():
+            day = datetime(2025, 6, 1) + timedelta(days=reader_rng.randrange(NUM_DAYS))
+            statement = select(OrdersModel.order_line_id, OrdersModel.item_sku, OrdersModel.date_created).where(
+                func.date(OrdersModel.date_created) == day.date(),
+            )
+            start = time.perf_counter()
+            try:
+                with get_read_session() as db:
+                    db.execute(statement).all()
+            except Exception as e:
+                errors.append(type(e).__name__)
+                continue
+            latencies[index].append((time.perf_counter() - start) * 1000)
+
+    def write() -> None:
+        nonlocal writes
+        writer_rng = random.Random(-1)
+        next_id = rows
+        while not stop.is_set():
+            try:
+                with unit_of_work() as db:
+                    db.execute(insert(OrdersModel), _order_lines(next_id, WRITE_BATCH_SIZE, writer_rng))
+            except Exception as e:
+                errors.append(type(e).__name__)
+                continue
+            next_id += WRITE_BATCH_SIZE
+            writes += WRITE_BATCH_SIZE
+
+    threads = [threading.Thread(target=read, args=(i,)) for i in range(readers)]
+    threads.append(threading.Thread(target=write))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    try:
+        with get_read_session() as db:
+            db.execute(insert(OrdersModel), _order_lines(0, 1, rng))
+        read_only = False
+    except Exception:
+        read_only = True
+
+    all_latencies = [latency for reader in latencies for latency in reader]
+    percentiles = statistics.quantiles(all_latencies, n=100) if len(all_latencies) > 1 else [0.0] * 99
+    return {
+        "reads_per_sec": round(len(all_latencies) / seconds, 2),
+        "read_p50_ms": round(percentiles[49], 3),
+        "read_p99_ms": round(percentiles[98], 3),
+        "rows_written_per_sec": round(writes / seconds, 2),
+        "errors": len(errors),
+        "error_types": sorted(set(errors)),
+        "read_engine_rejects_writes": read_only,
+        "pool": get_pool_metrics(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000, help="Order lines in the database before measuring")
+    parser.add_argument("--readers", type=int, default=8, help="Concurrent reader threads")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to measure each configuration for")
+    parser.add_argument("--pool_sizes", type=int, nargs="+", default=[2, 5, 10], help="DB_POOL_SIZE values to compare")
+    parser.add_argument("--db-url", help="Database URL, defaults to a temporary SQLite database per configuration")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_configuration(args.rows, args.readers, args.duration)))
+        return
+
+    # The shared engine and SQLite's own settings are compared at the default pool size, they only apply to SQLite.
+    configurations = {f"pool_size={size}": {"DB_POOL_SIZE": str(size)} for size in args.pool_sizes}
+    if not args.db_url:
+        configurations["shared_engine"] = {"SQLITE_READ_ONLY_ENGINE": "false"}
+        configurations["sqlite_defaults"] = {**SQLITE_DEFAULTS, "SQLITE_READ_ONLY_ENGINE": "false"}
+
+    results = {}
+    with tempfile.TemporaryDirectory() as db_dir:
+        for name, overrides in configurations.items():
+            env = {
+                **os.environ,
+                "ENV": "dev",
+                "LOG_LEVEL": "CRITICAL",
+                "DB_URL": args.db_url or f"sqlite:///{db_dir}/pool_{len(results)}.db",
+                **overrides,
+            }
+            print(f"Running {name}...", file=sys.stderr)
+            completed = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.pool",
+                    "--worker",
+                    "--rows",
+                    str(args.rows),
+                    "--readers",
+                    str(args.readers),
+                    "--duration",
+                    str(args.duration),
+                ],
+                cwd=REPO_ROOT,
+                env=env,
+                capture_output=True,
+                text=True,
+                check=False,
+            )
+            if completed.returncode != 0:
+                print(completed.stderr, file=sys.stderr)
+                sys.exit(completed.returncode)
+            results[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Measure memory and export conversion time for order line records.
+
+Usage:
+    python -m benchmarks.record_memory --rows 1000000
+"""
+
+import argparse
+import csv
+import gc
+import io
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import astuple, dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from data_generator.SimulationStore import OrderLineColumns
+from shared.db_models import Order
+
+
+@dataclass
+class DataclassOrder:
+    """The previous dataclass based Order record, kept here for comparison."""
+
+    order_line_id: int
+    order_id: int
+    user_id: int
+    item_sku: str
+    qty: int
+    item_price: int
+    date_created: datetime
+
+
+def _row_values(num_rows: int) -> list[tuple]:
+    """
+    Build order line value tuples sharing the price and date objects, as a generation run does.
+
+    Args:
+        num_rows (int): Number of rows to build.
+
+    Returns:
+        list[tuple]: Order line values in Order field order.
+
+    """
+    price = Decimal("19.00")
+    date_created = datetime(2025, 6, 17)
+    skus = [f"LCR{i:03}" for i in range(500)]
+    return [(i + 1, i // 3 + 1, i // 3 + 1, skus[i % 500], 1, price, date_created) for i in range(num_rows)]
+
+
+def _build_dataclasses(values: list[tuple]) -> list:
+    return [DataclassOrder(*row) for row in values]
+
+
+def _build_named_tuples(values: list[tuple]) -> list:
+    return [Order._make(row) for row in values]
+
+
+def _build_batch(values: list[tuple]) -> OrderLineColumns:
+    batch = OrderLineColumns()
+    batch.extend(values)
+    return batch
+
+
+def _measure(build: Callable[[list[tuple]], object], values: list[tuple]) -> tuple[object, int]:
+    """
+    Measure the memory allocated by a container build.
+
+    Args:
+        build (Callable): Builds the container from the row values.
+        values (list[tuple]): The row values.
+
+    Returns:
+        tuple[object, int]: The container and the bytes still allocated after building it.
+
+    """
+    gc.collect()
+    tracemalloc.start()
+    container = build(values)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return container, allocated
+
+
+def _export_seconds(rows: object) -> float:
+    """
+    Time writing rows to an in-memory CSV the way the exporters do.
+
+    Args:
+        rows (object): Dataclass records, named tuple records, or a record batch.
+
+    Returns:
+        float: The elapsed seconds.
+
+    """
+    start = time.perf_counter()
+    writer = csv.writer(io.StringIO())
+    if isinstance(rows, OrderLineColumns):
+        writer.writerows(rows.rows())
+    elif rows and isinstance(rows[0], DataclassOrder):
+        for row in rows:
+            writer.writerow(astuple(row))
+    else:
+        writer.writerows(rows)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of order lines")
+    args = parser.parse_args()
+
+    values = _row_values(args.rows)
+    print(f"{args.rows} order lines")
+    for name, build in (
+        ("dataclass", _build_dataclasses),
+        ("named tuple", _build_named_tuples),
+        ("record batch", _build_batch),
+    ):
+        container, allocated = _measure(build, values)
+        seconds = _export_seconds(container)
+        print(f"{name:<13} {allocated / 1e6:8.1f} MB  {allocated / args.rows:6.1f} B/line  export {seconds:6.2f} s")
+        del container
+
+
+if __name__ == "__main__":
+    main()
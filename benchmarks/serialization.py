@@ -0,0 +1,97 @@
+"""
+Compare JSON serialisation time of /products responses.
+
+Usage:
+    python -m benchmarks.serialization --rows 100000 --repeat 5
+"""
+
+import argparse
+import json
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+from api.responses import FastJSONResponse
+from api.schemas import ProductSchema
+
+
+def _make_rows(num_rows: int) -> list[tuple]:
+    """
+    Build product row tuples shaped like the /products select.
+
+    Args:
+        num_rows (int): Number of rows to build.
+
+    Returns:
+        list[tuple]: Product rows.
+
+    """
+    created = datetime(2025, 1, 1)
+    return [
+        (
+            f"LCR{i:06}",
+            Decimal("19.00"),
+            created + timedelta(weeks=6),
+            created,
+            created,
+            True,
+        )
+        for i in range(num_rows)
+    ]
+
+
+def _stdlib_path(rows: list[tuple]) -> bytes:
+    """Mirror the default FastAPI path: row dicts, jsonable_encoder, then the stdlib json module."""
+    columns = ("item_sku", "item_price", "release_date", "date_created", "date_updated", "active")
+    content = jsonable_encoder([dict(zip(columns, row, strict=True)) for row in rows])
+    return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+
+def _fast_path(rows: list[tuple]) -> bytes:
+    """Mirror the API path: response schemas built from row tuples and rendered with orjson."""
+    return FastJSONResponse([ProductSchema(*row) for row in rows]).body
+
+
+def _time(func: Callable[[list[tuple]], bytes], rows: list[tuple], repeat: int) -> tuple[float, int]:
+    """
+    Time the best of several runs of a serialisation function.
+
+    Args:
+        func (Callable): The serialisation function.
+        rows (list[tuple]): The rows to serialise.
+        repeat (int): Number of runs.
+
+    Returns:
+        tuple[float, int]: The fastest run in seconds and the size of the output in bytes.
+
+    """
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(func(rows))
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000, help="Number of product rows to serialise")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs, the best is reported")
+    args = parser.parse_args()
+
+    rows = _make_rows(args.rows)
+    stdlib_seconds, stdlib_size = _time(_stdlib_path, rows, args.repeat)
+    fast_seconds, fast_size = _time(_fast_path, rows, args.repeat)
+
+    print(f"{args.rows} products, best of {args.repeat}")
+    print(f"jsonable_encoder + json: {stdlib_seconds * 1000:8.1f} ms  {stdlib_size / 1e6:6.2f} MB")
+    print(f"schema + orjson:         {fast_seconds * 1000:8.1f} ms  {fast_size / 1e6:6.2f} MB")
+    print(f"speedup: {stdlib_seconds / fast_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
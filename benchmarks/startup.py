@@ -0,0 +1,89 @@
+"""
+Measure the import time of the generator and API entry points with python -X importtime.
+
+Each entry point is imported several times in a fresh interpreter and the median is reported, along with the
+slowest packages of the last import.
+
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 10 --top 15
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+ENTRY_POINTS = {
+    "data_generator": "data_generator.main",
+    "api": "api.main",
+}
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure_import(module: str | None) -> tuple[float, list[tuple[str, float]]]:
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Packages the interpreter imports at startup are excluded, they're measured by importing nothing.
+
+    Args:
+        module (str | None): The module to import, None to measure interpreter startup only.
+
+    Returns:
+        tuple[float, list[tuple[str, float]]]: Total import time in milliseconds and the cumulative time of every
+            top level package in milliseconds.
+
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}" if module else "pass"],
+        cwd=REPO_ROOT,
+        env={**os.environ, "ENV": os.getenv("ENV", "dev")},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    packages = []
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        # Top level imports have a single space of indentation in the package column.
+        if match and len(match.group(3)) == 1:
+            packages.append((match.group(4), int(match.group(2)) / 1000))
+    if module:
+        startup_packages = {package for package, _ in measure_import(None)[1]}
+        packages = [(package, ms) for package, ms in packages if package not in startup_packages]
+    return round(sum(ms for _, ms in packages), 2), packages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="Number of imports per entry point")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest packages to report")
+    args = parser.parse_args()
+
+    results = {}
+    for name, module in ENTRY_POINTS.items():
+        totals = []
+        for _ in range(args.repeat):
+            total_ms, packages = measure_import(module)
+            totals.append(total_ms)
+        slowest = sorted(packages, key=lambda package: package[1], reverse=True)[: args.top]
+        results[name] = {
+            "module": module,
+            "median_ms": round(statistics.median(totals), 2),
+            "min_ms": min(totals),
+            "slowest_packages_ms": dict(slowest),
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Compare sequential and concurrent report uploads against a Cloud Storage emulator.
+
+Uploads the same set of CSV sized objects with upload_to_bucket() one by one and then through the async upload
+manager, and reports MB/sec for each. Every object uploaded concurrently is downloaded again and compared.
+
+Usage:
+    docker run -d --rm -p 4443:4443 fsouza/fake-gcs-server -scheme http
+    STORAGE_EMULATOR_HOST=http://localhost:4443 python -m benchmarks.uploads --objects 200 --size_kb 256
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import quote
+
+BUCKET = "benchmark-uploads"
+
+
+def create_bucket(endpoint: str, bucket: str) -> None:
+    """Create the bucket on the emulator, ignoring it if it already exists."""
+    request = urllib.request.Request(
+        f"{endpoint}/storage/v1/b?project=benchmark",
+        data=json.dumps({"name": bucket}).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        urllib.request.urlopen(request).close()
+    except urllib.error.HTTPError as e:
+        if e.code != 409:
+            raise
+
+
+def download(endpoint: str, bucket: str, blob_name: str) -> bytes:
+    """Download an object's content from the emulator."""
+    url = f"{endpoint}/storage/v1/b/{bucket}/o/{quote(blob_name, safe='')}?alt=media"
+    with urllib.request.urlopen(url) as response:
+        return response.read()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=200, help="Number of objects to upload")
+    parser.add_argument("--size_kb", type=int, default=256, help="Size of each object in KB")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent uploads for the async manager")
+    parser.add_argument("--skip_sequential", action="store_true", help="Only measure the async upload manager")
+    args = parser.parse_args()
+
+    endpoint = os.getenv("STORAGE_EMULATOR_HOST", "").rstrip("/")
+    if not endpoint:
+        sys.exit("Set STORAGE_EMULATOR_HOST to the emulator, e.g. http://localhost:4443.")
+
+    from data_generator.google_cloud_storage import deferred_uploads, upload_to_bucket
+
+    create_bucket(endpoint, BUCKET)
+    payloads = {
+        f"order_reports/Order_report_{i:05}.csv": (f"{i}," * (args.size_kb * 512))[: args.size_kb * 1024].encode()
+        for i in range(args.objects)
+    }
+    megabytes = sum(len(data) for data in payloads.values()) / 1e6
+    results = {"objects": args.objects, "megabytes": round(megabytes, 3)}
+
+    if not args.skip_sequential:
+        start = time.perf_counter()
+        for blob_name, data in payloads.items():
+            upload_to_bucket(f"sequential/{blob_name}", data, BUCKET)
+        results["sequential_mb_per_sec"] = round(megabytes / (time.perf_counter() - start), 2)
+
+    start = time.perf_counter()
+    with deferred_uploads(max_concurrency=args.concurrency) as manager:
+        for blob_name, data in payloads.items():
+            upload_to_bucket(f"concurrent/{blob_name}", data, BUCKET)
+    results["concurrent_mb_per_sec"] = round(megabytes / (time.perf_counter() - start), 2)
+    results["concurrent_retries"] = manager.report.retries
+
+    mismatched = [
+        blob_name for blob_name, data in payloads.items() if download(endpoint, BUCKET, f"concurrent/{blob_name}") != data
+    ]
+    results["verified"] = not mismatched
+    print(json.dumps(results, indent=2))
+    if mismatched:
+        sys.exit(f"{len(mismatched)} object(s) didn't match, e.g. {mismatched[0]}.")
+
+
+if __name__ == "__main__":
+    main()
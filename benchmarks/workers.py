@@ -0,0 +1,216 @@
+"""
+Check that multi-worker generation completes against SQLite, and time it.
+
+Runs the generator with --workers against a temporary SQLite database, the way it's run locally, then checks that no
+worker failed, that every day was generated and that the daily sales summaries maintained by the workers match a
+rebuild from the orders table. The same days are then generated serially into another database, which must hold the
+same data. Exits with a non-zero status if any check fails, since the generator itself only logs errors.
+
+Usage:
+    python -m benchmarks.workers
+    python -m benchmarks.workers --workers 8 --days 14 --volume_profile load_100x
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _round_amount(value: object) -> object:
+    # SQLite sums revenue as floats in a rebuild, the incremental updates add Decimals.
+    return Decimal(str(value)).quantize(Decimal("0.01")) if isinstance(value, float | Decimal) else value
+
+
+# Bookkeeping that records when and how a run was made rather than what it generated.
+UNCOMPARED_TABLES = {"run_sequences"}
+UNCOMPARED_COLUMNS = {"date_built"}
+
+
+def digest() -> str:
+    """
+    Hash every generated row of the database configured by the environment.
+
+    Returns:
+        str: A digest that's equal for databases holding the same data.
+
+    """
+    from sqlalchemy import select
+
+    from shared.db_connection import Base, get_session
+
+    digest = hashlib.sha256()
+    with get_session() as db:
+        for table in Base.metadata.sorted_tables:
+            if table.name in UNCOMPARED_TABLES:
+                continue
+            columns = [column for column in table.columns if column.name not in UNCOMPARED_COLUMNS]
+            rows = db.execute(select(*columns).order_by(*table.primary_key.columns)).all()
+            digest.update(repr((table.name, [tuple(row) for row in rows])).encode())
+    return digest.hexdigest()
+
+
+def verify() -> dict:
+    """
+    Check the generated database configured by the environment.
+
+    Must run in its own process, the engine is created once per process from DB_URL.
+
+    Returns:
+        dict: Number of orders and days generated, summary rows that differ from a rebuild and a digest of the data.
+
+    """
+    from sqlalchemy import func, select
+
+    from data_generator import DailySales
+    from shared.db_connection import get_session
+    from shared.db_models import DailyCountrySalesModel, DailySalesModel, DailySkuSalesModel, OrdersModel
+
+    summary_models = (DailySalesModel, DailySkuSalesModel, DailyCountrySalesModel)
+
+    def summary_rows() -> set[tuple]:
+        with get_session() as db:
+            return {
+                (model.__tablename__, *map(_round_amount, row))
+                for model in summary_models
+                for row in db.execute(select(*model.__table__.columns))
+            }
+
+    with get_session() as db:
+        num_orders, num_days = db.execute(
+            select(func.count(), func.count(func.distinct(func.date(OrdersModel.date_created)))),
+        ).one()
+
+    data_digest = digest()
+    maintained = summary_rows()
+    DailySales().rebuild()
+    rebuilt = summary_rows()
+    return {
+        "orders": num_orders,
+        "days": num_days,
+        "summary_mismatches": len(maintained ^ rebuilt),
+        "digest": data_digest,
+    }
+
+
+def generate(args: argparse.Namespace, run_dir: str, workers: int) -> dict:
+    """
+    Generate the days into a fresh SQLite database in run_dir and verify it.
+
+    Args:
+        args (argparse.Namespace): The benchmark's arguments.
+        run_dir (str): Empty working directory for the generator.
+        workers (int): Number of worker processes.
+
+    Returns:
+        dict: The run's duration, exit code, number of errors logged and verify() results.
+
+    """
+    end_date = date.fromisoformat(args.run_date) + timedelta(days=args.days - 1)
+    # The generator reads its config relative to, and writes its reports to, the working directory.
+    Path(run_dir, "data_generator").mkdir()
+    Path(run_dir, "data_generator", "config.yaml").symlink_to(REPO_ROOT / "data_generator" / "config.yaml")
+    env = {
+        **os.environ,
+        "ENV": "dev",
+        "LOG_LEVEL": "WARNING",
+        "DB_URL": f"sqlite:///{run_dir}/workers.db",
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_ROOT), os.getenv("PYTHONPATH")])),
+    }
+    print(f"Generating {args.days} day(s) with {workers} worker(s) at {args.volume_profile}...", file=sys.stderr)
+    start = time.perf_counter()
+    generated = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "data_generator.main",
+            "--run_date",
+            args.run_date,
+            "--end_date",
+            end_date.isoformat(),
+            "--create_products",
+            "--seed",
+            str(args.seed),
+            "--workers",
+            str(workers),
+            "--volume_profile",
+            args.volume_profile,
+        ],
+        cwd=run_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    seconds = time.perf_counter() - start
+    errors = [line for line in generated.stderr.splitlines() if " - ERROR - " in line]
+    if generated.returncode != 0 or errors:
+        print(generated.stderr, file=sys.stderr)
+
+    verified = subprocess.run(
+        [sys.executable, "-m", "benchmarks.workers", "--verify"],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if verified.returncode != 0:
+        print(verified.stderr, file=sys.stderr)
+        sys.exit(verified.returncode)
+
+    return {
+        "seconds": round(seconds, 2),
+        "exit_code": generated.returncode,
+        "errors": len(errors),
+        **json.loads(verified.stdout.strip().splitlines()[-1]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes")
+    parser.add_argument("--days", type=int, default=8, help="Number of days to generate")
+    parser.add_argument("--volume_profile", default="load_10x", help="Volume profile from config.yaml")
+    parser.add_argument("--run_date", default="2025-06-16", help="ISO date of the first day")
+    parser.add_argument("--seed", type=int, default=7, help="Root seed of the run")
+    parser.add_argument("--verify", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.verify:
+        print(json.dumps(verify()))
+        return
+
+    with tempfile.TemporaryDirectory() as parallel_dir, tempfile.TemporaryDirectory() as serial_dir:
+        parallel = generate(args, parallel_dir, args.workers)
+        serial = generate(args, serial_dir, 1)
+
+    results = {
+        **{key: value for key, value in parallel.items() if key != "digest"},
+        "expected_days": args.days,
+        "serial_seconds": serial["seconds"],
+        "identical_to_serial": parallel["digest"] == serial["digest"],
+    }
+    print(json.dumps(results, indent=2))
+
+    if (
+        parallel["exit_code"]
+        or parallel["errors"]
+        or parallel["days"] != args.days
+        or parallel["summary_mismatches"]
+        or not results["identical_to_serial"]
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
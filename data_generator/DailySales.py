@@ -0,0 +1,266 @@
+from collections import Counter, defaultdict
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+
+from sqlalchemy import case, delete, distinct, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from shared.db_connection import Base, get_session
+from shared.db_models import (
+    DailyCountrySalesModel,
+    DailySalesModel,
+    DailySkuSalesModel,
+    Order,
+    OrdersModel,
+    UsersModel,
+)
+from shared.logger import get_logger
+from shared.metrics import stage
+
+log = get_logger(__name__)
+
+# Users per IN list when looking up a batch's returning customers, well below SQLite's and Postgres's bind parameter
+# limits.
+LOOKUP_BATCH_SIZE = 10_000
+
+
+class DailySales:
+    """A class to maintain the pre-aggregated daily sales summary tables using SQLAlchemy."""
+
+    def update(self, db: Session, order_lines: list[Order], new_user_countries: dict[int, str]) -> None:
+        """
+        Add a batch of new order lines to the daily sales summary tables.
+
+        Runs in the caller's session, after the order lines were flushed, so the summaries are committed together
+        with them.
+
+        Args:
+            db (Session): The session the order lines were flushed in.
+            order_lines (list[Order]): The new order lines.
+            new_user_countries (dict[int, str]): Country of each user created for this batch, keyed by user ID.
+
+        """
+        if len(order_lines) == 0:
+            return
+
+        with stage("daily_sales.update", rows=len(order_lines)):
+            self._update(db, order_lines, new_user_countries)
+
+    def _update(self, db: Session, order_lines: list[Order], new_user_countries: dict[int, str]) -> None:
+        """
+        Aggregate order lines by day, SKU and country and add the totals to the summary tables.
+
+        A customer is counted once per day they order, as new on the day of their first order and as returning on
+        later days, the same as rebuild(). Customers already counted for a day by an earlier batch aren't counted
+        again, and one counted as new is recounted as returning if the batch has an earlier order of theirs.
+
+        Args:
+            db (Session): The session the order lines were flushed in.
+            order_lines (list[Order]): The new order lines.
+            new_user_countries (dict[int, str]): Country of each user created for this batch, keyed by user ID.
+
+        """
+        batch_order_ids = {line.order_id for line in order_lines}
+        returning_user_ids = {line.user_id for line in order_lines} - new_user_countries.keys()
+        countries, earlier_order_days = self._get_returning_customers(db, returning_user_ids, batch_order_ids)
+        countries.update(new_user_countries)
+
+        daily: dict[tuple, Counter] = defaultdict(Counter)
+        skus: dict[tuple, Counter] = defaultdict(Counter)
+        country_totals: dict[tuple, Counter] = defaultdict(Counter)
+        order_days: dict[int, set[date]] = defaultdict(set)
+        seen_order_ids = set()
+
+        for line in order_lines:
+            sales_date = line.date_created.date()
+            user_country = countries[line.user_id]
+            revenue = line.qty * Decimal(str(line.item_price))
+
+            for totals in (
+                daily[(sales_date,)],
+                skus[(sales_date, line.item_sku)],
+                country_totals[(sales_date, user_country)],
+            ):
+                totals["units"] += line.qty
+                totals["revenue"] += revenue
+
+            daily[(sales_date,)]["num_order_lines"] += 1
+            skus[(sales_date, line.item_sku)]["num_orders"] += 1
+
+            if line.order_id not in seen_order_ids:
+                seen_order_ids.add(line.order_id)
+                daily[(sales_date,)]["num_orders"] += 1
+                country_totals[(sales_date, user_country)]["num_orders"] += 1
+                order_days[line.user_id].add(sales_date)
+
+        for user_id, days in order_days.items():
+            earlier_days = earlier_order_days.get(user_id, set())
+            first_order_date = min(days | earlier_days)
+            for sales_date in days - earlier_days:
+                customer_type = "new_customers" if sales_date == first_order_date else "returning_customers"
+                daily[(sales_date,)][customer_type] += 1
+            # A backfilled order, e.g. from a worker generating an earlier day, can precede the first order already
+            # summarised, that day's customer is returning rather than new now.
+            if earlier_days and first_order_date < min(earlier_days):
+                daily[(min(earlier_days),)]["new_customers"] -= 1
+                daily[(min(earlier_days),)]["returning_customers"] += 1
+
+        self._accumulate(db, DailySalesModel, daily)
+        self._accumulate(db, DailySkuSalesModel, skus)
+        self._accumulate(db, DailyCountrySalesModel, country_totals)
+        log.debug(
+            "Updated daily sales summaries: %s day(s), %s sku row(s), %s country row(s).",
+            len(daily),
+            len(skus),
+            len(country_totals),
+        )
+
+    def _get_returning_customers(
+        self,
+        db: Session,
+        user_ids: set[int],
+        batch_order_ids: set[int],
+    ) -> tuple[dict[int, str], dict[int, set[date]]]:
+        """
+        Look up the country and earlier order days of customers that existed before the batch.
+
+        Users are looked up LOOKUP_BATCH_SIZE at a time, so a large batch stays within the bind parameter limits.
+
+        Args:
+            db (Session): The session the order lines were flushed in.
+            user_ids (set[int]): IDs of the customers.
+            batch_order_ids (set[int]): IDs of the batch's orders, which aren't counted as earlier orders.
+
+        Returns:
+            tuple[dict[int, str], dict[int, set[date]]]: The country of each customer, and the days each customer
+                ordered on outside the batch.
+
+        """
+        countries = {}
+        earlier_order_days: dict[int, set[date]] = defaultdict(set)
+        user_ids = iter(sorted(user_ids))
+        while chunk := list(islice(user_ids, LOOKUP_BATCH_SIZE)):
+            rows = db.execute(
+                select(UsersModel.user_id, UsersModel.user_country, OrdersModel.order_id, OrdersModel.date_created)
+                .outerjoin(OrdersModel, OrdersModel.user_id == UsersModel.user_id)
+                .where(UsersModel.user_id.in_(chunk)),
+            )
+            for user_id, user_country, order_id, date_created in rows:
+                countries[user_id] = user_country
+                if order_id is not None and order_id not in batch_order_ids:
+                    earlier_order_days[user_id].add(date_created.date())
+        return countries, earlier_order_days
+
+    def _accumulate(self, db: Session, model: type[Base], totals: dict[tuple, Counter]) -> None:
+        """
+        Add totals to the summary rows matching their primary keys, inserting rows that don't exist yet.
+
+        Every row is added with one INSERT ... ON CONFLICT DO UPDATE SET column = column + excluded.column, so the
+        database applies each addition atomically and concurrent workers adding to the same day neither lose
+        updates nor conflict inserting it. Rows are upserted in primary key order, so concurrent transactions lock
+        them in the same order and can't deadlock.
+
+        Args:
+            db (Session): The database session.
+            model (type[Base]): The summary table model.
+            totals (dict[tuple, Counter]): Totals to add, keyed by primary key values in primary key column order.
+
+        """
+        key_columns = list(model.__table__.primary_key.columns)
+        key_names = [column.name for column in key_columns]
+        total_names = [column.name for column in model.__table__.columns if not column.primary_key]
+
+        dialect_insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else postgresql_insert
+        statement = dialect_insert(model)
+        statement = statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={name: model.__table__.c[name] + statement.excluded[name] for name in total_names},
+        )
+        rows = [
+            {**dict(zip(key_names, key, strict=True)), **{name: totals[key][name] for name in total_names}}
+            for key in sorted(totals)
+        ]
+        db.execute(statement, rows)
+
+    def rebuild(self) -> None:
+        """
+        Rebuild all daily sales summary tables from the orders table.
+
+        Use this once to backfill the summaries for orders created before they were maintained incrementally.
+        A customer is counted once per day they order, as new on the day of their first order and as returning on
+        later days.
+
+        """
+        sales_date = func.date(OrdersModel.date_created)
+        line_revenue = OrdersModel.qty * OrdersModel.item_price
+
+        first_orders = (
+            select(
+                OrdersModel.user_id,
+                func.min(func.date(OrdersModel.date_created)).label("first_order_date"),
+            )
+            .group_by(OrdersModel.user_id)
+            .subquery()
+        )
+        new_customers = func.count(distinct(case((first_orders.c.first_order_date == sales_date, OrdersModel.user_id))))
+
+        daily = (
+            select(
+                sales_date,
+                func.count(distinct(OrdersModel.order_id)),
+                func.count(),
+                func.sum(OrdersModel.qty),
+                func.sum(line_revenue),
+                new_customers,
+                func.count(distinct(OrdersModel.user_id)) - new_customers,
+            )
+            .select_from(OrdersModel)
+            .join(first_orders, first_orders.c.user_id == OrdersModel.user_id)
+            .group_by(sales_date)
+        )
+        skus = select(
+            sales_date,
+            OrdersModel.item_sku,
+            func.count(distinct(OrdersModel.order_id)),
+            func.sum(OrdersModel.qty),
+            func.sum(line_revenue),
+        ).group_by(sales_date, OrdersModel.item_sku)
+        countries = (
+            select(
+                sales_date,
+                UsersModel.user_country,
+                func.count(distinct(OrdersModel.order_id)),
+                func.sum(OrdersModel.qty),
+                func.sum(line_revenue),
+            )
+            .select_from(OrdersModel)
+            .join(UsersModel, UsersModel.user_id == OrdersModel.user_id)
+            .group_by(sales_date, UsersModel.user_country)
+        )
+
+        with get_session() as db:
+            for model, statement, columns in (
+                (
+                    DailySalesModel,
+                    daily,
+                    [
+                        "sales_date",
+                        "num_orders",
+                        "num_order_lines",
+                        "units",
+                        "revenue",
+                        "new_customers",
+                        "returning_customers",
+                    ],
+                ),
+                (DailySkuSalesModel, skus, ["sales_date", "item_sku", "num_orders", "units", "revenue"]),
+                (DailyCountrySalesModel, countries, ["sales_date", "user_country", "num_orders", "units", "revenue"]),
+            ):
+                db.execute(delete(model))
+                db.execute(insert(model).from_select(columns, statement))
+                log.debug("Rebuilt %s from the orders table.", model.__tablename__)
+
+        log.info("Daily sales summaries rebuilt.")
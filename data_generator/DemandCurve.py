@@ -0,0 +1,106 @@
+import math
+import random
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+
+from data_generator.SimulationStore import to_db_datetime
+
+MINUTES_PER_DAY = 24 * 60
+
+# Relative order volume per hour of the day (UTC), Monday to Friday: a morning ramp, a lunchtime peak and the
+# evening peak after work.
+WEEKDAY_HOURLY_DEMAND = (
+    0.6, 0.4, 0.3, 0.25, 0.25, 0.4, 0.8, 1.5, 2.2, 2.6, 2.8, 3.1,
+    3.6, 3.4, 2.9, 2.8, 3.0, 3.3, 3.8, 4.4, 4.7, 4.2, 3.0, 1.6,
+)  # fmt: skip
+
+# Saturday and Sunday: a later start and a flatter afternoon.
+WEEKEND_HOURLY_DEMAND = (
+    1.0, 0.7, 0.5, 0.35, 0.3, 0.3, 0.45, 0.8, 1.4, 2.2, 3.0, 3.5,
+    3.7, 3.6, 3.5, 3.4, 3.4, 3.5, 3.7, 4.0, 4.1, 3.7, 2.8, 1.7,
+)  # fmt: skip
+
+# When new products go on pre-order, and how quickly the rush of pre-orders dies down.
+PREORDER_LAUNCH_TIME = time(9, 0)
+PREORDER_HALF_LIFE_MINUTES = 45
+
+
+class DemandCurve:
+    """
+    A class to spread a day's orders across the day following the time of day demand.
+
+    The day is split into one minute bins weighted by the hourly demand for the weekday, plus an optional pre-order
+    spike that peaks at the launch time and decays exponentially. Timestamps are drawn in bulk by inverse transform
+    sampling of sorted uniform draws, so they come out in time order without sorting datetimes.
+
+    Attributes:
+        start (datetime): Midnight at the start of the day, naive UTC.
+        cum_weights (list[float]): Cumulative demand at the end of each minute of the day.
+
+    """
+
+    def __init__(
+        self,
+        day: datetime,
+        *,
+        preorder_share: float = 0.0,
+        launch_time: time = PREORDER_LAUNCH_TIME,
+        half_life_minutes: float = PREORDER_HALF_LIFE_MINUTES,
+    ) -> None:
+        """
+        Initialise the demand curve for a day.
+
+        Args:
+            day (datetime): Any time on the day.
+            preorder_share (float): Share of the day's orders that are part of the pre-order spike, 0 for no launch.
+            launch_time (time): When the pre-order spike starts.
+            half_life_minutes (float): Minutes for the pre-order spike to halve.
+
+        """
+        self.start = to_db_datetime(day).replace(hour=0, minute=0, second=0, microsecond=0)
+        hourly_demand = WEEKEND_HOURLY_DEMAND if self.start.isoweekday() > 5 else WEEKDAY_HOURLY_DEMAND
+        weights = [hourly_demand[minute // 60] for minute in range(MINUTES_PER_DAY)]
+
+        if preorder_share > 0:
+            launch_minute = launch_time.hour * 60 + launch_time.minute
+            decay = math.log(2) / half_life_minutes
+            spike = [
+                math.exp(-decay * (minute - launch_minute)) if minute >= launch_minute else 0.0
+                for minute in range(MINUTES_PER_DAY)
+            ]
+            base_scale = (1 - preorder_share) / sum(weights)
+            spike_scale = preorder_share / sum(spike)
+            weights = [
+                weight * base_scale + spike_weight * spike_scale
+                for weight, spike_weight in zip(weights, spike, strict=True)
+            ]
+
+        self.cum_weights = list(accumulate(weights))
+
+    def timestamps(self, count: int, rng: random.Random) -> list[datetime]:
+        """
+        Draw timestamps for count events on the day.
+
+        Args:
+            count (int): Number of timestamps to draw.
+            rng (random.Random): The random number generator to draw from.
+
+        Returns:
+            list[datetime]: Naive UTC timestamps to the second, in ascending order.
+
+        """
+        total = self.cum_weights[-1]
+        draws = sorted(rng.random() * total for _ in range(count))
+        timestamps = []
+        minute = 0
+        lower = 0.0
+
+        # Both the draws and cum_weights ascend, so one pass maps every draw to its minute.
+        for draw in draws:
+            while self.cum_weights[minute] <= draw:
+                lower = self.cum_weights[minute]
+                minute += 1
+            fraction = (draw - lower) / (self.cum_weights[minute] - lower)
+            timestamps.append(self.start + timedelta(seconds=int((minute + fraction) * 60)))
+
+        return timestamps
@@ -1,53 +1,115 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import datetime, timezone
 
+from data_generator.IncrementalExport import IncrementalExport
 from data_generator.Orders import Orders
+from data_generator.ProductLifecycle import ProductLifecycle
 from data_generator.Products import Products
+from data_generator.profiling import memory_snapshot
+from data_generator.SimulationStore import SimulationStore
 from data_generator.Users import Users
-from shared.db_connection import get_session
+from shared.db_connection import get_read_session, get_session, unit_of_work
 from shared.db_models import Order, OrdersModel, Product, ProductsModel, UsersModel
+from shared.logger import get_logger
+from shared.metrics import count, stage
+
+log = get_logger(__name__)
 
 
 class Ecommerce:
     """
     A class to generate, retrieve, and export product and order/user data.
 
+    Data is generated into an in-memory simulation store, exported from it, and persisted to the database with flush().
+
     Attributes:
         locales (list[str]): List of locale codes to be used for generating fake user data.
+        seed (int | None): Root seed for reproducible generation, each component derives its own random streams from it.
 
     """
 
-    def __init__(self, locales: list[str]) -> None:
-        self.products = Products()
-        self.users = Users(locales)
-        self.orders = Orders()
+    def __init__(self, locales: list[str], seed: int | None = None) -> None:
+        self.seed = seed
+        self.products = Products(seed)
+        self.users = Users(locales, seed)
+        self.orders = Orders(seed)
+        self.product_lifecycle = ProductLifecycle()
+        self.store = SimulationStore()
+        self.incremental_export = IncrementalExport(self.products, self.users, self.orders)
 
     def __str__(self) -> str:
-        with get_session() as db:
+        with get_read_session() as db:
             num_products = db.query(ProductsModel).count()
             num_users = db.query(UsersModel).count()
             num_orders = db.query(OrdersModel).count()
 
         return f"There are {num_products} products, {num_users} users, and {num_orders} orders in the database."
 
-    def create_orders(self, num_orders: int, max_num_items: int, date_created: datetime) -> list[Order] | None:
+    @contextmanager
+    def unit_of_work(self) -> Iterator[None]:
+        """
+        Run the components on a single database session and commit their changes in one transaction.
+
+        Every query and insert made inside the block, from the flush's inserts to the summary and popularity updates,
+        shares one pooled connection, and a day's data is committed atomically or not at all. On SQLite the block
+        holds the database's write lock from its first write until it exits, so generate into the store before it.
+
+        Yields:
+            None
+
         """
-        Generates and adds fake orders to the database.
+        with stage("ecommerce.unit_of_work"), unit_of_work():
+            yield
+
+    def create_orders(
+        self,
+        num_orders: int,
+        max_num_items: int,
+        date_created: datetime,
+        profiles: list[tuple[str, str, str, str]] | None = None,
+    ) -> list[Order] | None:
+        """
+        Generates fake orders and their new users into the simulation store.
 
         Args:
             num_orders (int): Number of orders to generate.
             max_num_items (int): Maximum number of items in an order.
             date_created (datetime): The date the order was created.
+            profiles (list[tuple[str, str, str, str]] | None): Profiles from generate_user_profiles() for the new
+                users. If None they're generated with the orders.
 
         Returns:
-            list[Order] | None: A list of created Order dataclass instances.
+            list[Order] | None: A list of created Order records.
 
         """
-        return self.orders.create(
-            users=self.users,
-            num_orders=num_orders,
-            max_num_items=max_num_items,
-            date_created=date_created,
-        )
+        with stage("ecommerce.create_orders", rows=num_orders), memory_snapshot("orders.create"):
+            return self.orders.create(
+                users=self.users,
+                num_orders=num_orders,
+                max_num_items=max_num_items,
+                date_created=date_created,
+                store=self.store,
+                profiles=profiles,
+            )
+
+    def generate_user_profiles(self, num_orders: int, date_created: datetime) -> list[tuple[str, str, str, str]]:
+        """
+        Generates the profiles of a day's new users ahead of its orders, one per order.
+
+        Profiles don't depend on the database, so they can be generated while earlier days are being committed. Every
+        order could be a new customer's, the profiles of returning customers' orders go unused.
+
+        Args:
+            num_orders (int): Number of orders the day will have.
+            date_created (datetime): The day the users are created.
+
+        Returns:
+            list[tuple[str, str, str, str]]: The name, address, country and email of each potential new user.
+
+        """
+        with stage("ecommerce.generate_user_profiles", rows=num_orders), memory_snapshot("users.generate_profiles"):
+            return self.users.generate_profiles(num_orders, date_created)
 
     def create_products(
         self,
@@ -58,7 +120,7 @@ class Ecommerce:
         creation_date: str | datetime = datetime.now(tz=timezone.utc),
     ) -> list[Product] | None:
         """
-        Generates and adds fake products to the database.
+        Generates fake products into the simulation store.
 
         Args:
             label_prefix (str | list[str]): The prefix to use when creating the product catalogue number.
@@ -68,20 +130,73 @@ class Ecommerce:
             creation_date (str | datetime): The date the products are added to the ecommerce store.
 
         Returns:
-            list[Product] | None: A list of created Product dataclass instances.
+            list[Product] | None: A list of created Product records.
 
         """
         if num_items < 1:
             return None
 
-        return self.products.create(
-            label_prefix=label_prefix,
-            preorder_weeks=preorder_weeks,
-            num_items=num_items,
-            pricing=pricing,
-            creation_date=creation_date,
+        with stage("ecommerce.create_products", rows=num_items):
+            return self.products.create(
+                label_prefix=label_prefix,
+                preorder_weeks=preorder_weeks,
+                num_items=num_items,
+                pricing=pricing,
+                creation_date=creation_date,
+                store=self.store,
+            )
+
+    def update_product_lifecycle(self, run_date: datetime, **rules: object) -> dict[str, int]:
+        """
+        Marks down, retires and deactivates products in the database according to the lifecycle rules.
+
+        Args:
+            run_date (datetime): The day the rules are applied.
+            **rules (object): The product_lifecycle rules from config.yaml, see ProductLifecycle.update().
+
+        Returns:
+            dict[str, int]: Number of products changed by each rule.
+
+        """
+        return self.product_lifecycle.update(run_date, **rules)
+
+    def flush(self) -> None:
+        """
+        Persist everything generated since the last flush to the database in a single session.
+
+        Inserts products, users and order lines with batched bulk inserts per table, updates the daily sales summaries
+        and re-normalises product popularity scores if new products were added.
+
+        """
+        order_lines = self.store.order_lines
+        users = self.store.users
+        new_orders = order_lines.records(order_lines.flushed)
+        new_user_countries = dict(
+            zip(users.columns["user_id"][users.flushed :], users.columns["user_country"][users.flushed :], strict=True),
         )
 
+        with stage("ecommerce.flush") as flush_stage, get_session() as db:
+            flushed = self.store.flush(db)
+            self.orders.daily_sales.update(db, new_orders, new_user_countries)
+            flush_stage.rows = sum(flushed.values())
+
+        for table, num_rows in flushed.items():
+            count(f"{table}_flushed", num_rows)
+
+        if flushed["products"]:
+            self.products.set_popularity_scores()
+
+        log.info(
+            "Flushed %s product(s), %s user(s) and %s order line(s) to the database.",
+            flushed["products"],
+            flushed["users"],
+            flushed["order_lines"],
+        )
+
+    def rebuild_sales_summary(self) -> None:
+        """Rebuild the daily sales summary tables from all orders in the database."""
+        self.orders.daily_sales.rebuild()
+
     def to_csv(
         self,
         start_date: str | None = None,
@@ -93,6 +208,8 @@ class Ecommerce:
         """
         Export product, user and order data to a CSV file locally and/or to Google Cloud Storage depending on the env config.
 
+        Rows are read from the simulation store, so only data generated by this instance is exported and no query is made.
+
         Args:
             start_date (str | None): Start date (inclusive) in 'YYYY-MM-DD' format.
             end_date (str | None): End date (inclusive) in 'YYYY-MM-DD' format.
@@ -100,19 +217,38 @@ class Ecommerce:
             timestamp (str): The timestamp for the csv filename.
 
         """
-        self.products.to_csv(
-            start_date=start_date,
-            end_date=end_date,
-            timestamp=timestamp,
-        )
-        self.users.to_csv(
-            start_date=start_date,
-            end_date=end_date,
-            timestamp=timestamp,
-        )
-        self.orders.to_csv(
-            start_date=start_date,
-            end_date=end_date,
-            timestamp=timestamp,
-            messy_data=messy_data,
-        )
+        with stage("ecommerce.export"), memory_snapshot("ecommerce.export"):
+            self.products.to_csv(
+                start_date=start_date,
+                end_date=end_date,
+                timestamp=timestamp,
+                store=self.store,
+            )
+            self.users.to_csv(
+                start_date=start_date,
+                end_date=end_date,
+                timestamp=timestamp,
+                store=self.store,
+            )
+            self.orders.to_csv(
+                start_date=start_date,
+                end_date=end_date,
+                timestamp=timestamp,
+                store=self.store,
+                messy_data=messy_data,
+            )
+
+    def export_changes(self, timestamp: str, *, messy_data: bool = False) -> dict[str, int]:
+        """
+        Export every product, user and order line added or changed since the previous incremental export.
+
+        Args:
+            timestamp (str): The timestamp for the csv filenames.
+            messy_data (bool): If True, introduces a randomised amount of 'dirty' data to the order data.
+
+        Returns:
+            dict[str, int]: Number of rows exported per table.
+
+        """
+        with memory_snapshot("ecommerce.export_changes"):
+            return self.incremental_export.export(timestamp, messy_data=messy_data)
@@ -0,0 +1,461 @@
+import abc
+import importlib
+import json
+import math
+import os
+import queue
+import socket
+import statistics
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from data_generator.Orders import Orders
+from data_generator.SimulationStore import LocalIdAllocator, SimulationStore, to_db_datetime
+from data_generator.Users import Users
+from shared.db_connection import get_session
+from shared.logger import get_logger
+from shared.metrics import stage
+
+log = get_logger(__name__)
+
+# Events are written in chunks of about this many seconds of the target rate, so pacing stays smooth.
+EMIT_INTERVAL_SECONDS = 0.05
+# Orders are generated in batches of about this many seconds of the target rate.
+BATCH_SECONDS = 0.5
+# If the sink falls further behind schedule than this, the schedule is reset rather than bursting to catch up.
+MAX_LAG_SECONDS = 1.0
+
+
+def _json_default(value: object) -> object:
+    """
+    Serialise values the json module can't handle natively.
+
+    Args:
+        value (object): The value to serialise.
+
+    Raises:
+        TypeError: If the value type is not supported.
+
+    Returns:
+        object: A JSON serialisable representation of the value.
+
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    error_msg = f"Object of type {type(value).__name__} is not JSON serializable"
+    raise TypeError(error_msg)
+
+
+def encode_event(event_type: str, record: tuple) -> bytes:
+    """
+    Encode a record as an NDJSON event without its closing brace, the emitter appends the event_time.
+
+    Args:
+        event_type (str): The event type, 'user' or 'order_line'.
+        record (tuple): A User or Order record.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON object, missing its final '}'.
+
+    """
+    data = json.dumps({"event_type": event_type, **record._asdict()}, default=_json_default, separators=(",", ":"))
+    return data[:-1].encode()
+
+
+class EventSink(abc.ABC):
+    """
+    Base class for event destinations.
+
+    Plug in another destination by subclassing EventSink and passing 'package.module:ClassName' as the sink.
+    write() should block while the destination can't accept more data, that's what applies backpressure.
+
+    """
+
+    @abc.abstractmethod
+    def write(self, data: bytes) -> None:
+        """
+        Write a chunk of complete NDJSON lines.
+
+        Args:
+            data (bytes): One or more newline terminated events.
+
+        """
+
+    def close(self) -> None:
+        """Release the destination."""
+
+
+class StdoutSink(EventSink):
+    """Writes events to standard output, log records go to standard error."""
+
+    def write(self, data: bytes) -> None:
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+
+class UnixSocketSink(EventSink):
+    """
+    Streams events to a consumer listening on a Unix domain socket.
+
+    Attributes:
+        path (str): The socket path.
+
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+
+    def write(self, data: bytes) -> None:
+        # sendall blocks while the consumer's receive buffer is full.
+        self.socket.sendall(data)
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+class RotatingFileSink(EventSink):
+    """
+    Appends events to a file, rotating it to path.1, path.2, ... when it reaches max_bytes.
+
+    Files are only rotated between chunks, so an event is never split across files.
+
+    Attributes:
+        path (str): The active file.
+        max_bytes (int): Size at which the file is rotated.
+        backup_count (int): Number of rotated files kept.
+
+    """
+
+    def __init__(self, path: str, max_bytes: int = 100_000_000, backup_count: int = 5) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file = open(path, "ab")
+        self.size = self.file.tell()
+
+    def write(self, data: bytes) -> None:
+        if self.size > 0 and self.size + len(data) > self.max_bytes:
+            self._rotate()
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def _rotate(self) -> None:
+        self.file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, "ab")
+        self.size = 0
+        log.debug("Rotated event file %s.", self.path)
+
+
+def create_sink(spec: str, *, max_bytes: int = 100_000_000, backup_count: int = 5) -> EventSink:
+    """
+    Create a sink from its command line spec.
+
+    Args:
+        spec (str): 'stdout', 'unix:PATH', 'file:PATH' or 'package.module:ClassName' for a custom EventSink.
+        max_bytes (int): Size at which a file sink is rotated.
+        backup_count (int): Number of rotated files a file sink keeps.
+
+    Returns:
+        EventSink: The sink.
+
+    Raises:
+        ValueError: If the spec isn't recognised or the class isn't an EventSink.
+
+    """
+    kind, _, target = spec.partition(":")
+    if spec == "stdout":
+        return StdoutSink()
+    if kind == "unix" and target:
+        return UnixSocketSink(target)
+    if kind == "file" and target:
+        return RotatingFileSink(target, max_bytes, backup_count)
+    if target:
+        sink_class = getattr(importlib.import_module(kind), target)
+        if isinstance(sink_class, type) and issubclass(sink_class, EventSink):
+            return sink_class()
+    error_msg = f"Unknown sink '{spec}', expected stdout, unix:PATH, file:PATH or package.module:ClassName."
+    raise ValueError(error_msg)
+
+
+@dataclass
+class StreamReport:
+    """
+    Rate accuracy and throughput of an event stream run.
+
+    Attributes:
+        target_rate (float): The requested events per second.
+        events (int): Events emitted.
+        seconds (float): Time from the first write to the end of the last chunk's slot in the schedule.
+        achieved_rate (float): Events per second actually emitted.
+        rate_error_pct (float): Relative difference between the achieved and target rate.
+        window_rates (dict): Min, median and max events emitted in each whole second.
+        max_lag_seconds (float): Furthest the sink fell behind schedule.
+        schedule_resets (int): Times the sink fell more than MAX_LAG_SECONDS behind and the schedule was reset.
+        backpressure_seconds (float): Time generation waited for the emitter because the queue was full.
+        generation_events_per_sec (float): Events generated per second of generation time.
+        sink_events_per_sec (float): Events written per second of sink write time.
+        max_sustainable_rate (float): The lower of the generation and sink throughput.
+
+    """
+
+    target_rate: float
+    events: int = 0
+    seconds: float = 0.0
+    achieved_rate: float = 0.0
+    rate_error_pct: float = 0.0
+    window_rates: dict = field(default_factory=dict)
+    max_lag_seconds: float = 0.0
+    schedule_resets: int = 0
+    backpressure_seconds: float = 0.0
+    generation_events_per_sec: float = 0.0
+    sink_events_per_sec: float = 0.0
+    max_sustainable_rate: float = 0.0
+
+
+class EventStream:
+    """
+    A class to emit users and order lines continuously as NDJSON events at a target rate.
+
+    A producer thread generates batches of orders with the Orders and Users classes and queues their encoded events.
+    The emitter writes them to the sink in small chunks paced to the target rate. The queue is bounded, so a sink
+    that can't keep up blocks the emitter, the queue fills and generation waits: memory stays bounded and the
+    report shows where the stream was limited.
+
+    Attributes:
+        users (Users): Generates the new users of each batch.
+        orders (Orders): Generates each batch of orders.
+        sink (EventSink): Where events are written.
+        rate (float): Target events per second.
+        max_num_items (int): Maximum number of items in an order.
+        persist (bool): Also insert the generated users and order lines into the database.
+        local_ids (LocalIdAllocator | None): Assigns IDs when events aren't persisted, None when they are.
+        max_pending_batches (int): Batches that can be queued before generation waits.
+
+    """
+
+    def __init__(
+        self,
+        users: Users,
+        orders: Orders,
+        sink: EventSink,
+        rate: float,
+        *,
+        max_num_items: int = 7,
+        persist: bool = False,
+        max_pending_batches: int = 4,
+    ) -> None:
+        if rate <= 0:
+            error_msg = f"The event rate must be positive, got {rate}."
+            raise ValueError(error_msg)
+        self.users = users
+        self.orders = orders
+        self.sink = sink
+        self.rate = rate
+        self.max_num_items = max_num_items
+        self.persist = persist
+        self.max_pending_batches = max_pending_batches
+        # Events that aren't persisted take their IDs from this process, so streaming never writes to the database.
+        self.local_ids = None if persist else LocalIdAllocator()
+
+    def run(self, duration: float | None = None, max_events: int | None = None) -> StreamReport:
+        """
+        Stream events until the duration has passed or max_events have been emitted, or until interrupted.
+
+        Args:
+            duration (float | None): Seconds to stream for, None for no limit.
+            max_events (int | None): Events to emit, None for no limit.
+
+        Returns:
+            StreamReport: Rate accuracy and throughput of the run.
+
+        """
+        report = StreamReport(target_rate=self.rate)
+        windows: dict[int, int] = {}
+        batches: queue.Queue = queue.Queue(maxsize=self.max_pending_batches)
+        stopped = threading.Event()
+        errors: list[BaseException] = []
+        producer = threading.Thread(
+            target=self._produce,
+            args=(batches, stopped, errors, report),
+            name="event-stream-producer",
+            daemon=True,
+        )
+        producer.start()
+
+        try:
+            self._emit(batches, errors, report, windows, duration, max_events)
+        except KeyboardInterrupt:
+            log.info("Event stream interrupted.")
+        finally:
+            stopped.set()
+            producer.join()
+            self.sink.close()
+
+        self._summarise(report, windows)
+        return report
+
+    def _produce(
+        self,
+        batches: queue.Queue,
+        stopped: threading.Event,
+        errors: list[BaseException],
+        report: StreamReport,
+    ) -> None:
+        """Generate batches of events until stopped, waiting while the queue is full."""
+        events_per_order = 2.5
+        generated_events = 0
+        generation_seconds = 0.0
+
+        try:
+            while not stopped.is_set():
+                num_orders = max(1, math.ceil(self.rate * BATCH_SECONDS / events_per_order))
+                start = time.perf_counter()
+                events = self._generate_batch(num_orders)
+                generation_seconds += time.perf_counter() - start
+                generated_events += len(events)
+                events_per_order = len(events) / num_orders
+                report.generation_events_per_sec = round(generated_events / generation_seconds, 2)
+
+                waited = time.perf_counter()
+                self._put(batches, events, stopped)
+                report.backpressure_seconds += time.perf_counter() - waited
+        except BaseException as e:
+            errors.append(e)
+            self._put(batches, None, stopped)
+
+    def _put(self, batches: queue.Queue, events: list[bytes] | None, stopped: threading.Event) -> None:
+        """Queue a batch, waiting while the queue is full unless the stream stops."""
+        while not stopped.is_set():
+            try:
+                batches.put(events, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _generate_batch(self, num_orders: int) -> list[bytes]:
+        """
+        Generate a batch of orders and encode their new users and order lines as events.
+
+        Args:
+            num_orders (int): Number of orders to generate.
+
+        Returns:
+            list[bytes]: Encoded events, users before the order lines that reference them.
+
+        """
+        store = SimulationStore(self.local_ids)
+        now = datetime.now(tz=timezone.utc)
+        # Orders and their new users are stamped with the generation time, so no event is dated after it's emitted.
+        timestamps = [to_db_datetime(now)] * num_orders
+        order_lines = self.orders.create(self.users, num_orders, self.max_num_items, now, store, timestamps) or []
+        users = store.users.records()
+
+        if self.persist:
+            with stage("event_stream.persist", rows=len(users) + len(order_lines)), get_session() as db:
+                store.flush(db)
+                self.orders.daily_sales.update(db, order_lines, {user.user_id: user.user_country for user in users})
+
+        return [encode_event("user", user) for user in users] + [
+            encode_event("order_line", order_line) for order_line in order_lines
+        ]
+
+    def _emit(
+        self,
+        batches: queue.Queue,
+        errors: list[BaseException],
+        report: StreamReport,
+        windows: dict[int, int],
+        duration: float | None,
+        max_events: int | None,
+    ) -> None:
+        """Write queued events to the sink in chunks paced to the target rate, counting events per second."""
+        chunk_size = max(1, round(self.rate * EMIT_INTERVAL_SECONDS))
+        sink_seconds = 0.0
+        start = None
+        scheduled = 0
+
+        while True:
+            events = batches.get()
+            if events is None:
+                raise errors[0]
+            if start is None:
+                # The clock starts with the first batch, so loading products and Faker isn't counted as lag.
+                start = schedule_start = time.perf_counter()
+
+            for offset in range(0, len(events), chunk_size):
+                due = schedule_start + scheduled / self.rate
+                if max_events is not None and report.events >= max_events:
+                    return
+                if duration is not None and max(due, time.perf_counter()) - start >= duration:
+                    return
+
+                chunk = events[offset : offset + chunk_size]
+                if max_events is not None:
+                    chunk = chunk[: max_events - report.events]
+
+                lag = time.perf_counter() - due
+                if lag < 0:
+                    time.sleep(-lag)
+                elif lag > MAX_LAG_SECONDS:
+                    report.schedule_resets += 1
+                    schedule_start, scheduled = time.perf_counter(), 0
+                report.max_lag_seconds = max(report.max_lag_seconds, lag)
+
+                event_time = b',"event_time":"' + datetime.now(tz=timezone.utc).isoformat().encode() + b'"}\n'
+                data = b"".join(event + event_time for event in chunk)
+                written = time.perf_counter()
+                self.sink.write(data)
+                finished = time.perf_counter()
+
+                sink_seconds += finished - written
+                scheduled += len(chunk)
+                report.events += len(chunk)
+                # Each chunk covers its slot of the schedule, so a perfectly paced run reports exactly the target rate,
+                # unless the write itself took longer.
+                report.seconds = max(written + len(chunk) / self.rate, finished) - start
+                report.sink_events_per_sec = round(report.events / sink_seconds, 2) if sink_seconds > 0 else 0.0
+                second = int(finished - start)
+                windows[second] = windows.get(second, 0) + len(chunk)
+
+    def _summarise(self, report: StreamReport, windows: dict[int, int]) -> None:
+        """Work out the achieved rate, per second rate spread and sustainable rate, and log the report."""
+        # The last second is usually partial, so it's left out of the per second spread.
+        full_seconds = [windows.get(second, 0) for second in range(int(report.seconds))]
+        report.window_rates = (
+            {"min": min(full_seconds), "median": statistics.median(full_seconds), "max": max(full_seconds)}
+            if full_seconds
+            else {}
+        )
+        report.achieved_rate = round(report.events / report.seconds, 2) if report.seconds > 0 else 0.0
+        report.rate_error_pct = round((report.achieved_rate - self.rate) / self.rate * 100, 2)
+        report.max_lag_seconds = round(report.max_lag_seconds, 4)
+        report.backpressure_seconds = round(report.backpressure_seconds, 4)
+        report.seconds = round(report.seconds, 4)
+        report.max_sustainable_rate = min(
+            report.generation_events_per_sec or math.inf,
+            report.sink_events_per_sec or math.inf,
+        )
+        if report.max_sustainable_rate == math.inf:
+            report.max_sustainable_rate = 0.0
+
+        summary = asdict(report)
+        log.info("Event stream report: %s", json.dumps(summary), extra={"json_fields": summary})
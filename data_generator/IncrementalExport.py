@@ -0,0 +1,147 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from data_generator.Orders import Orders
+from data_generator.Products import Products
+from data_generator.Users import Users
+from shared.db_connection import get_session
+from shared.db_models import (
+    ExportWatermarkModel,
+    Order,
+    OrdersModel,
+    Product,
+    ProductsModel,
+    User,
+    UsersModel,
+    record_columns,
+)
+from shared.logger import get_logger
+from shared.metrics import stage
+
+log = get_logger(__name__)
+
+
+class IncrementalExport:
+    """
+    A class to export only the rows added or changed since the previous export, using watermarks stored in the database.
+
+    Users and order lines are only ever inserted, so their watermark is the last exported ID.
+    Products are updated in place, so their watermark is the last exported (date_updated, item_sku) and price or
+    active changes are exported again. Each export reads O(new rows) using the primary keys and the products
+    date_updated index. Export when no generation is in progress, IDs are reserved before rows are committed, so a
+    concurrent worker could commit rows below an already advanced watermark.
+
+    Attributes:
+        products (Products): Writes the product report.
+        users (Users): Writes the user report.
+        orders (Orders): Writes the order report.
+
+    """
+
+    def __init__(self, products: Products, users: Users, orders: Orders) -> None:
+        self.products = products
+        self.users = users
+        self.orders = orders
+
+    def export(self, timestamp: str, *, messy_data: bool = False) -> dict[str, int]:
+        """
+        Export new and changed rows and advance the watermarks.
+
+        The watermarks are committed only after every report has been written, so a failed export is retried in
+        full by the next one.
+
+        Args:
+            timestamp (str): The timestamp for the csv filenames.
+            messy_data (bool): If True, introduces a randomised amount of 'dirty' data to the order data.
+
+        Returns:
+            dict[str, int]: Number of rows exported per table.
+
+        """
+        with stage("incremental_export") as export_stage, get_session() as db:
+            watermarks = {
+                table_name: db.get(ExportWatermarkModel, table_name) or ExportWatermarkModel(table_name=table_name)
+                for table_name in ("products", "users", "orders")
+            }
+            exported = {
+                "products": self._export_products(db, watermarks["products"], timestamp),
+                "users": self._export_users(db, watermarks["users"], timestamp),
+                "orders": self._export_orders(db, watermarks["orders"], timestamp, messy_data=messy_data),
+            }
+
+            date_exported = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+            for watermark in watermarks.values():
+                watermark.date_exported = date_exported
+                db.add(watermark)
+            export_stage.rows = sum(exported.values())
+
+        log.info(
+            "Exported %s changed product(s), %s new user(s) and %s new order line(s).",
+            exported["products"],
+            exported["users"],
+            exported["orders"],
+        )
+        return exported
+
+    def _export_products(self, db: Session, watermark: ExportWatermarkModel, timestamp: str) -> int:
+        query = select(*record_columns(Product, ProductsModel)).order_by(
+            ProductsModel.date_updated,
+            ProductsModel.item_sku,
+        )
+        if watermark.last_date_updated is not None:
+            query = query.where(
+                or_(
+                    ProductsModel.date_updated > watermark.last_date_updated,
+                    and_(
+                        ProductsModel.date_updated == watermark.last_date_updated,
+                        ProductsModel.item_sku > watermark.last_key,
+                    ),
+                ),
+            )
+
+        with stage("products.export.query") as query_stage:
+            products = [Product._make(row) for row in db.execute(query)]
+            query_stage.rows = len(products)
+
+        if products:
+            self.products.write_csv(products, timestamp)
+            watermark.last_date_updated = products[-1].date_updated
+            watermark.last_key = products[-1].item_sku
+        return len(products)
+
+    def _export_users(self, db: Session, watermark: ExportWatermarkModel, timestamp: str) -> int:
+        query = select(*record_columns(User, UsersModel)).order_by(UsersModel.user_id)
+        if watermark.last_id is not None:
+            query = query.where(UsersModel.user_id > watermark.last_id)
+
+        with stage("users.export.query") as query_stage:
+            users = [User._make(row) for row in db.execute(query)]
+            query_stage.rows = len(users)
+
+        if users:
+            self.users.write_csv(users, timestamp)
+            watermark.last_id = users[-1].user_id
+        return len(users)
+
+    def _export_orders(
+        self,
+        db: Session,
+        watermark: ExportWatermarkModel,
+        timestamp: str,
+        *,
+        messy_data: bool,
+    ) -> int:
+        query = select(*record_columns(Order, OrdersModel)).order_by(OrdersModel.order_line_id)
+        if watermark.last_id is not None:
+            query = query.where(OrdersModel.order_line_id > watermark.last_id)
+
+        with stage("orders.export.query") as query_stage:
+            orders = [Order._make(row) for row in db.execute(query)]
+            query_stage.rows = len(orders)
+
+        if orders:
+            self.orders.write_csv(orders, timestamp, messy_data=messy_data)
+            watermark.last_id = orders[-1].order_line_id
+        return len(orders)
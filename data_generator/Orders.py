@@ -1,18 +1,24 @@
-import csv
-import io
 import math
 import random
-from dataclasses import astuple
+from array import array
 from datetime import datetime, timezone
 
-from sqlalchemy import func
+from sqlalchemy import func, select
 
 from data_generator import Users
-from data_generator.google_cloud_storage import upload_to_bucket
+from data_generator.DailySales import DailySales
+from data_generator.DemandCurve import DemandCurve
+from data_generator.google_cloud_storage import upload_file_to_bucket
+from data_generator.PopularitySnapshot import PopularitySnapshot
+from data_generator.profiling import memory_snapshot
+from data_generator.seeding import RandomStreams
+from data_generator.SimulationStore import SimulationStore
+from data_generator.spooling import SpooledCSV, get_spool_dir
 from shared.config import get_config
-from shared.db_connection import get_session
-from shared.db_models import Order, OrdersModel, ProductsModel, UsersModel
+from shared.db_connection import get_read_session, get_session
+from shared.db_models import Order, OrdersModel, UsersModel, record_columns
 from shared.logger import get_logger
+from shared.metrics import stage
 
 log = get_logger(__name__)
 config = get_config()
@@ -21,24 +27,49 @@ config = get_config()
 class Orders:
     """A class to generate, retrieve, and export order data using SQLAlchemy."""
 
+    def __init__(self, seed: int | None = None) -> None:
+        """
+        Initialise the Orders class with a seed for reproducible generation.
+
+        Args:
+            seed (int | None): Root seed for the random streams, if None generation is not reproducible.
+
+        """
+        self.daily_sales = DailySales()
+        self.random_streams = RandomStreams(seed)
+        self._previous_users = array("q")
+        self._previous_users_before: datetime | None = None
+
     def create(
         self,
         users: Users,
         num_orders: int,
         max_num_items: int,
         date_created: datetime,
+        store: SimulationStore | None = None,
+        timestamps: list[datetime] | None = None,
+        profiles: list[tuple[str, str, str, str]] | None = None,
     ) -> list[Order] | None:
         """
-        Generates and adds fake orders to the database.
+        Generates fake orders and adds them to the database, or to a simulation store for deferred persistence.
+
+        Orders flushed immediately are added to the daily sales summaries in the same session.
+        Orders are spread across the day by the time of day demand curve, with a pre-order spike on days new
+        products launch, and order IDs ascend with their timestamps.
 
         Args:
             users (Users): An instance of the Users class.
             num_orders (int): Number of orders to generate.
             max_num_items (int): Maximum number of items in an order.
-            date_created (datetime): The date the order was created.
+            date_created (datetime): The day the orders are created.
+            store (SimulationStore | None): Store to generate into. If None the orders and their new users are flushed to the database immediately.
+            timestamps (list[datetime] | None): The sorted naive UTC timestamp of each order, e.g. the generation time
+                when streaming. If None the orders are spread across the day by the demand curve.
+            profiles (list[tuple[str, str, str, str]] | None): Profiles from Users.generate_profiles() for the new
+                users, at least one per order. If None they're generated with the users.
 
         Returns:
-            list[Order] | None: A list of created Order dataclass instances.
+            list[Order] | None: A list of created Order records.
 
         """
         if num_orders == 0:
@@ -48,141 +79,239 @@ class Orders:
 
         log.debug("Generating %s orders.", num_orders)
 
-        products = self._get_active_products()
-        user_ids = self._get_user_ids(users, num_orders, date_created)
-        order_models = self._generate_order_lines(
-            products,
-            user_ids,
-            num_orders,
-            max_num_items,
-            date_created,
-        )
-
-        with get_session() as db:
-            db.add_all(order_models)
-            db.flush()
-            log.debug("Flushed %s orders to the database.", len(order_models))
-            orders = [order.to_plain() for order in order_models]
+        target = store if store is not None else SimulationStore()
+        rng = self.random_streams.spawn("orders", date_created.date().isoformat())
+        with stage("orders.load_products") as products_stage:
+            products = self._get_active_products(target)
+            products_stage.rows = len(products)
+        if timestamps is None:
+            with stage("orders.timestamps", rows=num_orders):
+                preorder_share = self._get_preorder_share(products, date_created)
+                timestamps = DemandCurve(date_created, preorder_share=preorder_share).timestamps(num_orders, rng)
+        user_ids, new_user_countries = self._get_user_ids(users, timestamps, date_created, target, rng, profiles)
+        start = len(target.order_lines)
+        with stage("orders.generate_lines") as lines_stage:
+            lines_stage.rows = self._generate_order_lines(
+                products,
+                user_ids,
+                timestamps,
+                max_num_items,
+                target,
+                rng,
+            )
+        orders = target.order_lines.records(start)
 
-        log.info("%s order line(s) added to the database.", len(orders))
+        if store is None:
+            with stage("orders.flush", rows=len(orders)), get_session() as db:
+                target.flush(db)
+                self.daily_sales.update(db, orders, new_user_countries)
+            log.info("%s order line(s) added to the database.", len(orders))
+        else:
+            log.info("%s order line(s) generated.", len(orders))
 
         return orders
 
-    def _get_active_products(self) -> dict[str, dict]:
+    def _get_active_products(self, store: SimulationStore) -> PopularitySnapshot:
         """
-        Retrieve active products from the database and returns basic details.
+        Load the popularity snapshot of the active products, extended with those in the simulation store.
+
+        Args:
+            store (SimulationStore): Store holding products not yet flushed to the database.
 
         Raises:
-            ValueError: If no products in the database, no orders can be created.
+            ValueError: If no active products in the database, no orders can be created.
 
         Returns:
-            dict: A dictionary of item_sku keys and item_price and item_popularity values {item_sku: {item_price: value}, {item_popularity: value}}
+            PopularitySnapshot: The SKU, price, popularity, release and creation date of every active product.
 
         """
         with get_session() as db:
-            product_models = db.query(ProductsModel).all()
-            if len(product_models) < 1:
-                error_msg = "ERROR in Orders.create(): Can't generate orders without any products in the database."
-                raise ValueError(error_msg)
-            products = [p.to_plain() for p in product_models]
-
-        active_products = {
-            product.item_sku: {
-                "item_price": product.item_price,
-                "item_popularity": product.item_popularity,
-            }
-            for product in products
-            if product.active
-        }
+            active_products = PopularitySnapshot.load(db)
+
+        active_products = active_products.extend(store.products.records(store.products.flushed))
+        if len(active_products) < 1:
+            error_msg = "ERROR in Orders.create(): Can't generate orders without any active products in the database."
+            raise ValueError(error_msg)
+
         log.debug(
             "%d active products will be used for order generation.",
             len(active_products),
         )
         return active_products
 
-    def _get_user_ids(self, users: Users, num_orders: int, date_created: datetime) -> list[int]:
+    def _get_preorder_share(self, products: PopularitySnapshot, date_created: datetime) -> float:
+        """
+        Share of the day's demand for products launched on pre-order that day, by popularity.
+
+        Args:
+            products (PopularitySnapshot): The active products.
+            date_created (datetime): The day the orders are created.
+
+        Returns:
+            float: The popularity share of the products launched, 0 if none launched.
+
+        """
+        day = date_created.toordinal()
+        total = sum(products.popularities)
+        launched = sum(
+            popularity
+            for popularity, created_day, release_day in zip(
+                products.popularities,
+                products.created_days,
+                products.release_days,
+                strict=True,
+            )
+            if created_day == day and release_day > day
+        )
+        return launched / total if total else 0.0
+
+    def _get_user_ids(
+        self,
+        users: Users,
+        timestamps: list[datetime],
+        date_created: datetime,
+        store: SimulationStore,
+        rng: random.Random,
+        profiles: list[tuple[str, str, str, str]] | None = None,
+    ) -> tuple[list[int], dict[int, str]]:
         """
         Generate a list of new and existing user IDs for orders, weighted towards new users to simulate realistics user activity.
 
+        New users are created at the time of their order. Returning customers are sampled from the users created
+        before the first order, so no order predates its customer, even if later days were generated first.
+
         Args:
             users (Users): An instance of the Users class.
-            num_orders (int): The number of orders to generate.
-            date_created (datetime): The date the user was created.
+            timestamps (list[datetime]): The sorted order timestamps, one user ID is returned per order.
+            date_created (datetime): The day the users are created.
+            store (SimulationStore): Store the new users are generated into.
+            rng (random.Random): The random number generator for this batch of orders.
+            profiles (list[tuple[str, str, str, str]] | None): Profiles for the new users, if None they're generated.
 
         Returns:
-            list[int]: A list of unique user_ids.
+            tuple[list[int], dict[int, str]]: The user_id of each order, and the country of each newly created user
+                keyed by user_id.
 
         """
-        ratio_previous_users = random.uniform(0.0, 0.1)
+        num_orders = len(timestamps)
+        ratio_previous_users = rng.uniform(0.0, 0.1)
         num_previous_users = round(num_orders * ratio_previous_users)
-        with get_session() as db:
-            previous_users = db.query(UsersModel).order_by(func.random()).limit(num_previous_users).all()
-            previous_users_ids = [user.user_id for user in previous_users]
+        with stage("orders.select_previous_users", rows=num_previous_users):
+            candidate_ids = self._load_previous_users(timestamps[0])
+            previous_users_ids = rng.sample(candidate_ids, min(num_previous_users, len(candidate_ids)))
+
+        returning_orders = set(rng.sample(range(num_orders), len(previous_users_ids)))
+        rng.shuffle(previous_users_ids)
+        new_user_timestamps = [timestamp for i, timestamp in enumerate(timestamps) if i not in returning_orders]
+        with memory_snapshot("users.create"):
+            new_users = (
+                users.create(
+                    len(new_user_timestamps),
+                    date_created,
+                    store,
+                    timestamps=new_user_timestamps,
+                    profiles=profiles,
+                )
+                or []
+            )
+
+        previous_users = iter(previous_users_ids)
+        new_users_ids = iter([user.user_id for user in new_users])
+        all_users_ids = [
+            next(previous_users) if i in returning_orders else next(new_users_ids) for i in range(num_orders)
+        ]
+
+        return all_users_ids, {user.user_id: user.user_country for user in new_users}
+
+    def _load_previous_users(self, before: datetime) -> array:
+        """
+        Load the IDs of the users created before a time, the candidate returning customers.
 
-        num_new_users = num_orders - len(previous_users_ids)
-        new_users = users.create(num_new_users, date_created)
-        new_users_ids = [user.user_id for user in new_users]
-        all_users_ids = previous_users_ids + new_users_ids
-        random.shuffle(all_users_ids)
+        Candidates are loaded in ID order and sampled by the caller rather than with ORDER BY random(), so the choice
+        is reproducible. IDs are handed out in the order days are generated, so a backfill's users have higher IDs
+        than later dated users and IDs can't stand in for creation time.
+
+        The event stream creates batch after batch with the same Orders instance, so later calls only load the users
+        created since the previous call's time. Users inserted in the meantime with an earlier creation time, e.g. by
+        a backfill, aren't picked up.
+
+        Args:
+            before (datetime): The naive UTC time of the first order.
+
+        Returns:
+            array: The candidate user IDs.
 
-        return all_users_ids
+        """
+        query = select(UsersModel.user_id).where(UsersModel.date_created < before).order_by(UsersModel.user_id)
+        if self._previous_users_before is not None and before >= self._previous_users_before:
+            query = query.where(UsersModel.date_created >= self._previous_users_before)
+        else:
+            self._previous_users = array("q")
+        with get_session() as db:
+            self._previous_users.extend(db.scalars(query))
+        self._previous_users_before = before
+        return self._previous_users
 
     def _generate_order_lines(
         self,
-        products: dict,
+        products: PopularitySnapshot,
         user_ids: list[int],
-        num_orders: int,
+        timestamps: list[datetime],
         max_num_items: int,
-        date_created: datetime,
-    ) -> list[OrdersModel]:
+        store: SimulationStore,
+        rng: random.Random,
+    ) -> int:
         """
         Creates order lines by assigning random products and quantities to a series of user orders.
 
-        For each order a random user ID is assigned from the provided list and a number of random products are assigned based on product popularity weights.
+        Each order gets the user ID and timestamp at its position in the provided lists and a number of random products assigned based on product popularity weights.
 
         Args:
-            products (dict): A dictionary of item_sku keys and item_price and item_popularity values.
-            user_ids (list[int]): A list of user IDs.
-            num_orders (int): The total number of orders to generate.
+            products (PopularitySnapshot): The active products.
+            user_ids (list[int]): The user ID of each order.
+            timestamps (list[datetime]): The sorted naive UTC timestamp of each order, one order is generated per timestamp.
             max_num_items (int): Maximum number of items allowed per order.
-            date_created (datetime): The date the order was created.
+            store (SimulationStore): Store the order lines are generated into.
+            rng (random.Random): The random number generator for this batch of orders.
 
         Returns:
-            list[OrdersModel]: A list of OrdersModel instances representing all order lines across the generated orders.
+            int: The number of order lines generated across all orders.
 
         """
-        last_order_id = self._get_last_order_id()
-        skus = list(products)
-        popularities = [data["item_popularity"] for product, data in products.items()]
-
-        order_models: list[OrdersModel] = []
-
-        for i in range(num_orders):
-            items_in_order = self._get_random_num_items(max_num_items)
-            order_id = (last_order_id + 1) + i
+        num_orders = len(timestamps)
+        first_order_id = store.reserve_ids(OrdersModel.order_id, num_orders)
+        # Products are drawn by index straight from the snapshot's cumulative weights, which are computed once.
+        indexes = range(len(products))
+        cum_weights = products.cum_weights
+        orders = []
+
+        for items_in_order in self._get_random_num_items(max_num_items, num_orders, rng):
             order_lines = {}
 
-            for _ in range(items_in_order):
-                random_product = random.choices(skus, popularities)[0]
-
+            for random_product in rng.choices(indexes, cum_weights=cum_weights, k=items_in_order):
                 if random_product in order_lines:
                     order_lines[random_product] += 1
                 else:
                     order_lines[random_product] = 1
 
-            for item_sku, qty in order_lines.items():
-                price = products[item_sku]["item_price"]
-                order_line = OrdersModel(
-                    order_id=order_id,
+            orders.append(order_lines)
+
+        num_order_lines = sum(len(order_lines) for order_lines in orders)
+        order_line_id = store.reserve_ids(OrdersModel.order_line_id, num_order_lines)
+        for i, order_lines in enumerate(orders):
+            for index, qty in order_lines.items():
+                store.order_lines.append(
+                    order_line_id=order_line_id,
+                    order_id=first_order_id + i,
                     user_id=user_ids[i],
-                    item_sku=item_sku,
+                    item_sku=products.skus[index],
                     qty=qty,
-                    item_price=price,
-                    date_created=date_created,
+                    item_price=products.prices[index],
+                    date_created=timestamps[i],
                 )
-                order_models.append(order_line)
+                order_line_id += 1
 
-        return order_models
+        return num_order_lines
 
     def get_count_orders(self) -> int:
         """
@@ -192,7 +321,7 @@ class Orders:
             int: Total order count.
 
         """
-        with get_session() as db:
+        with get_read_session() as db:
             count_orders = db.query(OrdersModel).count()
         return count_orders
 
@@ -211,7 +340,7 @@ class Orders:
             end_date (str | None): End date (inclusive) in 'YYYY-MM-DD' format.
 
         Returns:
-            list[Order]: List of Order dataclass instances matching the filters.
+            list[Order]: List of Order records matching the filters.
 
         """
         log.debug(
@@ -226,8 +355,8 @@ class Orders:
         if end_date:
             end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
 
-        with get_session() as db:
-            query = db.query(OrdersModel)
+        with get_read_session() as db:
+            query = db.query(*record_columns(Order, OrdersModel))
 
             if start_date:
                 query = query.filter(func.date(OrdersModel.date_created) >= start_date)
@@ -241,14 +370,15 @@ class Orders:
                 else:
                     query = query.filter(OrdersModel.order_id == order_id)
 
-            return [order.to_plain() for order in query.all()]
+            return [Order._make(row) for row in query.all()]
 
-    def _introduce_messy_data(self, orders: list[Order]) -> list[tuple]:
+    def _introduce_messy_data(self, orders: list[Order], rng: random.Random) -> list[tuple]:
         """
         Introduces a small randomised amount of dirty data to the order data.
 
         Args:
-            orders (list[Order]): A list of Order dataclass instances.
+            orders (list[Order]): A list of Order records.
+            rng (random.Random): The random number generator for this export.
 
         Returns:
             list[tuple]: A list of tuples representing rows of order lines with messy data.
@@ -257,24 +387,24 @@ class Orders:
         messy_orders = []
 
         for order in orders:
-            messy_order = list(astuple(order))
+            messy_order = list(order)
 
             # Change date strings
-            if random.random() < 0.05:
-                if random.random() < 0.5:
+            if rng.random() < 0.05:
+                if rng.random() < 0.5:
                     messy_order[6] = messy_order[6].strftime("%d/%m/%Y")
                 else:
                     messy_order[6] = messy_order[6].strftime("%d-%m-%Y")
 
             # Introduce blank values
-            if random.random() < 0.1:
-                idx = random.randint(5, 6)
+            if rng.random() < 0.1:
+                idx = rng.randint(5, 6)
                 messy_order[idx] = None
 
             messy_order = tuple(messy_order)
 
             # Duplicate order rows
-            if random.random() < 0.02:
+            if rng.random() < 0.02:
                 messy_orders.append(messy_order)
 
             messy_orders.append(messy_order)
@@ -287,6 +417,7 @@ class Orders:
         start_date: str | None = None,
         end_date: str | None = None,
         timestamp: str = datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+        store: SimulationStore | None = None,
         *,
         messy_data: bool = False,
     ) -> None:
@@ -298,10 +429,33 @@ class Orders:
             start_date (str | None): Start date (inclusive) in 'YYYY-MM-DD' format.
             end_date (str | None): End date (inclusive) in 'YYYY-MM-DD' format.
             timestamp (str): The timestamp for the csv filename.
+            store (SimulationStore | None): Export the order lines generated into this store instead of querying the database.
+            messy_data (bool): If True, introduces a randomised amount of 'dirty' data to the order data.
+
+        """
+        if store is None:
+            with stage("orders.export.query") as query_stage:
+                export_data = self.get_orders(order_id, start_date, end_date)
+                query_stage.rows = len(export_data)
+        else:
+            order_ids = [order_id] if isinstance(order_id, int) else order_id
+            export_data = [
+                order
+                for order in store.order_lines.records_between(start_date, end_date)
+                if order_ids is None or order.order_id in order_ids
+            ]
+        self.write_csv(export_data, timestamp, messy_data=messy_data)
+
+    def write_csv(self, export_data: list[Order], timestamp: str, *, messy_data: bool = False) -> None:
+        """
+        Write order records to the order report CSV locally and/or to Google Cloud Storage depending on the env config.
+
+        Args:
+            export_data (list[Order]): The order records to export.
+            timestamp (str): The timestamp for the csv filename.
             messy_data (bool): If True, introduces a randomised amount of 'dirty' data to the order data.
 
         """
-        export_data = self.get_orders(order_id, start_date, end_date)
         log.debug(
             "Exporting %s orders to CSV, messy_data=%s",
             len(export_data),
@@ -312,18 +466,21 @@ class Orders:
         if len(export_data) == 0:
             return
         if messy_data:
-            export_data = self._introduce_messy_data(export_data)
+            messy_rng = self.random_streams.spawn("orders.messy_data", timestamp)
+            export_data = self._introduce_messy_data(export_data, messy_rng)
         if config.CSV_LOCAL_FILE:
-            self._save_to_file(export_data, file_path)
+            with stage("orders.export.csv_file", rows=len(export_data)):
+                self._save_to_file(export_data, file_path)
         if config.CSV_CLOUD_STORAGE_FILE:
-            self._save_to_cloud_storage(export_data, file_path)
+            with stage("orders.export.cloud_storage", rows=len(export_data)):
+                self._save_to_cloud_storage(export_data, file_path)
 
     def _save_to_file(self, export_data: list[Order] | list[tuple], file_path: str) -> None:
         """
         Save order data to a local CSV file.
 
         Args:
-            export_data (list[Order] | list[tuple]): List of Order dataclass instances or list of tuples of messy order data.
+            export_data (list[Order] | list[tuple]): List of Order records or tuples of messy order data.
             file_path (str): Path to the output CSV file.
 
         """
@@ -332,25 +489,19 @@ class Orders:
             return
         log.debug("Saving %s orders to local CSV file at %s.", len(export_data), file_path)
 
-        with open(file_path, mode="w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(
-                [
-                    "order_line_id",
-                    "order_id",
-                    "user_id",
-                    "item_sku",
-                    "qty",
-                    "item_price",
-                    "date_created",
-                ],
-            )
-
-            for row in export_data:
-                if isinstance(row, Order):
-                    writer.writerow(astuple(row))
-                else:
-                    writer.writerow(row)
+        with SpooledCSV(
+            file_path,
+            header=[
+                "order_line_id",
+                "order_id",
+                "user_id",
+                "item_sku",
+                "qty",
+                "item_price",
+                "date_created",
+            ],
+        ) as spool:
+            spool.writerows(export_data)
         log.debug("Saved order data to local file: %s.", file_path)
 
     def _save_to_cloud_storage(
@@ -362,7 +513,7 @@ class Orders:
         Upload order data as a CSV to a Google Cloud Storage bucket.
 
         Args:
-            export_data (list[Order] | list[tuple]): List of Order dataclass instances or list of tuples of messy order data.
+            export_data (list[Order] | list[tuple]): List of Order records or tuples of messy order data.
             file_path (str): File name to use in the cloud storage bucket.
 
         """
@@ -371,10 +522,11 @@ class Orders:
             return
         log.debug("Uploading %s orders to cloud storage CSV file at %s.", len(export_data), file_path)
 
-        csv_buffer = io.StringIO()
-        writer = csv.writer(csv_buffer)
-        writer.writerow(
-            [
+        # Spooled to disk instead of memory and deleted once uploaded. It isn't fsynced, a spool lost in a crash
+        # is regenerated by rerunning the day.
+        with SpooledCSV(
+            get_spool_dir() / file_path,
+            header=[
                 "order_line_id",
                 "order_id",
                 "user_id",
@@ -383,45 +535,31 @@ class Orders:
                 "item_price",
                 "date_created",
             ],
-        )
-
-        for row in export_data:
-            if isinstance(row, Order):
-                writer.writerow(astuple(row))
-            else:
-                writer.writerow(row)
-
-        upload_data = csv_buffer.getvalue()
-
-        upload_to_bucket(
-            f"order_reports/{file_path}",
-            upload_data,
-            config.STORAGE_BUCKET,
-        )
+            fsync=False,
+        ) as spool:
+            spool.writerows(export_data)
+
+        with stage("orders.export.upload"):
+            upload_file_to_bucket(
+                f"order_reports/{file_path}",
+                spool.path,
+                config.STORAGE_BUCKET,
+                crc32c=spool.crc32c,
+                delete=True,
+            )
         log.debug("Uploaded order CSV to cloud storage: %s.", file_path)
 
-    def _get_last_order_id(self) -> int:
-        """
-        Retrieves the index of the last order ID.
-
-        Returns:
-            int: The number of the most recent order ID.
-
-        """
-        with get_session() as db:
-            last_order_id = db.query(OrdersModel.order_id).order_by(OrdersModel.order_id.desc()).limit(1).scalar()
-        log.debug("Last order ID fetched: %s", last_order_id)
-        return last_order_id if last_order_id is not None else 0
-
-    def _get_random_num_items(self, max_num_items: int) -> int:
+    def _get_random_num_items(self, max_num_items: int, num_orders: int, rng: random.Random) -> list[int]:
         """
-        Returns a random integer between 0 and max_num_items with a bias towards smaller numbers.
+        Returns random integers between 1 and max_num_items with a bias towards smaller numbers.
 
         Args:
             max_num_items (int): The maximum amount of items in an order.
+            num_orders (int): The number of orders to draw for.
+            rng (random.Random): The random number generator to draw from.
 
         Returns:
-            int: The number of items to generate in an order.
+            list[int]: The number of items to generate in each order.
 
         """
         max_num_items_list = list(range(1, max_num_items + 1))
@@ -429,5 +567,4 @@ class Orders:
         inv_exp_list = [1 / math.exp(x * scaling) for x in max_num_items_list]
         total = sum(inv_exp_list)
         weighting = [value / total for value in inv_exp_list]
-        num_items = random.choices(max_num_items_list, weights=weighting)[0]
-        return num_items
+        return rng.choices(max_num_items_list, weights=weighting, k=num_orders)
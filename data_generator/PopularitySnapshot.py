@@ -0,0 +1,213 @@
+import sys
+from array import array
+from collections.abc import Iterable, Sequence
+from datetime import datetime, timezone
+from decimal import Decimal
+from itertools import accumulate
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from data_generator.SimulationStore import to_db_price
+from shared.db_models import PopularitySnapshotModel, Product, ProductsModel
+from shared.logger import get_logger
+from shared.metrics import count
+
+log = get_logger(__name__)
+
+SNAPSHOT_NAME = "active_products"
+
+
+class PopularitySnapshot:
+    """
+    The active product catalogue packed into flat arrays, ready for sampling products by popularity.
+
+    The snapshot is materialised in the popularity_snapshots table as one row of packed little-endian arrays:
+    newline separated SKUs, prices in cents, popularity scores, and release and creation days as date ordinals.
+    Anything that changes which products are active, their prices or their popularity calls invalidate() in the same
+    transaction, which bumps the row's catalogue version. load() reads the row in a single query and only rebuilds
+    it from the products table when it was built for an older version, so days that don't touch the catalogue skip
+    querying and converting every active product.
+
+    Attributes:
+        version (int): The catalogue version the snapshot was built for.
+        skus (list[str]): The product SKUs, ordered by SKU.
+        prices (list[Decimal]): The price of each product.
+        popularities (array): The popularity score of each product.
+        release_days (array): The release date of each product as a date ordinal.
+        created_days (array): The date each product was created as a date ordinal.
+        cum_weights (array): Cumulative popularity scores, for random.choices(cum_weights=...).
+
+    """
+
+    def __init__(
+        self,
+        version: int,
+        skus: list[str],
+        prices: list[Decimal],
+        popularities: Sequence[float],
+        release_days: Sequence[int],
+        created_days: Sequence[int],
+    ) -> None:
+        self.version = version
+        self.skus = skus
+        self.prices = prices
+        self.popularities = array("d", popularities)
+        self.release_days = array("i", release_days)
+        self.created_days = array("i", created_days)
+        self.cum_weights = array("d", accumulate(self.popularities))
+
+    def __len__(self) -> int:
+        return len(self.skus)
+
+    @classmethod
+    def load(cls, db: Session) -> "PopularitySnapshot":
+        """
+        Load the snapshot of the active products, rebuilding it first if the catalogue changed since it was built.
+
+        Args:
+            db (Session): The session to read and save the snapshot with.
+
+        Returns:
+            PopularitySnapshot: The snapshot for the current catalogue version.
+
+        """
+        row = db.get(PopularitySnapshotModel, SNAPSHOT_NAME, populate_existing=True)
+        if row is not None and row.built_version == row.catalogue_version:
+            count("popularity_snapshot_hits")
+            return cls._unpack(row)
+
+        version = row.catalogue_version if row is not None else 0
+        snapshot = cls._build(db, version)
+        snapshot._save(db, exists=row is not None)
+        count("popularity_snapshot_rebuilds")
+        log.debug("Rebuilt the popularity snapshot of %d active products for version %d.", len(snapshot), version)
+        return snapshot
+
+    @staticmethod
+    def invalidate(db: Session) -> None:
+        """
+        Bump the catalogue version, so the next load() rebuilds the snapshot.
+
+        Call it in the transaction that changes the catalogue, so the new version is committed with the change.
+
+        Args:
+            db (Session): The session changing the catalogue.
+
+        """
+        dialect_insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else postgresql_insert
+        statement = dialect_insert(PopularitySnapshotModel).values(name=SNAPSHOT_NAME, catalogue_version=1)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[PopularitySnapshotModel.name],
+                set_={"catalogue_version": PopularitySnapshotModel.catalogue_version + 1},
+            ),
+        )
+        log.debug("Invalidated the popularity snapshot.")
+
+    def extend(self, products: Iterable[Product]) -> "PopularitySnapshot":
+        """
+        Get a copy of the snapshot with the active products among products appended, e.g. ones not yet flushed.
+
+        Args:
+            products (Iterable[Product]): The products to add.
+
+        Returns:
+            PopularitySnapshot: A new snapshot, the stored snapshot is unchanged.
+
+        """
+        products = [product for product in products if product.active]
+        if not products:
+            return self
+
+        return PopularitySnapshot(
+            self.version,
+            self.skus + [product.item_sku for product in products],
+            self.prices + [product.item_price for product in products],
+            self.popularities + array("d", [product.item_popularity for product in products]),
+            self.release_days + array("i", [product.release_date.toordinal() for product in products]),
+            self.created_days + array("i", [product.date_created.toordinal() for product in products]),
+        )
+
+    @classmethod
+    def _build(cls, db: Session, version: int) -> "PopularitySnapshot":
+        rows = db.execute(
+            select(
+                ProductsModel.item_sku,
+                ProductsModel.item_price,
+                ProductsModel.item_popularity,
+                ProductsModel.release_date,
+                ProductsModel.date_created,
+            )
+            .where(ProductsModel.active.is_(True))
+            .order_by(ProductsModel.item_sku),
+        ).all()
+        return cls(
+            version,
+            [row.item_sku for row in rows],
+            [to_db_price(row.item_price) for row in rows],
+            [row.item_popularity for row in rows],
+            [row.release_date.toordinal() for row in rows],
+            [row.date_created.toordinal() for row in rows],
+        )
+
+    @classmethod
+    def _unpack(cls, row: PopularitySnapshotModel) -> "PopularitySnapshot":
+        skus = row.skus.decode().split("\n") if row.num_products else []
+        return cls(
+            row.built_version,
+            skus,
+            [Decimal(cents).scaleb(-2) for cents in _unpack_array("q", row.prices)],
+            _unpack_array("d", row.popularities),
+            _unpack_array("i", row.release_dates),
+            _unpack_array("i", row.dates_created),
+        )
+
+    def _save(self, db: Session, *, exists: bool) -> None:
+        """Store the snapshot, unless the catalogue version moved on since it was built."""
+        values = {
+            "built_version": self.version,
+            "num_products": len(self),
+            "skus": "\n".join(self.skus).encode(),
+            "prices": _pack_array("q", [int(price.scaleb(2)) for price in self.prices]),
+            "popularities": _pack_array("d", self.popularities),
+            "release_dates": _pack_array("i", self.release_days),
+            "dates_created": _pack_array("i", self.created_days),
+            "date_built": datetime.now(tz=timezone.utc).replace(tzinfo=None),
+        }
+        if exists:
+            db.execute(
+                update(PopularitySnapshotModel)
+                .where(
+                    PopularitySnapshotModel.name == SNAPSHOT_NAME,
+                    PopularitySnapshotModel.catalogue_version == self.version,
+                )
+                .values(**values)
+                .execution_options(synchronize_session=False),
+            )
+            return
+
+        dialect_insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else postgresql_insert
+        db.execute(
+            dialect_insert(PopularitySnapshotModel)
+            .values(name=SNAPSHOT_NAME, catalogue_version=self.version, **values)
+            .on_conflict_do_nothing(),
+        )
+
+
+def _pack_array(typecode: str, values: Iterable) -> bytes:
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack_array(typecode: str, data: bytes) -> array:
+    unpacked = array(typecode)
+    unpacked.frombytes(data or b"")
+    if sys.byteorder == "big":
+        unpacked.byteswap()
+    return unpacked
+
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import Update, select, update
+from sqlalchemy.orm import Session
+
+from data_generator.PopularitySnapshot import PopularitySnapshot
+from data_generator.SimulationStore import to_db_datetime, to_db_price
+from shared.db_connection import get_session
+from shared.db_models import ProductsModel
+from shared.logger import get_logger
+from shared.metrics import count, stage
+
+log = get_logger(__name__)
+
+
+class ProductLifecycle:
+    """
+    A class to age the product catalogue with set-based updates using SQLAlchemy.
+
+    Each rule is a single UPDATE statement, so the cost doesn't depend on the number of products changed. Every
+    changed product gets a new date_updated, so incremental exports pick the change up, and any change invalidates
+    the popularity snapshot orders are sampled from.
+
+    """
+
+    def update(
+        self,
+        run_date: datetime,
+        markdowns: list[dict] | None = None,
+        retire_after_weeks: int | None = None,
+        retire_below_popularity: float = 0.0,
+        max_active_products: int | None = None,
+    ) -> dict[str, int]:
+        """
+        Apply the lifecycle rules to the products in the database as of run_date.
+
+        Args:
+            run_date (datetime): The day the rules are applied.
+            markdowns (list[dict] | None): Price caps, each with after_weeks since release and a max_price.
+            retire_after_weeks (int | None): Minimum weeks since release before a product can be retired.
+            retire_below_popularity (float): Products older than retire_after_weeks with a popularity score below this
+                are retired.
+            max_active_products (int | None): The most popular products are kept active up to this many, the rest are
+                deactivated.
+
+        Returns:
+            dict[str, int]: Number of products changed by each rule.
+
+        """
+        run_date = to_db_datetime(run_date)
+
+        with stage("products.lifecycle") as lifecycle_stage, get_session() as db:
+            changed = {
+                "marked_down": sum(
+                    self._execute(db, self._markdown(run_date, markdown["after_weeks"], markdown["max_price"]))
+                    for markdown in sorted(markdowns or [], key=lambda markdown: markdown["after_weeks"])
+                ),
+                "retired": (
+                    self._execute(db, self._retire(run_date, retire_after_weeks, retire_below_popularity))
+                    if retire_after_weeks is not None
+                    else 0
+                ),
+                "capped": (
+                    self._execute(db, self._cap(run_date, max_active_products))
+                    if max_active_products is not None
+                    else 0
+                ),
+            }
+            lifecycle_stage.rows = sum(changed.values())
+            if lifecycle_stage.rows:
+                PopularitySnapshot.invalidate(db)
+
+        for rule, num_products in changed.items():
+            count(f"products_{rule}", num_products)
+        log.info(
+            "Product lifecycle: %s marked down, %s retired, %s deactivated by the active product cap.",
+            changed["marked_down"],
+            changed["retired"],
+            changed["capped"],
+        )
+        return changed
+
+    def _execute(self, db: Session, statement: Update) -> int:
+        return db.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+    def _markdown(self, run_date: datetime, after_weeks: int, max_price: float) -> Update:
+        """Cap the price of active products released at least after_weeks ago at max_price."""
+        max_price = to_db_price(max_price)
+        return (
+            update(ProductsModel)
+            .where(
+                ProductsModel.active.is_(True),
+                ProductsModel.release_date <= run_date - timedelta(weeks=after_weeks),
+                ProductsModel.item_price > max_price,
+            )
+            .values(item_price=max_price, date_updated=run_date)
+        )
+
+    def _retire(self, run_date: datetime, after_weeks: int, below_popularity: float) -> Update:
+        """Deactivate the long tail, active products released at least after_weeks ago that rarely sell."""
+        return (
+            update(ProductsModel)
+            .where(
+                ProductsModel.active.is_(True),
+                ProductsModel.release_date <= run_date - timedelta(weeks=after_weeks),
+                ProductsModel.item_popularity < below_popularity,
+            )
+            .values(active=False, date_updated=run_date)
+        )
+
+    def _cap(self, run_date: datetime, max_active_products: int) -> Update:
+        """Deactivate every active product beyond the max_active_products most popular ones."""
+        excess_skus = (
+            select(ProductsModel.item_sku)
+            .where(ProductsModel.active.is_(True))
+            .order_by(ProductsModel.item_popularity.desc(), ProductsModel.item_sku)
+            .offset(max_active_products)
+        )
+        return (
+            update(ProductsModel)
+            .where(ProductsModel.item_sku.in_(excess_skus))
+            .values(active=False, date_updated=run_date)
+        )
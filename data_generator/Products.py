@@ -1,17 +1,19 @@
-import csv
-import io
-import random
-from dataclasses import astuple
 from datetime import datetime, timedelta, timezone
 
-from sqlalchemy import func
+from sqlalchemy import func, select
 from sqlalchemy.sql import expression
 
-from data_generator.google_cloud_storage import upload_to_bucket
+from data_generator.google_cloud_storage import upload_file_to_bucket
+from data_generator.PopularitySnapshot import PopularitySnapshot
+from data_generator.seeding import RandomStreams
+from data_generator.SimulationStore import SimulationStore, to_db_datetime, to_db_price
+from data_generator.spooling import SpooledCSV, get_spool_dir
 from shared.config import get_config
-from shared.db_connection import get_session
-from shared.db_models import Product, ProductsModel
+from shared.db_connection import get_read_session, get_session
+from shared.db_models import Product, ProductsModel, record_columns
+from shared.id_allocator import reserve_ids
 from shared.logger import get_logger
+from shared.metrics import stage
 
 log = get_logger(__name__)
 config = get_config()
@@ -20,6 +22,16 @@ config = get_config()
 class Products:
     """A class to generate, retrieve, and export product data using SQLAlchemy."""
 
+    def __init__(self, seed: int | None = None) -> None:
+        """
+        Initialise the Products class with a seed for reproducible generation.
+
+        Args:
+            seed (int | None): Root seed for the random streams, if None generation is not reproducible.
+
+        """
+        self.random_streams = RandomStreams(seed)
+
     def create(
         self,
         label_prefix: str | list[str],
@@ -27,9 +39,10 @@ class Products:
         num_items: int,
         pricing: list[float],
         creation_date: str | datetime,
+        store: SimulationStore | None = None,
     ) -> list[Product] | None:
         """
-        Generates and adds fake products to the database.
+        Generates fake products and adds them to the database, or to a simulation store for deferred persistence.
 
         Args:
             label_prefix (str | list[str]): The prefix to use when creating the product catalogue number.
@@ -37,9 +50,10 @@ class Products:
             num_items (int): Number of products to generate.
             pricing (list[float]): A list of prices to be randomly assigned to each product generated.
             creation_date (str | datetime): The date the products are added to the ecommerce store.
+            store (SimulationStore | None): Store to generate into. If None the products are flushed to the database immediately.
 
         Returns:
-            list[Product] | None: A list of created Product dataclass instances.
+            list[Product] | None: A list of created Product records.
 
         """
         if num_items == 0:
@@ -58,37 +72,40 @@ class Products:
         if not isinstance(creation_date, datetime):
             creation_date = datetime.strptime(creation_date, "%Y-%m-%d").astimezone(timezone.utc)
 
+        rng = self.random_streams.spawn("products", creation_date.date().isoformat())
+
         if isinstance(label_prefix, list):
-            label_prefix = random.choice(label_prefix)
+            label_prefix = rng.choice(label_prefix)
 
-        release_date = creation_date + timedelta(weeks=preorder_weeks)
+        target = store if store is not None else SimulationStore()
+        release_date = to_db_datetime(creation_date + timedelta(weeks=preorder_weeks))
+        date_created = to_db_datetime(creation_date)
         popularity_upper_limit = self._get_upper_limit()
 
-        index = self._get_sku_index(label_prefix)
-
-        product_models: list[ProductsModel] = []
-
-        for i in range(num_items):
-            product_model = ProductsModel(
-                item_sku=f"{label_prefix}{index + 1 + i:03}",
-                item_price=random.choice(pricing),
-                release_date=release_date,
-                date_created=creation_date,
-                date_updated=creation_date,
-                active=True,
-                item_popularity=random.uniform(0.0, popularity_upper_limit),
-            )
-            product_models.append(product_model)
-
-        with get_session() as db:
-            db.add_all(product_models)
-            db.flush()
-            log.debug("Flushed %s products to the database.", len(product_models))
-            products = [product.to_plain() for product in product_models]
-
-        self._set_popularity_scores()
-
-        log.info("%s products added to the database.", len(products))
+        first_sku_number = self._reserve_sku_numbers(label_prefix, num_items)
+        start = len(target.products)
+
+        with stage("products.generate", rows=num_items):
+            for i in range(num_items):
+                target.products.append(
+                    item_sku=f"{label_prefix}{first_sku_number + i:03}",
+                    item_price=to_db_price(rng.choice(pricing)),
+                    release_date=release_date,
+                    date_created=date_created,
+                    date_updated=date_created,
+                    active=True,
+                    item_popularity=rng.uniform(0.0, popularity_upper_limit),
+                )
+
+        products = target.products.records(start)
+
+        if store is None:
+            with stage("products.flush", rows=len(products)), get_session() as db:
+                target.flush(db)
+            self.set_popularity_scores()
+            log.info("%s products added to the database.", len(products))
+        else:
+            log.info("%s products generated.", len(products))
 
         return products
 
@@ -100,7 +117,7 @@ class Products:
             int: Total product count.
 
         """
-        with get_session() as db:
+        with get_read_session() as db:
             count_products = db.query(ProductsModel).count()
         return count_products
 
@@ -119,7 +136,7 @@ class Products:
             end_date (str | None): End date (inclusive) in 'YYYY-MM-DD' format.
 
         Returns:
-            list[Product]: List of Product dataclass instances matching the filters.
+            list[Product]: List of Product records matching the filters.
 
         """
         log.debug(
@@ -134,8 +151,8 @@ class Products:
         if end_date:
             end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
 
-        with get_session() as db:
-            query = db.query(ProductsModel)
+        with get_read_session() as db:
+            query = db.query(*record_columns(Product, ProductsModel))
 
             if start_date:
                 query = query.filter(func.date(ProductsModel.date_created) >= start_date)
@@ -149,7 +166,7 @@ class Products:
                 else:
                     query = query.filter(ProductsModel.item_sku == item_sku)
 
-            return [product.to_plain() for product in query.all()]
+            return [Product._make(row) for row in query.all()]
 
     def to_csv(
         self,
@@ -157,6 +174,7 @@ class Products:
         start_date: str | None = None,
         end_date: str | None = None,
         timestamp: str = datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+        store: SimulationStore | None = None,
     ) -> None:
         """
         Export product data to a CSV file locally and/or to Google Cloud Storage depending on the env config.
@@ -166,18 +184,45 @@ class Products:
             start_date (str | None): Start date (inclusive) in 'YYYY-MM-DD' format.
             end_date (str | None): End date (inclusive) in 'YYYY-MM-DD' format.
             timestamp (str): The timestamp for the csv filename.
+            store (SimulationStore | None): Export the products generated into this store instead of querying the database.
+
+        """
+        if store is None:
+            with stage("products.export.query") as query_stage:
+                products = self.get_products(item_sku, start_date, end_date)
+                query_stage.rows = len(products)
+        else:
+            skus = [item_sku] if isinstance(item_sku, str) else item_sku
+            products = [
+                product
+                for product in store.products.records_between(start_date, end_date)
+                if skus is None or product.item_sku in skus
+            ]
+        self.write_csv(products, timestamp)
+
+    def write_csv(self, products: list[Product], timestamp: str) -> None:
+        """
+        Write product records to the product report CSV locally and/or to Google Cloud Storage depending on the env config.
+
+        Popularity scores are internal to the generator and aren't exported.
+
+        Args:
+            products (list[Product]): The product records to export.
+            timestamp (str): The timestamp for the csv filename.
 
         """
-        export_data = [astuple(product)[:-1] for product in self.get_products(item_sku, start_date, end_date)]
+        export_data = [product[:-1] for product in products]
         log.debug("Exporting %s products to CSV.", len(export_data))
         file_path = f"Product_report_{timestamp}.csv"
 
         if len(export_data) == 0:
             return
         if config.CSV_LOCAL_FILE:
-            self._save_to_file(export_data, file_path)
+            with stage("products.export.csv_file", rows=len(export_data)):
+                self._save_to_file(export_data, file_path)
         if config.CSV_CLOUD_STORAGE_FILE:
-            self._save_to_cloud_storage(export_data, file_path)
+            with stage("products.export.cloud_storage", rows=len(export_data)):
+                self._save_to_cloud_storage(export_data, file_path)
 
     def _save_to_file(self, export_data: list[tuple], file_path: str) -> None:
         """
@@ -193,21 +238,18 @@ class Products:
             return
         log.debug("Saving %s products to local CSV file at %s.", len(export_data), file_path)
 
-        with open(file_path, mode="w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(
-                [
-                    "Product SKU",
-                    "Price",
-                    "Release Date",
-                    "Date Created",
-                    "Date Updated",
-                    "Active",
-                ],
-            )
-
-            for row in export_data:
-                writer.writerow(row)
+        with SpooledCSV(
+            file_path,
+            header=[
+                "Product SKU",
+                "Price",
+                "Release Date",
+                "Date Created",
+                "Date Updated",
+                "Active",
+            ],
+        ) as spool:
+            spool.writerows(export_data)
         log.debug("Saved product data to local file: %s.", file_path)
 
     def _save_to_cloud_storage(self, export_data: list[tuple], file_path: str) -> None:
@@ -224,10 +266,11 @@ class Products:
             return
         log.debug("Uploading %s products to cloud storage CSV file at %s.", len(export_data), file_path)
 
-        csv_buffer = io.StringIO()
-        writer = csv.writer(csv_buffer)
-        writer.writerow(
-            [
+        # Spooled to disk instead of memory and deleted once uploaded. It isn't fsynced, a spool lost in a crash
+        # is regenerated by rerunning the day.
+        with SpooledCSV(
+            get_spool_dir() / file_path,
+            header=[
                 "Product SKU",
                 "Price",
                 "Release Date",
@@ -235,41 +278,40 @@ class Products:
                 "Date Updated",
                 "Active",
             ],
-        )
-
-        for row in export_data:
-            writer.writerow(row)
-
-        upload_data = csv_buffer.getvalue()
-
-        upload_to_bucket(
-            f"product_reports/{file_path}",
-            upload_data,
-            config.STORAGE_BUCKET,
-        )
+            fsync=False,
+        ) as spool:
+            spool.writerows(export_data)
+
+        with stage("products.export.upload"):
+            upload_file_to_bucket(
+                f"product_reports/{file_path}",
+                spool.path,
+                config.STORAGE_BUCKET,
+                crc32c=spool.crc32c,
+                delete=True,
+            )
         log.debug("Uploaded product CSV to cloud storage: %s.", file_path)
 
-    def _get_sku_index(self, label_prefix: str) -> int:
+    def _reserve_sku_numbers(self, label_prefix: str, num_items: int) -> int:
         """
-        Retrieves the next available index for a new SKU based on a given prefix.
+        Reserves consecutive catalogue numbers for new SKUs with a given prefix.
+
+        Numbers come from the central ID allocator, so concurrent workers never create the same SKU.
+        The counter for a new prefix starts after the number of existing SKUs with that prefix.
 
         Args:
-            label_prefix (str): The prefix of the SKU to search for.
+            label_prefix (str): The prefix of the SKUs.
+            num_items (int): Number of SKUs to reserve.
 
         Returns:
-            The count of existing SKUs matching the prefix, which serves as the
-            next available index for a new SKU with that prefix.
+            int: The first reserved catalogue number.
 
         """
-        with get_session() as db:
-            sku_index = (
-                db.query(func.count(ProductsModel.item_sku))
-                .filter(ProductsModel.item_sku.like(f"{label_prefix}%"))
-                .scalar()
-            )
-        log.debug("Found %s existing SKUs with prefix '%s'.", sku_index, label_prefix)
+        count_skus = select(func.count(ProductsModel.item_sku)).where(ProductsModel.item_sku.like(f"{label_prefix}%"))
+        first_sku_number = reserve_ids(f"products.sku.{label_prefix}", num_items, count_skus)
+        log.debug("Reserved %s SKU numbers with prefix '%s' from %s.", num_items, label_prefix, first_sku_number)
 
-        return sku_index
+        return first_sku_number
 
     def _get_upper_limit(self) -> float:
         """
@@ -297,16 +339,18 @@ class Products:
 
         return popularity_upper_limit
 
-    def _set_popularity_scores(self) -> None:
+    def set_popularity_scores(self) -> None:
         """
         Normalises all product popularity scores in the database.
 
         This scales all `item_popularity` values so they sum to 1,
         making them suitable for use as probability weights for random selection.
         Handles cases where total popularity is zero or no products exist.
+        It runs whenever products are added, so it also invalidates the popularity snapshot.
 
         """
-        with get_session() as db:
+        with stage("products.normalise_popularity"), get_session() as db:
+            PopularitySnapshot.invalidate(db)
             total = db.query(func.sum(ProductsModel.item_popularity)).scalar()
             if total is None or total == 0:
                 log.debug("Total popularity score is zero or None. Skipping normalization.")
@@ -0,0 +1,161 @@
+import time
+from datetime import date, datetime, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from shared.config import get_config
+from shared.db_connection import get_session
+from shared.db_models import RunSequenceModel
+from shared.logger import get_logger
+from shared.metrics import stage
+
+log = get_logger(__name__)
+config = get_config()
+
+
+class RunSequence:
+    """
+    Commits the days of a run generated by several workers in date order, as a serial run would.
+
+    A day's returning customers, product catalogue and popularity, and the IDs it's handed all depend on the days
+    committed before it. Workers generate the database independent part of their days, the new users' profiles, in
+    parallel, then wait() for their turn, generate the rest of the day and advance() the run to its next day in the
+    transaction that commits it. A day that fails leaves the run waiting for it, so a retried worker picks it up and
+    skips the days that were committed.
+
+    The run's next day is one row in the run_sequences table, shared by every worker and Cloud Run task of the run.
+
+    Attributes:
+        run_id (str): Identifies the run, every worker of a run must use the same ID.
+        run_dates (list[datetime]): Every day of the run, in date order.
+        timeout (float): Seconds to wait for a turn before giving up.
+
+    """
+
+    def __init__(self, run_id: str, run_dates: list[datetime], timeout: float | None = None) -> None:
+        self.run_id = run_id
+        self.run_dates = run_dates
+        self.timeout = timeout if timeout is not None else config.RUN_SEQUENCE_TIMEOUT_SECONDS
+
+    def start(self) -> None:
+        """Create the run's row at its first day, unless another worker of the run already created it."""
+        with get_session() as db:
+            dialect_insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else postgresql_insert
+            db.execute(
+                dialect_insert(RunSequenceModel)
+                .values(
+                    run_id=self.run_id,
+                    next_day=self.run_dates[0].date(),
+                    failed=False,
+                    date_updated=datetime.now(tz=timezone.utc).replace(tzinfo=None),
+                )
+                .on_conflict_do_nothing(),
+            )
+        log.debug("Started run sequence %s at %s.", self.run_id, self.run_dates[0].date())
+
+    def committed(self, run_date: datetime) -> bool:
+        """
+        Check whether run_date was already committed, e.g. by an earlier attempt of a retried worker.
+
+        Args:
+            run_date (datetime): The day to check.
+
+        Returns:
+            bool: True if the day was committed.
+
+        Raises:
+            RuntimeError: If the run wasn't started or failed.
+
+        """
+        next_day = self._next_day()
+        return next_day is None or next_day > run_date.date()
+
+    def wait(self, run_date: datetime) -> bool:
+        """
+        Wait until every day before run_date has been committed.
+
+        Args:
+            run_date (datetime): The day about to be generated.
+
+        Returns:
+            bool: True if it's the day's turn, False if the day was already committed by an earlier attempt.
+
+        Raises:
+            RuntimeError: If the run wasn't started, failed, or the turn didn't come in time.
+
+        """
+        day = run_date.date()
+        deadline = time.monotonic() + self.timeout
+        delay = 0.01
+        with stage("run_sequence.wait"):
+            while True:
+                next_day = self._next_day()
+                if next_day is None or next_day > day:
+                    return False
+                if next_day == day:
+                    return True
+                if time.monotonic() > deadline:
+                    error_msg = f"Timed out after {self.timeout}s waiting for run {self.run_id} to commit {next_day}."
+                    raise RuntimeError(error_msg)
+                time.sleep(delay)
+                delay = min(delay * 1.5, 0.5)
+
+    def advance(self, run_date: datetime) -> None:
+        """
+        Move the run on to the day after run_date.
+
+        Call it in the unit of work that commits the day, so the turn only passes on once the day is committed.
+
+        Args:
+            run_date (datetime): The day being committed.
+
+        Raises:
+            RuntimeError: If it wasn't run_date's turn.
+
+        """
+        index = self.run_dates.index(run_date)
+        next_day = self.run_dates[index + 1].date() if index + 1 < len(self.run_dates) else None
+        with get_session() as db:
+            result = db.execute(
+                update(RunSequenceModel)
+                .where(RunSequenceModel.run_id == self.run_id, RunSequenceModel.next_day == run_date.date())
+                .values(next_day=next_day, date_updated=datetime.now(tz=timezone.utc).replace(tzinfo=None)),
+            )
+        if result.rowcount != 1:
+            error_msg = f"It isn't {run_date.date()}'s turn in run {self.run_id}."
+            raise RuntimeError(error_msg)
+
+    def fail(self) -> None:
+        """Mark the run as failed, so workers waiting for their turn stop instead of timing out."""
+        with get_session() as db:
+            db.execute(
+                update(RunSequenceModel)
+                .where(RunSequenceModel.run_id == self.run_id)
+                .values(failed=True, date_updated=datetime.now(tz=timezone.utc).replace(tzinfo=None)),
+            )
+        log.warning("Marked run %s as failed.", self.run_id)
+
+    def _next_day(self) -> date | None:
+        """
+        Read the run's next day to commit.
+
+        Returns:
+            date | None: The next day, or None once every day was committed.
+
+        Raises:
+            RuntimeError: If the run wasn't started or failed.
+
+        """
+        with get_session() as db:
+            row = db.execute(
+                select(RunSequenceModel.next_day, RunSequenceModel.failed).where(RunSequenceModel.run_id == self.run_id),
+            ).one_or_none()
+        if row is None:
+            error_msg = f"Run sequence {self.run_id} wasn't started."
+            raise RuntimeError(error_msg)
+        if row.failed:
+            error_msg = f"Run {self.run_id} failed."
+            raise RuntimeError(error_msg)
+        return row.next_day
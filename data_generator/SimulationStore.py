@@ -0,0 +1,225 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from itertools import islice
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import InstrumentedAttribute, Session
+
+from shared.db_connection import get_read_session
+from shared.db_models import Order, OrdersModel, Product, ProductsModel, RecordBatch, User, UsersModel
+from shared.id_allocator import reserve_ids
+from shared.logger import get_logger
+
+log = get_logger(__name__)
+
+PRICE_QUANTUM = Decimal("0.01")
+
+# Rows per INSERT when flushing, bounds the memory of the parameter dicts at load test volumes.
+FLUSH_BATCH_SIZE = 10_000
+
+
+def to_db_datetime(value: datetime) -> datetime:
+    """
+    Normalise a datetime to the naive UTC value the database returns for it.
+
+    Args:
+        value (datetime): A naive or timezone aware datetime.
+
+    Returns:
+        datetime: A naive datetime in UTC.
+
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def to_db_price(value: float | Decimal) -> Decimal:
+    """
+    Normalise a price to the two decimal place value the database returns for it.
+
+    Args:
+        value (float | Decimal): The price.
+
+    Returns:
+        Decimal: The price rounded to two decimal places.
+
+    """
+    return Decimal(str(value)).quantize(PRICE_QUANTUM)
+
+
+class Columns(RecordBatch):
+    """
+    A record batch holding the generated rows of one table.
+
+    Attributes:
+        record (type): The record named tuple, its fields define the columns.
+        model (type): The SQLAlchemy model the rows are inserted into.
+        typecodes (dict[str, str]): Array typecodes for numeric columns.
+        flushed (int): Number of rows already inserted into the database.
+
+    """
+
+    record: type
+    model: type
+    typecodes: dict[str, str] = {}
+
+    def __init__(self) -> None:
+        super().__init__(self.record, self.typecodes)
+        self.flushed = 0
+
+    def records_between(self, start_date: str | None = None, end_date: str | None = None) -> list:
+        """
+        Get records created within an inclusive date range.
+
+        Args:
+            start_date (str | None): Start date (inclusive) in 'YYYY-MM-DD' format.
+            end_date (str | None): End date (inclusive) in 'YYYY-MM-DD' format.
+
+        Returns:
+            list: Record instances matching the range.
+
+        """
+        first = date.min if start_date is None else datetime.strptime(start_date, "%Y-%m-%d").date()
+        last = date.max if end_date is None else datetime.strptime(end_date, "%Y-%m-%d").date()
+        return [
+            self.record._make(row)
+            for row, date_created in zip(self.rows(), self.columns["date_created"], strict=True)
+            if first <= date_created.date() <= last
+        ]
+
+    def flush(self, db: Session) -> int:
+        """
+        Insert the rows not yet persisted with bulk inserts of up to FLUSH_BATCH_SIZE rows.
+
+        Args:
+            db (Session): The database session.
+
+        Returns:
+            int: Number of rows inserted.
+
+        """
+        total = len(self)
+        if self.flushed == total:
+            return 0
+        rows = self.rows(self.flushed, total)
+        while batch := list(islice(rows, FLUSH_BATCH_SIZE)):
+            db.execute(insert(self.model), [dict(zip(self.names, row, strict=True)) for row in batch])
+        count = total - self.flushed
+        self.flushed = total
+        log.debug("Flushed %s rows to %s.", count, self.model.__tablename__)
+        return count
+
+
+class ProductColumns(Columns):
+    record = Product
+    model = ProductsModel
+    typecodes = {"item_popularity": "d"}
+
+
+class UserColumns(Columns):
+    record = User
+    model = UsersModel
+    typecodes = {"user_id": "q"}
+
+
+class OrderLineColumns(Columns):
+    record = Order
+    model = OrdersModel
+    typecodes = {"order_line_id": "q", "order_id": "q", "user_id": "q", "qty": "q"}
+
+
+class LocalIdAllocator:
+    """
+    Hands out IDs from counters kept in this process, for rows that are never persisted.
+
+    Each counter starts after the highest ID in the database when first used. Unlike the central allocator it never
+    writes to the database, so other processes can be handed the same IDs.
+
+    Attributes:
+        next_ids (dict[str, int]): The next ID of each column, keyed by 'table.column'.
+
+    """
+
+    def __init__(self) -> None:
+        self.next_ids: dict[str, int] = {}
+
+    def reserve_ids(self, column: InstrumentedAttribute, count: int) -> int:
+        """
+        Reserve a block of consecutive IDs for an integer key column.
+
+        Args:
+            column (InstrumentedAttribute): The model column the IDs are for.
+            count (int): Number of IDs to reserve.
+
+        Returns:
+            int: The first reserved ID.
+
+        """
+        key = f"{column.class_.__tablename__}.{column.key}"
+        if key not in self.next_ids:
+            with get_read_session() as db:
+                self.next_ids[key] = (db.scalar(select(func.max(column))) or 0) + 1
+        first_id = self.next_ids[key]
+        self.next_ids[key] += count
+        return first_id
+
+
+class SimulationStore:
+    """
+    An in-memory columnar store for the products, users and order lines generated by a run.
+
+    Rows are generated into the store, exported from it and persisted with batched bulk inserts per table.
+    IDs are assigned in the store so order lines can reference users that are not yet in the database.
+
+    Attributes:
+        products (ProductColumns): Generated products.
+        users (UserColumns): Generated users.
+        order_lines (OrderLineColumns): Generated order lines.
+        local_ids (LocalIdAllocator | None): Assigns the IDs of rows that won't be persisted, if None IDs are
+            reserved from the central allocator.
+
+    """
+
+    def __init__(self, local_ids: LocalIdAllocator | None = None) -> None:
+        self.products = ProductColumns()
+        self.users = UserColumns()
+        self.order_lines = OrderLineColumns()
+        self.local_ids = local_ids
+
+    def reserve_ids(self, column: InstrumentedAttribute, count: int) -> int:
+        """
+        Reserve a block of consecutive IDs for an integer key column.
+
+        IDs are taken from the central allocator, so concurrent workers are never handed the same IDs, unless the
+        store was given a local allocator.
+
+        Args:
+            column (InstrumentedAttribute): The model column the IDs are for.
+            count (int): Number of IDs to reserve.
+
+        Returns:
+            int: The first reserved ID.
+
+        """
+        if self.local_ids is not None:
+            return self.local_ids.reserve_ids(column, count)
+        key = f"{column.class_.__tablename__}.{column.key}"
+        return reserve_ids(key, count, select(func.max(column)))
+
+    def flush(self, db: Session) -> dict[str, int]:
+        """
+        Insert all rows not yet persisted, parent tables first.
+
+        Args:
+            db (Session): The database session.
+
+        Returns:
+            dict[str, int]: Number of rows inserted per table.
+
+        """
+        return {
+            "products": self.products.flush(db),
+            "users": self.users.flush(db),
+            "order_lines": self.order_lines.flush(db),
+        }
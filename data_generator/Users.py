@@ -1,19 +1,18 @@
-import csv
-import io
-import random
-from dataclasses import astuple
 from datetime import datetime, timezone
 
-from faker import Faker
-from faker.config import AVAILABLE_LOCALES
 from sqlalchemy import func
 from unidecode import unidecode
 
-from data_generator.google_cloud_storage import upload_to_bucket
+from data_generator.DemandCurve import DemandCurve
+from data_generator.google_cloud_storage import upload_file_to_bucket
+from data_generator.seeding import RandomStreams
+from data_generator.SimulationStore import SimulationStore
+from data_generator.spooling import SpooledCSV, get_spool_dir
 from shared.config import get_config
-from shared.db_connection import get_session
-from shared.db_models import User, UsersModel
+from shared.db_connection import get_read_session, get_session
+from shared.db_models import User, UsersModel, record_columns
 from shared.logger import get_logger
+from shared.metrics import stage
 
 log = get_logger(__name__)
 config = get_config()
@@ -28,33 +27,51 @@ class Users:
 
     """
 
-    def __init__(self, locales: list[str]) -> None:
+    def __init__(self, locales: list[str], seed: int | None = None) -> None:
         """
         Initialise the User class with a list of locales for fake data generation.
 
         Args:
             locales (list[str]): List of Faker locales (en_US, fr_FR...)
+            seed (int | None): Root seed for the random streams, if None generation is not reproducible.
 
         Raises:
             ValueError: If a locale doesn't match an available locale in Faker.
 
         """
+        # Faker is imported when users are first needed rather than when the module is imported, it's slow to load.
+        from faker.config import AVAILABLE_LOCALES
+
         if not all(locale in AVAILABLE_LOCALES for locale in locales):
             error_msg = f"Expected one or many values from the available locales: \n {sorted(AVAILABLE_LOCALES)}."
             raise ValueError(error_msg)
         self.locales = locales
+        self.random_streams = RandomStreams(seed)
+        self._faker_instances = None
         log.debug("Users initialized with locales: %s", self.locales)
 
-    def create(self, num_users: int, date_created: datetime) -> list[User] | None:
+    def create(
+        self,
+        num_users: int,
+        date_created: datetime,
+        store: SimulationStore | None = None,
+        timestamps: list[datetime] | None = None,
+        profiles: list[tuple[str, str, str, str]] | None = None,
+    ) -> list[User] | None:
         """
-        Generates and adds fake users to the database.
+        Generates fake users and adds them to the database, or to a simulation store for deferred persistence.
 
         Args:
             num_users (int): Number of users to generate.
-            date_created (datetime): The date the user was created.
+            date_created (datetime): The day the users are created.
+            store (SimulationStore | None): Store to generate into. If None the users are flushed to the database immediately.
+            timestamps (list[datetime] | None): The sorted naive UTC creation time of each user. If None the users are
+                spread across the day by the time of day demand curve.
+            profiles (list[tuple[str, str, str, str]] | None): Profiles from generate_profiles() for at least
+                num_users users, the first num_users are used. If None they're generated here.
 
         Returns:
-            list[User]: A list of created User dataclass instances.
+            list[User]: A list of created User records.
 
         """
         if num_users == 0:
@@ -63,36 +80,78 @@ class Users:
 
         log.debug("Generating %s users.", num_users)
 
-        locale_weighting = [random.uniform(0.0, 1) for _ in range(len(self.locales))]
-        normalised_locale_weighting = [w / sum(locale_weighting) for w in locale_weighting]
-        faker_instances = {locale: Faker(locale) for locale in self.locales}
-        user_models: list[UsersModel] = []
+        if profiles is None:
+            profiles = self.generate_profiles(num_users, date_created)
+        elif len(profiles) < num_users:
+            error_msg = f"Expected profiles for at least {num_users} users, got {len(profiles)}."
+            raise ValueError(error_msg)
 
-        for _ in range(num_users):
-            random_locale = random.choices(self.locales, normalised_locale_weighting)[0]
-            fake = faker_instances[random_locale]
-            profile = fake.simple_profile()
-            user_name = str(profile["name"])
+        target = store if store is not None else SimulationStore()
+        first_user_id = target.reserve_ids(UsersModel.user_id, num_users)
+        if timestamps is None:
+            rng = self.random_streams.spawn("users.timestamps", date_created.date().isoformat())
+            timestamps = DemandCurve(date_created).timestamps(num_users, rng)
+        start = len(target.users)
 
-            user_model = UsersModel(
+        for i, (user_name, user_address, user_country, user_email) in enumerate(profiles[:num_users]):
+            target.users.append(
+                user_id=first_user_id + i,
                 user_name=user_name,
-                user_address=str(profile["address"]).replace("\n", ", "),
-                user_country=fake.current_country(),
-                user_email=self._create_email(user_name),
-                date_created=date_created,
+                user_address=user_address,
+                user_country=user_country,
+                user_email=user_email,
+                date_created=timestamps[i],
             )
-            user_models.append(user_model)
 
-        with get_session() as db:
-            db.add_all(user_models)
-            db.flush()
-            log.debug("Flushed %s users to the database.", len(user_models))
-            users = [user.to_plain() for user in user_models]
+        users = target.users.records(start)
+
+        if store is None:
+            with stage("users.flush", rows=len(users)), get_session() as db:
+                target.flush(db)
 
         log.info("%s new users created.", len(users))
 
         return users
 
+    def generate_profiles(self, num_users: int, date_created: datetime) -> list[tuple[str, str, str, str]]:
+        """
+        Generates the name, address, country and email of new users, without their IDs or creation times.
+
+        Profiles don't depend on the database, so a day's profiles can be generated before the days ahead of it are
+        committed. The first n of a day's profiles are the same however many are generated.
+
+        Args:
+            num_users (int): Number of profiles to generate.
+            date_created (datetime): The day the users are created.
+
+        Returns:
+            list[tuple[str, str, str, str]]: The name, address, country and email of each user.
+
+        """
+        rng = self.random_streams.spawn("users", date_created.date().isoformat())
+        locale_weighting = [rng.uniform(0.0, 1) for _ in range(len(self.locales))]
+        normalised_locale_weighting = [w / sum(locale_weighting) for w in locale_weighting]
+        faker_instances = self._get_faker_instances()
+        for fake in faker_instances.values():
+            fake.seed_instance(rng.getrandbits(64))
+
+        profiles = []
+        with stage("users.generate", rows=num_users):
+            random_locales = rng.choices(self.locales, normalised_locale_weighting, k=num_users)
+            for random_locale in random_locales:
+                fake = faker_instances[random_locale]
+                profile = fake.simple_profile()
+                user_name = str(profile["name"])
+                profiles.append(
+                    (
+                        user_name,
+                        str(profile["address"]).replace("\n", ", "),
+                        fake.current_country(),
+                        self._create_email(user_name),
+                    ),
+                )
+        return profiles
+
     def get_count_users(self) -> int:
         """
         Get the total number of users in the database.
@@ -101,7 +160,7 @@ class Users:
             int: Total user count.
 
         """
-        with get_session() as db:
+        with get_read_session() as db:
             count_users = db.query(UsersModel).count()
         return count_users
 
@@ -120,7 +179,7 @@ class Users:
             end_date (str | None): End date (inclusive) in 'YYYY-MM-DD' format.
 
         Returns:
-            list[User]: List of User dataclass instances matching the filters.
+            list[User]: List of User records matching the filters.
 
         """
         log.debug(
@@ -135,8 +194,8 @@ class Users:
         if end_date:
             end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
 
-        with get_session() as db:
-            query = db.query(UsersModel)
+        with get_read_session() as db:
+            query = db.query(*record_columns(User, UsersModel))
 
             if start_date:
                 query = query.filter(func.date(UsersModel.date_created) >= start_date)
@@ -150,7 +209,7 @@ class Users:
                 else:
                     query = query.filter(UsersModel.user_id == user_id)
 
-            return [user.to_plain() for user in query.all()]
+            return [User._make(row) for row in query.all()]
 
     def to_csv(
         self,
@@ -158,6 +217,7 @@ class Users:
         start_date: str | None = None,
         end_date: str | None = None,
         timestamp: str = datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+        store: SimulationStore | None = None,
     ) -> None:
         """
         Export user data to a CSV file locally and/or to Google Cloud Storage depending on the env config.
@@ -167,25 +227,49 @@ class Users:
             start_date (str | None): Start date (inclusive) in 'YYYY-MM-DD' format.
             end_date (str | None): End date (inclusive) in 'YYYY-MM-DD' format.
             timestamp (str): The timestamp for the csv filename.
+            store (SimulationStore | None): Export the users generated into this store instead of querying the database.
+
+        """
+        if store is None:
+            with stage("users.export.query") as query_stage:
+                export_data = self.get_users(user_id, start_date, end_date)
+                query_stage.rows = len(export_data)
+        else:
+            user_ids = [user_id] if isinstance(user_id, int) else user_id
+            export_data = [
+                user
+                for user in store.users.records_between(start_date, end_date)
+                if user_ids is None or user.user_id in user_ids
+            ]
+        self.write_csv(export_data, timestamp)
+
+    def write_csv(self, export_data: list[User], timestamp: str) -> None:
+        """
+        Write user records to the user report CSV locally and/or to Google Cloud Storage depending on the env config.
+
+        Args:
+            export_data (list[User]): The user records to export.
+            timestamp (str): The timestamp for the csv filename.
 
         """
-        export_data = self.get_users(user_id, start_date, end_date)
         log.debug("Exporting %s users to CSV.", len(export_data))
         file_path = f"User_report_{timestamp}.csv"
 
         if len(export_data) == 0:
             return
         if config.CSV_LOCAL_FILE:
-            self._save_to_file(export_data, file_path)
+            with stage("users.export.csv_file", rows=len(export_data)):
+                self._save_to_file(export_data, file_path)
         if config.CSV_CLOUD_STORAGE_FILE:
-            self._save_to_cloud_storage(export_data, file_path)
+            with stage("users.export.cloud_storage", rows=len(export_data)):
+                self._save_to_cloud_storage(export_data, file_path)
 
     def _save_to_file(self, export_data: list[User], file_path: str) -> None:
         """
         Save user data to a local CSV file.
 
         Args:
-            export_data (list[User]): List of User dataclass instances.
+            export_data (list[User]): List of User records.
             file_path (str): Path to the output CSV file.
 
         """
@@ -194,21 +278,18 @@ class Users:
             return
         log.debug("Saving %s users to local CSV file at %s.", len(export_data), file_path)
 
-        with open(file_path, mode="w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(
-                [
-                    "user_id",
-                    "user_name",
-                    "user_address",
-                    "user_country",
-                    "user_email",
-                    "date_created",
-                ],
-            )
-
-            for row in export_data:
-                writer.writerow(astuple(row))
+        with SpooledCSV(
+            file_path,
+            header=[
+                "user_id",
+                "user_name",
+                "user_address",
+                "user_country",
+                "user_email",
+                "date_created",
+            ],
+        ) as spool:
+            spool.writerows(export_data)
         log.debug("Saved user data to local file: %s.", file_path)
 
     def _save_to_cloud_storage(self, export_data: list[User], file_path: str) -> None:
@@ -216,7 +297,7 @@ class Users:
         Upload user data as a CSV to a Google Cloud Storage bucket.
 
         Args:
-            export_data (list[User]): List of User dataclass instances.
+            export_data (list[User]): List of User records.
             file_path (str): File name to use in the cloud storage bucket.
 
         """
@@ -225,10 +306,11 @@ class Users:
             return
         log.debug("Uploading %s users to cloud storage CSV file at %s.", len(export_data), file_path)
 
-        csv_buffer = io.StringIO()
-        writer = csv.writer(csv_buffer)
-        writer.writerow(
-            [
+        # Spooled to disk instead of memory and deleted once uploaded. It isn't fsynced, a spool lost in a crash
+        # is regenerated by rerunning the day.
+        with SpooledCSV(
+            get_spool_dir() / file_path,
+            header=[
                 "user_id",
                 "user_name",
                 "user_address",
@@ -236,19 +318,36 @@ class Users:
                 "user_email",
                 "date_created",
             ],
-        )
+            fsync=False,
+        ) as spool:
+            spool.writerows(export_data)
+
+        with stage("users.export.upload"):
+            upload_file_to_bucket(
+                f"user_reports/{file_path}",
+                spool.path,
+                config.STORAGE_BUCKET,
+                crc32c=spool.crc32c,
+                delete=True,
+            )
+        log.debug("Uploaded user CSV to cloud storage: %s.", file_path)
 
-        for row in export_data:
-            writer.writerow(astuple(row))
+    def _get_faker_instances(self) -> dict:
+        """
+        Get a Faker instance per locale, created on first use and reused by later calls.
 
-        upload_data = csv_buffer.getvalue()
+        Creating the instances loads every locale's providers, which would dominate small batches such as the event
+        stream's. They are reseeded on every create() call, so reuse doesn't change what is generated.
 
-        upload_to_bucket(
-            f"user_reports/{file_path}",
-            upload_data,
-            config.STORAGE_BUCKET,
-        )
-        log.debug("Uploaded user CSV to cloud storage: %s.", file_path)
+        Returns:
+            dict: Faker instances keyed by locale.
+
+        """
+        if self._faker_instances is None:
+            from faker import Faker
+
+            self._faker_instances = {locale: Faker(locale) for locale in self.locales}
+        return self._faker_instances
 
     def _create_email(self, name: str) -> str:
         """
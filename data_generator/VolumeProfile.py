@@ -0,0 +1,176 @@
+import calendar
+import random
+from datetime import date, datetime, timedelta
+
+
+class VolumeProfile:
+    """
+    A class to decide how many orders and products to generate each day from a volume profile in config.yaml.
+
+    A day's order count is drawn from the profile's orders_per_day distribution and multiplied by the profile scale,
+    the growth trend, the month and weekday seasonality and any peak event covering the day.
+
+    Attributes:
+        name (str): The profile name.
+        orders_per_day (dict): The distribution of orders per day before multipliers, see num_orders().
+        max_num_items (int): Maximum number of items in an order.
+        products_per_launch (dict): The min and max number of products created on a launch day.
+        launch_weekdays (list[int]): ISO weekdays new products are launched on.
+        scale (float): Multiplier for every day's orders, e.g. 100 to load test at 100x production volume.
+        annual_growth (float): Compound growth in orders per year since growth_start, e.g. 0.2 for 20%.
+        growth_start (date): The day growth is measured from.
+        monthly_multipliers (list[float]): Multiplier for each month, January first.
+        weekday_multipliers (list[float]): Multiplier for each weekday, Monday first.
+        peak_events (list[dict]): Peak days such as Black Friday, see event_days().
+
+    """
+
+    def __init__(
+        self,
+        name: str,
+        orders_per_day: dict,
+        max_num_items: int = 7,
+        products_per_launch: dict | None = None,
+        launch_weekdays: list[int] | None = None,
+        scale: float = 1.0,
+        annual_growth: float = 0.0,
+        growth_start: str | date = "2025-01-01",
+        monthly_multipliers: list[float] | None = None,
+        weekday_multipliers: list[float] | None = None,
+        peak_events: list[dict] | None = None,
+    ) -> None:
+        self.name = name
+        self.orders_per_day = orders_per_day
+        self.max_num_items = max_num_items
+        self.products_per_launch = products_per_launch or {"min": 1, "max": 6}
+        self.launch_weekdays = launch_weekdays if launch_weekdays is not None else [3]
+        self.scale = scale
+        self.annual_growth = annual_growth
+        self.growth_start = growth_start if isinstance(growth_start, date) else date.fromisoformat(growth_start)
+        self.monthly_multipliers = monthly_multipliers or [1.0] * 12
+        self.weekday_multipliers = weekday_multipliers or [1.0] * 7
+        self.peak_events = peak_events or []
+
+    @classmethod
+    def from_config(cls, config: dict, name: str | None = None) -> "VolumeProfile":
+        """
+        Load a volume profile from the generator config.
+
+        Args:
+            config (dict): The generator config from config.yaml.
+            name (str | None): The profile to load, if None the config's default volume_profile.
+
+        Returns:
+            VolumeProfile: The volume profile.
+
+        Raises:
+            ValueError: If the profile isn't defined in the config.
+
+        """
+        name = name or config.get("volume_profile", "production")
+        profiles = config.get("volume_profiles", {})
+        if name not in profiles:
+            error_msg = f"Volume profile '{name}' isn't defined, choose from: {', '.join(profiles)}."
+            raise ValueError(error_msg)
+        return cls(name, **profiles[name])
+
+    def multiplier(self, day: datetime) -> float:
+        """
+        The combined scale, growth, seasonality and peak event multiplier for a day.
+
+        Args:
+            day (datetime): The day.
+
+        Returns:
+            float: The multiplier for the day's orders.
+
+        """
+        years = (day.date() - self.growth_start).days / 365.25
+        multiplier = (
+            self.scale
+            * (1 + self.annual_growth) ** years
+            * self.monthly_multipliers[day.month - 1]
+            * self.weekday_multipliers[day.weekday()]
+        )
+        for event in self.peak_events:
+            if day.date() in self.event_days(event, day.year):
+                multiplier *= event["multiplier"]
+        return multiplier
+
+    def event_days(self, event: dict, year: int) -> list[date]:
+        """
+        The days a peak event covers in a year.
+
+        An event starts on a fixed date, e.g. {date: '12-26'}, or relative to the nth weekday of a month, e.g. Black
+        Friday is the day after Thanksgiving, {month: 11, weekday: 4, week: 4, offset_days: 1}. A negative week
+        counts from the end of the month.
+
+        Args:
+            event (dict): The event config, with an optional duration_days, 1 by default.
+            year (int): The year.
+
+        Returns:
+            list[date]: The days covered by the event.
+
+        """
+        if "date" in event:
+            month, day = (int(part) for part in event["date"].split("-"))
+            start = date(year, month, day)
+        else:
+            weekdays = [
+                week[event["weekday"] - 1]
+                for week in calendar.monthcalendar(year, event["month"])
+                if week[event["weekday"] - 1] != 0
+            ]
+            week = event["week"]
+            start = date(year, event["month"], weekdays[week - 1 if week > 0 else week]) + timedelta(
+                days=event.get("offset_days", 0),
+            )
+        return [start + timedelta(days=offset) for offset in range(event.get("duration_days", 1))]
+
+    def num_orders(self, day: datetime, rng: random.Random) -> int:
+        """
+        Draw the number of orders for a day.
+
+        The orders_per_day distribution is uniform with min and max, lognormal with median and sigma or fixed with
+        value.
+
+        Args:
+            day (datetime): The day.
+            rng (random.Random): The random number generator for the day.
+
+        Returns:
+            int: The number of orders to generate.
+
+        Raises:
+            ValueError: If the distribution isn't supported.
+
+        """
+        distribution = self.orders_per_day.get("distribution", "uniform")
+        if distribution == "uniform":
+            base_orders = rng.randint(self.orders_per_day["min"], self.orders_per_day["max"])
+        elif distribution == "lognormal":
+            base_orders = self.orders_per_day["median"] * rng.lognormvariate(0.0, self.orders_per_day["sigma"])
+        elif distribution == "fixed":
+            base_orders = self.orders_per_day["value"]
+        else:
+            error_msg = f"Unsupported orders_per_day distribution '{distribution}' in volume profile '{self.name}'."
+            raise ValueError(error_msg)
+        return round(base_orders * self.multiplier(day))
+
+    def num_products(self, day: datetime, rng: random.Random, *, create_products: bool = False) -> int:
+        """
+        Draw the number of products to launch on a day.
+
+        Args:
+            day (datetime): The day.
+            rng (random.Random): The random number generator for the day.
+            create_products (bool): Launch products even if the day isn't a launch weekday.
+
+        Returns:
+            int: The number of products to create, 0 if none launch.
+
+        """
+        if not create_products and day.isoweekday() not in self.launch_weekdays:
+            return 0
+        return rng.randint(self.products_per_launch["min"], self.products_per_launch["max"])
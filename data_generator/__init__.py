@@ -1,6 +1,27 @@
+from .DailySales import DailySales
+from .DemandCurve import DemandCurve
 from .Ecommerce import Ecommerce
+from .EventStream import EventStream
+from .IncrementalExport import IncrementalExport
 from .Orders import Orders
+from .PopularitySnapshot import PopularitySnapshot
+from .ProductLifecycle import ProductLifecycle
 from .Products import Products
+from .RunSequence import RunSequence
+from .SimulationStore import SimulationStore
 from .Users import Users
 
-__all__ = ["Ecommerce", "Orders", "Products", "Users"]
+__all__ = [
+    "DailySales",
+    "DemandCurve",
+    "Ecommerce",
+    "EventStream",
+    "IncrementalExport",
+    "Orders",
+    "PopularitySnapshot",
+    "ProductLifecycle",
+    "Products",
+    "RunSequence",
+    "SimulationStore",
+    "Users",
+]
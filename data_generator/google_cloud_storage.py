@@ -1,10 +1,36 @@
-from google.cloud import storage
+import asyncio
+import json
+import random
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from urllib.parse import quote
+
+from shared.config import get_config
+from shared.logger import get_logger
+
+log = get_logger(__name__)
+config = get_config()
+
+GCS_ENDPOINT = "https://storage.googleapis.com"
+GCS_SCOPES = ["https://www.googleapis.com/auth/devstorage.read_write"]
+# Transient statuses worth retrying, as recommended by the Cloud Storage retry strategy.
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+_upload_manager: ContextVar["AsyncUploadManager | None"] = ContextVar("upload_manager", default=None)
 
 
 def upload_to_bucket(blob_name: str, data: str | bytes, bucket_name: str, content_type: str = "text/csv") -> None:
     """
     Upload data to a Google Cloud Storage bucket.
 
+    Inside deferred_uploads() the upload is queued on the async upload manager and this returns immediately.
+
     Args:
         blob_name (str): Name of the blob/file to create or overwrite.
         data (str | bytes): Data to upload, either as a string or bytes.
@@ -12,12 +38,64 @@ def upload_to_bucket(blob_name: str, data: str | bytes, bucket_name: str, conten
         content_type (str, optional): MIME type of the data. Defaults to 'text/csv'.
 
     """
+    manager = _upload_manager.get()
+    if manager is not None:
+        manager.submit(blob_name, data, bucket_name, content_type)
+        return
+
+    from google.cloud import storage
+
     storage_client = storage.Client()
     bucket = storage_client.bucket(bucket_name)
     blob = bucket.blob(blob_name)
     blob.upload_from_string(data, content_type=content_type)
 
 
+def upload_file_to_bucket(
+    blob_name: str,
+    file_path: str | Path,
+    bucket_name: str,
+    content_type: str = "text/csv",
+    *,
+    crc32c: str | None = None,
+    delete: bool = False,
+) -> None:
+    """
+    Upload a local file to a Google Cloud Storage bucket, streaming it from disk rather than holding it in memory.
+
+    Inside deferred_uploads() the upload is queued on the async upload manager and this returns immediately.
+
+    Args:
+        blob_name (str): Name of the blob/file to create or overwrite.
+        file_path (str | Path): Path of the file to upload.
+        bucket_name (str): Name of the bucket to upload to.
+        content_type (str, optional): MIME type of the data. Defaults to 'text/csv'.
+        crc32c (str | None): Expected base64 encoded CRC32C of the file, e.g. from SpooledCSV. The upload fails if
+            Cloud Storage reports a different checksum for the object.
+        delete (bool): Delete the file once it's uploaded.
+
+    Raises:
+        ValueError: If the uploaded object's CRC32C doesn't match crc32c.
+
+    """
+    manager = _upload_manager.get()
+    if manager is not None:
+        manager.submit_file(blob_name, file_path, bucket_name, content_type, crc32c=crc32c, delete=delete)
+        return
+
+    from google.cloud import storage
+
+    storage_client = storage.Client()
+    bucket = storage_client.bucket(bucket_name)
+    blob = bucket.blob(blob_name)
+    blob.upload_from_filename(file_path, content_type=content_type, checksum="crc32c")
+    if crc32c is not None and blob.crc32c != crc32c:
+        error_msg = f"Uploaded {blob_name} has CRC32C {blob.crc32c}, expected {crc32c}."
+        raise ValueError(error_msg)
+    if delete:
+        Path(file_path).unlink()
+
+
 def download_from_bucket(blob_name: str, bucket_name: str, file_name: str) -> None:
     """
     Download a blob/file from a Google Cloud Storage bucket to a local file.
@@ -28,7 +106,321 @@ def download_from_bucket(blob_name: str, bucket_name: str, file_name: str) -> No
         file_name (str): Local file path to save the downloaded blob.
 
     """
+    from google.cloud import storage
+
     storage_client = storage.Client()
     bucket = storage_client.get_bucket(bucket_name)
     blob = bucket.blob(blob_name)
     blob.download_to_filename(file_name)
+
+
+@contextmanager
+def deferred_uploads(
+    max_concurrency: int | None = None,
+    max_retries: int | None = None,
+) -> Iterator["AsyncUploadManager"]:
+    """
+    Upload every report written inside the block concurrently in the background.
+
+    upload_to_bucket() and upload_file_to_bucket() calls queue their data on an AsyncUploadManager and return, so
+    generating the next day isn't held up by the previous day's uploads. The block waits for every upload on exit
+    and logs the upload report.
+
+    Args:
+        max_concurrency (int | None): Uploads in flight at once, config.UPLOAD_CONCURRENCY if None.
+        max_retries (int | None): Retries per object for transient errors, config.UPLOAD_MAX_RETRIES if None.
+
+    Yields:
+        AsyncUploadManager: The running upload manager.
+
+    Raises:
+        RuntimeError: If any upload still failed after its retries.
+
+    """
+    manager = AsyncUploadManager(
+        max_concurrency=max_concurrency or config.UPLOAD_CONCURRENCY,
+        max_retries=max_retries if max_retries is not None else config.UPLOAD_MAX_RETRIES,
+    )
+    token = _upload_manager.set(manager)
+    try:
+        with manager:
+            yield manager
+    finally:
+        _upload_manager.reset(token)
+
+
+@dataclass
+class UploadReport:
+    """
+    Aggregate results of the uploads made by an AsyncUploadManager.
+
+    Attributes:
+        objects (int): Objects uploaded successfully.
+        failed (int): Objects that failed after every retry.
+        retries (int): Retried attempts across all objects.
+        megabytes (float): Megabytes uploaded successfully.
+        seconds (float): Time from the first upload starting to the last finishing.
+        mb_per_sec (float): Aggregate upload throughput.
+
+    """
+
+    objects: int = 0
+    failed: int = 0
+    retries: int = 0
+    megabytes: float = 0.0
+    seconds: float = 0.0
+    mb_per_sec: float = 0.0
+
+
+class AsyncUploadManager:
+    """
+    Uploads objects to Cloud Storage concurrently from an asyncio event loop on a background thread.
+
+    Uploads use the JSON API's simple media upload over one shared aiohttp session, so connections are reused.
+    A semaphore bounds the uploads in flight and each object is retried on connection errors and transient
+    statuses with exponential backoff and full jitter. If STORAGE_EMULATOR_HOST is set, e.g. to a local
+    fake-gcs-server, uploads go there without authentication.
+
+    Attributes:
+        max_concurrency (int): Uploads in flight at once.
+        max_retries (int): Retries per object for transient errors.
+        base_backoff (float): Seconds before the first retry, doubled for each further retry.
+        max_backoff (float): Longest wait between retries.
+        endpoint (str): The Cloud Storage endpoint.
+        report (UploadReport): Aggregate results, complete once the manager is closed.
+
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        base_backoff: float = 0.5,
+        max_backoff: float = 32.0,
+        endpoint: str | None = None,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.endpoint = (endpoint or config.STORAGE_EMULATOR_HOST or GCS_ENDPOINT).rstrip("/")
+        self.report = UploadReport()
+        self._emulated = self.endpoint != GCS_ENDPOINT
+        self._loop = None
+        self._thread: threading.Thread | None = None
+        self._futures: list[Future] = []
+        self._session = None
+        self._semaphore = None
+        self._auth_lock = None
+        self._credentials = None
+        self._started: float | None = None
+        self._finished = 0.0
+
+    def __enter__(self) -> "AsyncUploadManager":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Start the event loop thread and open the shared HTTP session."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="gcs-uploads", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+
+    def submit(self, blob_name: str, data: str | bytes, bucket_name: str, content_type: str = "text/csv") -> Future:
+        """
+        Queue an upload and return without waiting for it.
+
+        Args:
+            blob_name (str): Name of the blob/file to create or overwrite.
+            data (str | bytes): Data to upload, either as a string or bytes.
+            bucket_name (str): Name of the bucket to upload to.
+            content_type (str, optional): MIME type of the data. Defaults to 'text/csv'.
+
+        Returns:
+            Future: Completes when the object is uploaded, or with the error of the last attempt.
+
+        """
+        if self._loop is None:
+            error_msg = "The upload manager isn't started."
+            raise RuntimeError(error_msg)
+        payload = data.encode() if isinstance(data, str) else data
+        future = asyncio.run_coroutine_threadsafe(
+            self._upload(blob_name, payload, bucket_name, content_type),
+            self._loop,
+        )
+        self._futures.append(future)
+        return future
+
+    def submit_file(
+        self,
+        blob_name: str,
+        file_path: str | Path,
+        bucket_name: str,
+        content_type: str = "text/csv",
+        *,
+        crc32c: str | None = None,
+        delete: bool = False,
+    ) -> Future:
+        """
+        Queue an upload of a local file and return without waiting for it.
+
+        The file is streamed from disk on each attempt, so it isn't held in memory while it waits.
+
+        Args:
+            blob_name (str): Name of the blob/file to create or overwrite.
+            file_path (str | Path): Path of the file to upload.
+            bucket_name (str): Name of the bucket to upload to.
+            content_type (str, optional): MIME type of the data. Defaults to 'text/csv'.
+            crc32c (str | None): Expected base64 encoded CRC32C of the file. An upload that Cloud Storage reports a
+                different checksum for is retried like a transient error.
+            delete (bool): Delete the file once it's uploaded.
+
+        Returns:
+            Future: Completes when the object is uploaded, or with the error of the last attempt.
+
+        """
+        if self._loop is None:
+            error_msg = "The upload manager isn't started."
+            raise RuntimeError(error_msg)
+        future = asyncio.run_coroutine_threadsafe(
+            self._upload(blob_name, Path(file_path), bucket_name, content_type, crc32c=crc32c, delete=delete),
+            self._loop,
+        )
+        self._futures.append(future)
+        return future
+
+    def close(self) -> UploadReport:
+        """
+        Wait for every queued upload, close the session and stop the event loop.
+
+        Returns:
+            UploadReport: Aggregate results of the uploads.
+
+        Raises:
+            RuntimeError: If any upload still failed after its retries.
+
+        """
+        if self._loop is None:
+            return self.report
+
+        errors = []
+        for future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+        asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+        if self._started is not None:
+            self.report.seconds = round(self._finished - self._started, 4)
+        self.report.megabytes = round(self.report.megabytes, 4)
+        if self.report.seconds > 0:
+            self.report.mb_per_sec = round(self.report.megabytes / self.report.seconds, 2)
+        summary = asdict(self.report)
+        log.info("Upload report: %s", json.dumps(summary), extra={"json_fields": summary})
+
+        if errors:
+            error_msg = f"{len(errors)} upload(s) failed, the first with: {errors[0]}"
+            raise RuntimeError(error_msg) from errors[0]
+        return self.report
+
+    async def _open(self) -> None:
+        import aiohttp
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._auth_lock = asyncio.Lock()
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+            timeout=aiohttp.ClientTimeout(total=300),
+        )
+
+    async def _upload(
+        self,
+        blob_name: str,
+        source: bytes | Path,
+        bucket_name: str,
+        content_type: str,
+        *,
+        crc32c: str | None = None,
+        delete: bool = False,
+    ) -> None:
+        """Upload one object from bytes or a file, retrying transient failures with exponential backoff."""
+        import aiohttp
+
+        url = f"{self.endpoint}/upload/storage/v1/b/{quote(bucket_name, safe='')}/o"
+        params = {"uploadType": "media", "name": blob_name}
+        size = source.stat().st_size if isinstance(source, Path) else len(source)
+
+        async with self._semaphore:
+            if self._started is None:
+                self._started = time.perf_counter()
+            for attempt in range(self.max_retries + 1):
+                body = source.open("rb") if isinstance(source, Path) else source
+                try:
+                    headers = {"Content-Type": content_type, **await self._auth_headers()}
+                    async with self._session.post(url, params=params, data=body, headers=headers) as response:
+                        if response.status < 300:
+                            uploaded = (await response.json(content_type=None)).get("crc32c") if crc32c else None
+                            if uploaded == crc32c:
+                                break
+                            # The object was corrupted on the way, uploading it again overwrites it.
+                            error_msg = f"Uploaded {blob_name} has CRC32C {uploaded}, expected {crc32c}"
+                            retryable = True
+                        else:
+                            body_text = await response.text()
+                            error_msg = f"Upload of {blob_name} failed with status {response.status}: {body_text[:200]}"
+                            retryable = response.status in RETRY_STATUSES
+                        if not retryable or attempt == self.max_retries:
+                            raise RuntimeError(error_msg)
+                        log.debug(error_msg)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == self.max_retries:
+                        self.report.failed += 1
+                        raise
+                    log.debug("Upload of %s failed with %r.", blob_name, e)
+                except RuntimeError:
+                    self.report.failed += 1
+                    raise
+                finally:
+                    if isinstance(source, Path):
+                        body.close()
+
+                self.report.retries += 1
+                backoff = random.uniform(0, min(self.max_backoff, self.base_backoff * 2**attempt))
+                log.debug("Retrying upload of %s in %.2fs, attempt %s.", blob_name, backoff, attempt + 2)
+                await asyncio.sleep(backoff)
+
+            self.report.objects += 1
+            self.report.megabytes += size / 1e6
+            self._finished = time.perf_counter()
+        if delete:
+            source.unlink()
+        log.debug("Uploaded %s to %s.", blob_name, bucket_name)
+
+    async def _auth_headers(self) -> dict[str, str]:
+        """Get the Authorization header, refreshing the default credentials' token off the loop when expired."""
+        if self._emulated:
+            return {}
+
+        async with self._auth_lock:
+            if self._credentials is None or not self._credentials.valid:
+                self._credentials = await asyncio.get_running_loop().run_in_executor(None, self._refresh_credentials)
+        return {"Authorization": f"Bearer {self._credentials.token}"}
+
+    def _refresh_credentials(self) -> object:
+        import google.auth
+        from google.auth.transport.requests import Request
+
+        credentials = self._credentials
+        if credentials is None:
+            credentials, _ = google.auth.default(scopes=GCS_SCOPES)
+        credentials.refresh(Request())
+        return credentials
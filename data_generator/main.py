@@ -1,63 +1,407 @@
 import argparse
+import multiprocessing
+import os
 import random
-from datetime import datetime, timezone
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
 
 import yaml
 
 from data_generator import Ecommerce
-from shared.db_connection import close_db, init_db
+from data_generator.google_cloud_storage import deferred_uploads
+from data_generator.profiling import RunProfiler
+from data_generator.RunSequence import RunSequence
+from data_generator.seeding import RandomStreams
+from data_generator.VolumeProfile import VolumeProfile
+from shared.config import get_config
+from shared.db_connection import close_db, init_db, log_query_report
 from shared.logger import get_logger, setup_logging
+from shared.metrics import emit_summary, start_run
 
 setup_logging()
 log = get_logger(__name__)
 
 
+def parse_shard(value: str) -> tuple[int, int]:
+    """
+    Parse a shard argument in the form 'i/N'.
+
+    Args:
+        value (str): The shard, e.g. '0/4' for the first of four shards.
+
+    Returns:
+        tuple[int, int]: The shard index and shard count.
+
+    Raises:
+        argparse.ArgumentTypeError: If the value isn't a valid shard.
+
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        error_msg = f"Expected a shard in the form i/N, got '{value}'."
+        raise argparse.ArgumentTypeError(error_msg) from None
+    if count < 1 or not 0 <= index < count:
+        error_msg = f"Shard index must be between 0 and {count - 1}, got '{value}'."
+        raise argparse.ArgumentTypeError(error_msg)
+    return index, count
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument("--run_date", required=False, help="ISO date, e.g., 2025-06-17")
+    parser.add_argument(
+        "--end_date",
+        required=False,
+        help="ISO date, generates every day from --run_date to --end_date inclusive",
+    )
     parser.add_argument("--create_products", action="store_true", help="Flag to create products")
-    return parser.parse_args()
+    parser.add_argument(
+        "--rebuild_sales_summary",
+        action="store_true",
+        help="Flag to rebuild the daily sales summary tables from all orders before the run",
+    )
+    parser.add_argument(
+        "--incremental_export",
+        action="store_true",
+        help="Flag to export every row added or changed since the last incremental export once the run is generated",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        required=False,
+        help="Root seed for reproducible generation, a random seed is chosen and logged if omitted",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        required=False,
+        help="Generate only every Nth date starting from the i-th, e.g. 0/4. Defaults to the Cloud Run task index and "
+        "count",
+    )
+    parser.add_argument(
+        "--run_id",
+        required=False,
+        help="Identifies the run every shard belongs to, so shards commit their days in date order. Defaults to the "
+        "Cloud Run execution",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of local worker processes, each generating one shard of the dates",
+    )
+    parser.add_argument(
+        "--volume_profile",
+        required=False,
+        help="Volume profile from config.yaml driving orders and products per day, e.g. load_100x",
+    )
+    parser.add_argument("--profile", action="store_true", help="Flag to profile the run with cProfile")
+    parser.add_argument(
+        "--trace_memory",
+        action="store_true",
+        help="Flag to take tracemalloc snapshots around user and order creation and the exports",
+    )
+    args = parser.parse_args()
 
+    if args.shard is None and "CLOUD_RUN_TASK_INDEX" in os.environ:
+        args.shard = (int(os.environ["CLOUD_RUN_TASK_INDEX"]), int(os.getenv("CLOUD_RUN_TASK_COUNT", "1")))
+    if args.shard is not None and args.workers > 1:
+        parser.error("--shard and --workers can't be combined, --workers runs every shard locally.")
+    if args.incremental_export and args.shard is not None and args.shard[1] > 1:
+        parser.error("--incremental_export can't run in sharded tasks, export once after every shard has finished.")
+    if args.seed is None and ((args.shard is not None and args.shard[1] > 1) or args.workers > 1):
+        parser.error("--seed is required for sharded runs so every shard derives the same random streams.")
+    if args.run_id is None and args.shard is not None and args.shard[1] > 1:
+        args.run_id = os.getenv("CLOUD_RUN_EXECUTION")
+        if args.run_id is None:
+            parser.error("--run_id is required for sharded runs so the shards commit their days in date order.")
+    return args
 
-def main() -> None:
-    try:
-        init_db()
-        args = parse_args()
-        run_date = datetime.fromisoformat(args.run_date) if args.run_date else datetime.now(tz=timezone.utc)
-        create_products = args.create_products
 
-        with open("data_generator/config.yaml") as f:
-            config = yaml.safe_load(f.read())
+def get_run_dates(run_date: datetime, end_date: datetime | None) -> list[datetime]:
+    """
+    List every day from run_date to end_date inclusive.
+
+    Args:
+        run_date (datetime): The first day.
+        end_date (datetime | None): The last day, if None only run_date is returned.
+
+    Returns:
+        list[datetime]: The days to generate.
+
+    """
+    num_days = (end_date.date() - run_date.date()).days + 1 if end_date else 1
+    return [run_date + timedelta(days=day) for day in range(num_days)]
 
-        ecommerce = Ecommerce(locales=config.get("locales"))
-        is_wednesday = datetime.now(tz=timezone.utc).isoweekday() == 3
 
-        if create_products or is_wednesday:
-            ecommerce.create_products(
-                num_items=random.randint(1, 6),
-                creation_date=run_date,
-                **config.get("create_products"),
-            )
+def shard_dates(run_dates: list[datetime], shard: tuple[int, int]) -> list[datetime]:
+    """
+    Select every Nth date starting from the shard's index.
 
-        ecommerce.create_orders(
-            num_orders=random.randint(3, 300),
-            max_num_items=7,
-            date_created=run_date,
+    Days are committed in date order, so each shard takes every Nth day rather than a contiguous slice, and a shard
+    generates its next day's users while the other shards commit theirs.
+
+    Args:
+        run_dates (list[datetime]): All days of the run.
+        shard (tuple[int, int]): The shard index and shard count.
+
+    Returns:
+        list[datetime]: The days this shard generates.
+
+    """
+    index, count = shard
+    return run_dates[index::count]
+
+
+def generate_day(
+    run_date: datetime,
+    seed: int,
+    config: dict,
+    volume_profile: VolumeProfile,
+    *,
+    create_products: bool,
+    export: bool = True,
+    sequence: RunSequence | None = None,
+) -> None:
+    """
+    Generate, commit and export one day of products, users and orders.
+
+    The new users' profiles don't depend on the database and are generated first. Everything else depends on the
+    days before it, so with a run sequence the day waits for its turn before it's generated and committed, and a
+    parallel run generates the same data as a serial one.
+
+    Args:
+        run_date (datetime): The day to generate.
+        seed (int): Root seed for reproducible generation.
+        config (dict): The generator config from config.yaml.
+        volume_profile (VolumeProfile): Decides how many products and orders to generate.
+        create_products (bool): Create products even if the day isn't a launch day.
+        export (bool): Export the day's data to CSV, False when it's exported incrementally after the run.
+        sequence (RunSequence | None): Commits the run's days in date order, None when they're generated serially.
+
+    """
+    if sequence is not None and sequence.committed(run_date):
+        log.info("Skipping %s, it was committed by an earlier attempt.", run_date.date())
+        return
+
+    rng = RandomStreams(seed).spawn("main", run_date.date().isoformat())
+    ecommerce = Ecommerce(locales=config.get("locales"), seed=seed)
+    num_products = volume_profile.num_products(run_date, rng, create_products=create_products)
+    num_orders = volume_profile.num_orders(run_date, rng)
+    profiles = ecommerce.generate_user_profiles(num_orders, run_date)
+
+    if sequence is not None and not sequence.wait(run_date):
+        log.info("Skipping %s, it was committed by another worker.", run_date.date())
+        return
+
+    # The lifecycle rules are idempotent, so they're committed on their own before the day is generated. The day is
+    # generated into the simulation store outside the unit of work, so on SQLite the write lock is only held for the
+    # flush.
+    if config.get("product_lifecycle"):
+        ecommerce.update_product_lifecycle(run_date, **config.get("product_lifecycle"))
+
+    if num_products > 0:
+        ecommerce.create_products(
+            num_items=num_products,
+            creation_date=run_date,
+            **config.get("create_products"),
         )
 
+    ecommerce.create_orders(
+        num_orders=num_orders,
+        max_num_items=volume_profile.max_num_items,
+        date_created=run_date,
+        profiles=profiles,
+    )
+    with ecommerce.unit_of_work():
+        ecommerce.flush()
+        if sequence is not None:
+            sequence.advance(run_date)
+
+    if export:
         ecommerce.to_csv(
             start_date=datetime.strftime(run_date, "%Y-%m-%d"),
             end_date=datetime.strftime(run_date, "%Y-%m-%d"),
             timestamp=datetime.strftime(run_date, "%Y-%m-%d"),
             messy_data=True,
         )
-        log.info(ecommerce)
+    log.info(ecommerce)
+
+
+def start_profiler(*, profile: bool, trace_memory: bool) -> RunProfiler | None:
+    """
+    Start profiling the current process if requested.
+
+    Args:
+        profile (bool): Profile with cProfile.
+        trace_memory (bool): Take tracemalloc snapshots.
+
+    Returns:
+        RunProfiler | None: The started profiler, or None if neither was requested.
+
+    """
+    if not profile and not trace_memory:
+        return None
+    profiler = RunProfiler(cpu=profile, memory=trace_memory)
+    profiler.start()
+    return profiler
+
+
+def save_profile(profiler: RunProfiler | None, name: str) -> None:
+    """
+    Stop a profiler started by start_profiler() and save its results.
+
+    Args:
+        profiler (RunProfiler | None): The profiler, None if the run isn't profiled.
+        name (str): The prefix of the profile filenames.
+
+    """
+    if profiler is None:
+        return
+    profiler.stop()
+    try:
+        profiler.save(datetime.now(tz=timezone.utc).strftime("%Y-%m-%dT%H%M%S"), name)
+    except Exception:
+        log.exception("Error saving profile")
+
+
+def run_shard(
+    run_dates: list[datetime],
+    seed: int,
+    config: dict,
+    volume_profile: VolumeProfile,
+    shard: tuple[int, int],
+    *,
+    create_products: bool,
+    export: bool = True,
+    profile: bool = False,
+    trace_memory: bool = False,
+    sequence: RunSequence | None = None,
+) -> None:
+    """
+    Generate a shard's days in a worker process.
+
+    Workers profile themselves, each saving its own profile, since the parent process only waits for them.
+
+    Args:
+        run_dates (list[datetime]): All days of the run.
+        seed (int): Root seed for reproducible generation.
+        config (dict): The generator config from config.yaml.
+        volume_profile (VolumeProfile): Decides how many products and orders to generate.
+        shard (tuple[int, int]): The shard index and shard count.
+        create_products (bool): Create products every day, not only on launch days.
+        export (bool): Export each day's data to CSV.
+        profile (bool): Profile the worker with cProfile.
+        trace_memory (bool): Take tracemalloc snapshots in the worker.
+        sequence (RunSequence | None): Commits the run's days in date order.
+
+    """
+    start_run()
+    profiler = start_profiler(profile=profile, trace_memory=trace_memory)
+    try:
+        with deferred_uploads() if get_config().CSV_CLOUD_STORAGE_FILE else nullcontext():
+            for run_date in shard_dates(run_dates, shard):
+                generate_day(
+                    run_date,
+                    seed,
+                    config,
+                    volume_profile,
+                    create_products=create_products,
+                    export=export,
+                    sequence=sequence,
+                )
+    finally:
+        save_profile(profiler, f"data_generator_shard_{shard[0]}_of_{shard[1]}")
+        close_db()
+        emit_summary(f"data_generator.shard_{shard[0]}_of_{shard[1]}")
+        log_query_report()
+
+
+def main() -> None:
+    start_run()
+    args = parse_args()
+    # With --workers the workers profile themselves, this process only waits for them.
+    profiler = start_profiler(profile=args.profile, trace_memory=args.trace_memory) if args.workers == 1 else None
+    try:
+        init_db()
+        run_date = datetime.fromisoformat(args.run_date) if args.run_date else datetime.now(tz=timezone.utc)
+        end_date = datetime.fromisoformat(args.end_date) if args.end_date else None
+        run_dates = get_run_dates(run_date, end_date)
+        seed = args.seed if args.seed is not None else random.SystemRandom().randrange(2**63)
+        log.info("Generating %s day(s) with seed %s.", len(run_dates), seed)
+
+        with open("data_generator/config.yaml") as f:
+            config = yaml.safe_load(f.read())
+        volume_profile = VolumeProfile.from_config(config, args.volume_profile)
+        log.info("Using volume profile '%s'.", volume_profile.name)
+
+        if args.rebuild_sales_summary:
+            Ecommerce(locales=config.get("locales")).rebuild_sales_summary()
+
+        sequence = None
+        if args.workers > 1 or (args.shard is not None and args.shard[1] > 1):
+            sequence = RunSequence(args.run_id or uuid.uuid4().hex, run_dates)
+            sequence.start()
+            log.info("Committing the days of run %s in date order.", sequence.run_id)
+
+        # Reports are uploaded in the background while the next days generate, and all uploads finish here.
+        with deferred_uploads() if get_config().CSV_CLOUD_STORAGE_FILE else nullcontext():
+            if args.workers > 1:
+                # Spawn rather than fork so workers don't inherit this process's pooled connections.
+                with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    futures = [
+                        executor.submit(
+                            run_shard,
+                            run_dates,
+                            seed,
+                            config,
+                            volume_profile,
+                            (index, args.workers),
+                            create_products=args.create_products,
+                            export=not args.incremental_export,
+                            profile=args.profile,
+                            trace_memory=args.trace_memory,
+                            sequence=sequence,
+                        )
+                        for index in range(args.workers)
+                    ]
+                    # A failed day leaves the other workers waiting for its turn, so they're told to stop.
+                    done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                    failed = [future for future in done if future.exception() is not None]
+                    if failed:
+                        sequence.fail()
+                        failed[0].result()
+                    for future in futures:
+                        future.result()
+            else:
+                for day in shard_dates(run_dates, args.shard or (0, 1)):
+                    generate_day(
+                        day,
+                        seed,
+                        config,
+                        volume_profile,
+                        create_products=args.create_products,
+                        export=not args.incremental_export,
+                        sequence=sequence,
+                    )
+
+            if args.incremental_export:
+                Ecommerce(locales=config.get("locales"), seed=seed).export_changes(
+                    timestamp=datetime.strftime(run_dates[-1], "%Y-%m-%d"),
+                    messy_data=True,
+                )
 
     except Exception:
         log.exception("Error in data generator")
 
     finally:
+        save_profile(profiler, "data_generator")
         close_db()
+        emit_summary("data_generator")
+        log_query_report()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+import cProfile
+import io
+import json
+import logging
+import marshal
+import pstats
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from data_generator.google_cloud_storage import upload_to_bucket
+from shared.config import get_config
+from shared.logger import get_logger
+
+log = get_logger(__name__)
+config = get_config()
+
+PROFILE_DIR = "profiles"
+TOP_N = 20
+
+_memory_reports: list[dict] = []
+_open_peaks: list[int] = []
+
+
+@contextmanager
+def memory_snapshot(label: str, top_n: int = TOP_N) -> Iterator[None]:
+    """
+    Record the allocations made by a block of code if tracemalloc is tracing.
+
+    Takes a snapshot before and after the block and keeps the lines that allocated the most memory, along with the
+    peak traced memory during the block. Snapshots can be nested. Does nothing when tracemalloc isn't tracing, so it
+    can stay in place.
+
+    Args:
+        label (str): The name of the block, e.g. 'users.create'.
+        top_n (int): Number of allocating lines to keep.
+
+    Yields:
+        None
+
+    """
+    if not tracemalloc.is_tracing():
+        yield
+        return
+
+    filters = [tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__)]
+    before = tracemalloc.take_snapshot().filter_traces(filters)
+    if _open_peaks:
+        # Keep the enclosing block's peak so far, reset_peak() discards it.
+        _open_peaks[-1] = max(_open_peaks[-1], tracemalloc.get_traced_memory()[1])
+    _open_peaks.append(0)
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        after = tracemalloc.take_snapshot().filter_traces(filters)
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, _open_peaks.pop())
+        if _open_peaks:
+            _open_peaks[-1] = max(_open_peaks[-1], peak)
+        differences = after.compare_to(before, "lineno")
+        report = {
+            "label": label,
+            "allocated_mb": round(sum(stat.size_diff for stat in differences) / 1e6, 3),
+            "peak_mb": round(peak / 1e6, 3),
+            "current_mb": round(current / 1e6, 3),
+            "top_allocations": [
+                {
+                    "location": str(stat.traceback),
+                    "size_diff_kb": round(stat.size_diff / 1e3, 1),
+                    "count_diff": stat.count_diff,
+                }
+                for stat in differences[:top_n]
+            ],
+        }
+        _memory_reports.append(report)
+        log.info(
+            "Memory snapshot %s: allocated %sMB, peak %sMB.",
+            label,
+            report["allocated_mb"],
+            report["peak_mb"],
+        )
+
+
+class RunProfiler:
+    """
+    Profiles a whole generator run with cProfile and/or tracemalloc and saves the results.
+
+    Results are saved locally and/or to Google Cloud Storage depending on the env config, like the CSV exports.
+    The CPU profile is a pstats file, readable with pstats, snakeviz or converted for speedscope with py-spy or
+    flameprof. Memory snapshots are taken by memory_snapshot() around the blocks it wraps and saved as JSON.
+
+    Attributes:
+        cpu (bool): Whether to profile with cProfile.
+        memory (bool): Whether to trace allocations with tracemalloc.
+
+    """
+
+    def __init__(self, *, cpu: bool = True, memory: bool = False) -> None:
+        self.cpu = cpu
+        self.memory = memory
+        self.profiler = cProfile.Profile() if cpu else None
+
+    def start(self) -> None:
+        """Start profiling."""
+        if self.memory:
+            _memory_reports.clear()
+            _open_peaks.clear()
+            tracemalloc.start()
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def stop(self) -> None:
+        """Stop profiling."""
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.memory:
+            tracemalloc.stop()
+
+    def save(self, timestamp: str, name: str = "data_generator") -> list[str]:
+        """
+        Save the CPU profile and memory snapshots.
+
+        Args:
+            timestamp (str): The timestamp for the profile filenames.
+            name (str): The prefix of the profile filenames, e.g. to tell worker processes apart.
+
+        Returns:
+            list[str]: The names of the saved files.
+
+        """
+        files: dict[str, tuple[bytes, str]] = {}
+
+        if self.profiler is not None:
+            stats = pstats.Stats(self.profiler)
+            if log.isEnabledFor(logging.DEBUG):
+                summary = io.StringIO()
+                stats.stream = summary
+                stats.sort_stats("cumulative").print_stats(TOP_N)
+                log.debug("Top %s functions by cumulative time:\n%s", TOP_N, summary.getvalue())
+            files[f"{name}_{timestamp}.pstats"] = (marshal.dumps(stats.stats), "application/octet-stream")
+
+        if self.memory:
+            files[f"{name}_{timestamp}_memory.json"] = (
+                json.dumps(_memory_reports, indent=2).encode(),
+                "application/json",
+            )
+
+        for file_name, (data, content_type) in files.items():
+            if config.CSV_LOCAL_FILE:
+                Path(PROFILE_DIR).mkdir(exist_ok=True)
+                Path(PROFILE_DIR, file_name).write_bytes(data)
+            if config.CSV_CLOUD_STORAGE_FILE:
+                upload_to_bucket(f"{PROFILE_DIR}/{file_name}", data, config.STORAGE_BUCKET, content_type)
+            log.info("Saved profile %s.", file_name)
+
+        return list(files)
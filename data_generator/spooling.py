@@ -0,0 +1,161 @@
+import base64
+import csv
+import os
+import tempfile
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+from types import TracebackType
+
+from shared.config import get_config
+from shared.logger import get_logger
+
+log = get_logger(__name__)
+config = get_config()
+
+# Encoded rows are buffered to about this many characters before being checksummed and written, so the checksum
+# isn't updated once per row.
+WRITE_BUFFER_CHARS = 1 << 20
+
+
+def get_spool_dir() -> Path:
+    """
+    Get the directory reports are spooled to before they're uploaded to Cloud Storage, creating it if needed.
+
+    Returns:
+        Path: config.EXPORT_SPOOL_DIR, or a directory in the system temp directory if it isn't set.
+
+    """
+    spool_dir = Path(config.EXPORT_SPOOL_DIR or Path(tempfile.gettempdir(), "ecommerce_exports"))
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    return spool_dir
+
+
+class _ChecksumWriter:
+    """File-like text writer that encodes to the binary file underneath and updates a CRC32C as it goes."""
+
+    def __init__(self, file: object, checksum: object) -> None:
+        self._file = file
+        self._checksum = checksum
+        self._buffer: list[str] = []
+        self._buffered = 0
+        self.bytes_written = 0
+
+    def write(self, text: str) -> int:
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= WRITE_BUFFER_CHARS:
+            self.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        data = "".join(self._buffer).encode()
+        self._buffer.clear()
+        self._buffered = 0
+        self._checksum.update(data)
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def crc32c(self) -> str:
+        return base64.b64encode(self._checksum.digest()).decode()
+
+
+class SpooledCSV:
+    """
+    Writes a CSV to a temporary file next to its destination and atomically renames it into place.
+
+    Until the block exits cleanly the rows only exist in a hidden `.<name>.*.tmp` file, so a crash never leaves a
+    truncated report under the final name. The file is fsynced before the rename, and the directory after it,
+    unless config.EXPORT_FSYNC is off. A CRC32C of the content is computed while writing, in the base64 form Cloud
+    Storage reports, so an upload of the file can be verified without querying the database again.
+
+    Attributes:
+        path (Path): The final path of the CSV.
+        fsync (bool): Whether the file and directory are fsynced when the CSV is finalized.
+        crc32c (str | None): Base64 encoded CRC32C of the content, set once the CSV is finalized.
+        size (int): Bytes written.
+
+    Example:
+        with SpooledCSV("Order_report_2025-01-01.csv", header=["order_id", ...]) as spool:
+            spool.writerows(rows)
+        upload_file_to_bucket(..., spool.path, ..., crc32c=spool.crc32c)
+
+    """
+
+    def __init__(self, path: str | Path, header: Sequence[str] | None = None, *, fsync: bool | None = None) -> None:
+        self.path = Path(path)
+        self.header = header
+        self.fsync = config.EXPORT_FSYNC if fsync is None else fsync
+        self.crc32c: str | None = None
+        self.size = 0
+        self._temp_path: Path | None = None
+        self._file = None
+        self._writer: _ChecksumWriter | None = None
+        self._csv_writer = None
+
+    def __enter__(self) -> "SpooledCSV":
+        import google_crc32c
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        self._temp_path = Path(temp_path)
+        self._file = os.fdopen(fd, "wb")
+        self._writer = _ChecksumWriter(self._file, google_crc32c.Checksum())
+        self._csv_writer = csv.writer(self._writer)
+        if self.header is not None:
+            self._csv_writer.writerow(self.header)
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is None:
+            self._finalize()
+            return
+
+        self._file.close()
+        self._temp_path.unlink(missing_ok=True)
+        log.debug("Discarded the partial spool file for %s.", self.path)
+
+    def writerow(self, row: Iterable) -> None:
+        """Write one row."""
+        self._csv_writer.writerow(row)
+
+    def writerows(self, rows: Iterable[Iterable]) -> None:
+        """Write every row in rows."""
+        self._csv_writer.writerows(rows)
+
+    def _finalize(self) -> None:
+        """Flush and fsync the temporary file, then rename it over the final path."""
+        try:
+            self._writer.flush()
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self._temp_path, self.path)
+        except BaseException:
+            self._file.close()
+            self._temp_path.unlink(missing_ok=True)
+            raise
+
+        if self.fsync:
+            _fsync_dir(self.path.parent)
+        self.size = self._writer.bytes_written
+        self.crc32c = self._writer.crc32c()
+        log.debug("Finalized %s, %s bytes, crc32c %s.", self.path, self.size, self.crc32c)
+
+
+def _fsync_dir(directory: Path) -> None:
+    """Fsync a directory so a rename in it survives a crash, where the platform supports it."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
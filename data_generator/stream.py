@@ -0,0 +1,84 @@
+import argparse
+
+import yaml
+
+from data_generator.EventStream import EventStream, create_sink
+from data_generator.Orders import Orders
+from data_generator.Users import Users
+from data_generator.VolumeProfile import VolumeProfile
+from shared.db_connection import close_db, init_db
+from shared.logger import get_logger, setup_logging
+from shared.metrics import emit_summary, start_run
+
+setup_logging()
+log = get_logger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stream users and order lines as NDJSON events at a target rate.")
+    parser.add_argument("--rate", type=float, required=True, help="Target events per second")
+    parser.add_argument(
+        "--duration",
+        type=float,
+        required=False,
+        help="Seconds to stream for, runs until interrupted if omitted",
+    )
+    parser.add_argument("--max_events", type=int, required=False, help="Stop after emitting this many events")
+    parser.add_argument(
+        "--sink",
+        default="stdout",
+        help="stdout, unix:PATH, file:PATH for rotating files, or package.module:ClassName for a custom EventSink",
+    )
+    parser.add_argument("--rotate_mb", type=float, default=100, help="Size in MB at which file sinks rotate")
+    parser.add_argument("--backup_count", type=int, default=5, help="Number of rotated files a file sink keeps")
+    parser.add_argument("--seed", type=int, required=False, help="Root seed for reproducible generation")
+    parser.add_argument(
+        "--persist",
+        action="store_true",
+        help="Flag to also insert the streamed users and order lines into the database",
+    )
+    parser.add_argument(
+        "--volume_profile",
+        required=False,
+        help="Volume profile from config.yaml, its max_num_items is used for every order",
+    )
+    parser.add_argument(
+        "--max_pending_batches",
+        type=int,
+        default=4,
+        help="Generated batches buffered before generation waits for the sink",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    start_run()
+    args = parse_args()
+    try:
+        init_db()
+        with open("data_generator/config.yaml") as f:
+            config = yaml.safe_load(f.read())
+        volume_profile = VolumeProfile.from_config(config, args.volume_profile)
+
+        sink = create_sink(args.sink, max_bytes=int(args.rotate_mb * 1_000_000), backup_count=args.backup_count)
+        log.info("Streaming events at %s/s to %s.", args.rate, args.sink)
+        EventStream(
+            users=Users(config.get("locales"), args.seed),
+            orders=Orders(args.seed),
+            sink=sink,
+            rate=args.rate,
+            max_num_items=volume_profile.max_num_items,
+            persist=args.persist,
+            max_pending_batches=args.max_pending_batches,
+        ).run(duration=args.duration, max_events=args.max_events)
+
+    except Exception:
+        log.exception("Error in event stream")
+
+    finally:
+        close_db()
+        emit_summary("data_generator.stream")
+
+
+if __name__ == "__main__":
+    main()
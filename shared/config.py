@@ -7,12 +7,36 @@ load_dotenv()
 
 class BaseConfig:
     ENV: str = "base"
-    LOG_LEVEL: str = "DEBUG"
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "DEBUG")
     USE_CLOUD_LOGGING: bool = False
-    DB_URL: str = "sqlite:///./ecommerce_dev.db"
+    ASYNC_LOGGING: bool = os.getenv("ASYNC_LOGGING", "false").lower() == "true"
+    LOG_BATCH_SIZE: int = int(os.getenv("LOG_BATCH_SIZE", "100"))
+    DB_URL: str = os.getenv("DB_URL", "sqlite:///./ecommerce_dev.db")
+    DB_READ_URL: str = os.getenv("DB_READ_URL", "")
+    SQLITE_READ_ONLY_ENGINE: bool = os.getenv("SQLITE_READ_ONLY_ENGINE", "true").lower() == "true"
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    SQLITE_MMAP_SIZE_MB: int = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
     STORAGE_BUCKET: str = os.getenv("TEST_STORAGE_BUCKET_NAME", "")
     CSV_LOCAL_FILE: bool = True
     CSV_CLOUD_STORAGE_FILE: bool = False
+    STORAGE_EMULATOR_HOST: str = os.getenv("STORAGE_EMULATOR_HOST", "")
+    UPLOAD_CONCURRENCY: int = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
+    UPLOAD_MAX_RETRIES: int = int(os.getenv("UPLOAD_MAX_RETRIES", "5"))
+    EXPORT_SPOOL_DIR: str = os.getenv("EXPORT_SPOOL_DIR", "")
+    EXPORT_FSYNC: bool = os.getenv("EXPORT_FSYNC", "true").lower() == "true"
+    RUN_SEQUENCE_TIMEOUT_SECONDS: float = float(os.getenv("RUN_SEQUENCE_TIMEOUT_SECONDS", "3600"))
+    SQL_PROFILING: bool = os.getenv("SQL_PROFILING", "false").lower() == "true"
+    SQL_SLOW_QUERY_MS: float = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+    SQL_EXPLAIN_SLOW_QUERIES: bool = os.getenv("SQL_EXPLAIN_SLOW_QUERIES", "false").lower() == "true"
+    SQL_REPORT_TOP_N: int = int(os.getenv("SQL_REPORT_TOP_N", "10"))
 
 
 class DevConfig(BaseConfig):
@@ -23,15 +47,20 @@ class CloudDevConfig(BaseConfig):
     ENV = "cloud_dev"
     USE_CLOUD_LOGGING = False
     DB_URL = os.getenv("CLOUD_SQL_TEST_DATABASE", "")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "2"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "2"))
     CSV_LOCAL_FILE = False
     CSV_CLOUD_STORAGE_FILE = True
 
 
 class ProdConfig(BaseConfig):
     ENV = "prod"
-    LOG_LEVEL = "INFO"
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     USE_CLOUD_LOGGING = True
+    ASYNC_LOGGING = os.getenv("ASYNC_LOGGING", "true").lower() == "true"
     DB_URL = os.getenv("CLOUD_SQL_DATABASE", "")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "2"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "2"))
     STORAGE_BUCKET: str = os.getenv("STORAGE_BUCKET_NAME", "")
     CSV_LOCAL_FILE = False
     CSV_CLOUD_STORAGE_FILE = True
@@ -1,32 +1,62 @@
 import os
+import threading
+from collections.abc import Iterator
 from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
 
 import sqlalchemy
 from dotenv import load_dotenv
-from google.cloud.sql.connector import Connector
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 from shared.config import get_config
+from shared.db_pool import MonitoredQueuePool, get_pool_status
+from shared.db_profiling import QueryProfiler
 from shared.logger import get_logger
 
 load_dotenv()
 log = get_logger(__name__)
 config = get_config()
 
+_unit_of_work_session: ContextVar[Session | None] = ContextVar("unit_of_work_session", default=None)
 
-def connect_with_cloud_sql_connector() -> sqlalchemy.engine.base.Engine:
+
+def get_pool_options() -> dict:
+    """
+    Returns the connection pool settings from the config, for create_engine().
+
+    Returns:
+        dict: Keyword arguments for a MonitoredQueuePool.
+
+    """
+    return {
+        "poolclass": MonitoredQueuePool,
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+
+
+def connect_with_cloud_sql_connector(instance: str | None = None) -> sqlalchemy.engine.base.Engine:
     """
 
     Initializes a connection pool for a Cloud SQL instance of Postgres.
 
-    Uses the Cloud SQL Python Connector package.
+    Uses the Cloud SQL Python Connector package, imported here so local runs don't load it.
+
+    Args:
+        instance (str | None): Instance connection name, CLOUD_SQL_INSTANCE_NAME if None.
 
     Returns:
         sqlalchemy.engine.base.Engine: SQL Alchemy engine.
 
     """
-    instance = os.environ["CLOUD_SQL_INSTANCE_NAME"]
+    from google.cloud.sql.connector import Connector
+
+    instance = instance or os.environ["CLOUD_SQL_INSTANCE_NAME"]
     db_user = os.environ["CLOUD_SQL_USER"]
     db_pass = os.environ["CLOUD_SQL_PASSWORD"]
     connector = Connector(refresh_strategy="LAZY")
@@ -44,10 +74,7 @@ def connect_with_cloud_sql_connector() -> sqlalchemy.engine.base.Engine:
     engine = sqlalchemy.create_engine(
         url="postgresql+pg8000://",
         creator=getconn,
-        pool_size=2,
-        max_overflow=2,
-        pool_timeout=30,  # 30 seconds
-        pool_recycle=1800,  # 30 minutes
+        **get_pool_options(),
     )
 
     engine.cloudsql_connector = connector
@@ -55,18 +82,57 @@ def connect_with_cloud_sql_connector() -> sqlalchemy.engine.base.Engine:
     return engine
 
 
-def connect_with_sqlite() -> sqlalchemy.engine.base.Engine:
+def connect_with_sqlite(*, read_only: bool = False) -> sqlalchemy.engine.base.Engine:
     """
     Create connection pool to local SQLite database for development.
 
+    File databases use the configured pool and are tuned on connect: WAL lets API readers run alongside the
+    generator's writes, and the busy timeout makes a writer wait for another writer instead of failing with
+    "database is locked". In-memory databases keep SQLAlchemy's default single connection pool.
+
+    Args:
+        read_only (bool): Open the database file read-only, for the read engine. Its journal mode and synchronous
+            level are left as the writer set them.
+
     Returns:
         sqlalchemy.engine.base.Engine: SQL Alchemy engine.
 
     """
-    return create_engine(
-        url=config.DB_URL,
+    url = sqlalchemy.engine.make_url(config.DB_URL)
+    if url.get_backend_name() != "sqlite":
+        # DB_URL may point the dev config at another database, e.g. the Postgres benchmarks.
+        return create_engine(url=url, echo=False, **get_pool_options())
+    if url.database in (None, "", ":memory:"):
+        return create_engine(url=url, echo=False)
+    if read_only:
+        url = url.set(database=f"file:{Path(url.database).resolve().as_posix()}", query={"mode": "ro", "uri": "true"})
+
+    engine = create_engine(
+        url=url,
         echo=False,
+        connect_args={"timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000},
+        **get_pool_options(),
     )
+    event.listen(engine, "connect", _set_sqlite_read_pragmas if read_only else _set_sqlite_pragmas)
+    return engine
+
+
+def _set_sqlite_pragmas(dbapi_connection: object, connection_record: object) -> None:
+    """Apply the configured journal mode, synchronous level, page cache and memory map to a new SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    cursor.close()
+    _set_sqlite_read_pragmas(dbapi_connection, connection_record)
+
+
+def _set_sqlite_read_pragmas(dbapi_connection: object, connection_record: object) -> None:
+    """Apply the configured page cache and memory map to a new SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    # A negative cache_size is in KiB rather than pages.
+    cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+    cursor.close()
 
 
 def get_db_engine() -> sqlalchemy.engine.base.Engine:
@@ -91,12 +157,110 @@ def get_db_engine() -> sqlalchemy.engine.base.Engine:
     return engine
 
 
+def get_db_read_engine() -> sqlalchemy.engine.base.Engine | None:
+    """
+    Creates a separate engine for read-only queries, if one is configured.
+
+    DB_READ_URL takes precedence, e.g. a read replica. In production and cloud development the Cloud SQL read
+    replica named by CLOUD_SQL_READ_INSTANCE_NAME is used. Locally a SQLite file database is opened a second time
+    read-only, unless SQLITE_READ_ONLY_ENGINE is off.
+
+    Returns:
+        sqlalchemy.engine.base.Engine | None: The read engine, or None to read through the main engine.
+
+    """
+    if config.DB_READ_URL:
+        log.info("Routing reads to DB_READ_URL.")
+        return create_engine(url=config.DB_READ_URL, echo=False, **get_pool_options())
+    if config.ENV in ("prod", "cloud_dev"):
+        read_instance = os.getenv("CLOUD_SQL_READ_INSTANCE_NAME")
+        if not read_instance:
+            return None
+        log.info("Routing reads to the Cloud SQL read replica %s.", read_instance)
+        return connect_with_cloud_sql_connector(read_instance)
+
+    url = sqlalchemy.engine.make_url(config.DB_URL)
+    if not config.SQLITE_READ_ONLY_ENGINE or url.get_backend_name() != "sqlite":
+        return None
+    if url.database in (None, "", ":memory:"):
+        return None
+    log.info("Routing reads to a read-only SQLite engine.")
+    return connect_with_sqlite(read_only=True)
+
+
+def get_engine() -> sqlalchemy.engine.base.Engine:
+    """
+    Returns the database engine, creating it and its session factory on first use.
+
+    Creating the engine lazily keeps database drivers and the Cloud SQL connector out of import time, so
+    containers start faster and importing a module never opens a connection pool.
+
+    Returns:
+        sqlalchemy.engine.base.Engine: SQL Alchemy engine.
+
+    """
+    global _engine, _session_factory, query_profiler
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = get_db_engine()
+                _session_factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+                if config.SQL_PROFILING:
+                    query_profiler = QueryProfiler(config.SQL_SLOW_QUERY_MS, explain=config.SQL_EXPLAIN_SLOW_QUERIES)
+                    query_profiler.attach(engine, _session_factory)
+                _engine = engine
+    return _engine
+
+
+def get_read_engine() -> sqlalchemy.engine.base.Engine:
+    """
+    Returns the engine for read-only queries, creating it and its session factory on first use.
+
+    This is the main engine unless get_db_read_engine() configures a separate one.
+
+    Returns:
+        sqlalchemy.engine.base.Engine: SQL Alchemy engine.
+
+    """
+    global _read_engine, _read_session_factory
+    if _read_engine is None:
+        with _read_engine_lock:
+            if _read_engine is None:
+                # The main engine is created first so the read engine is profiled too when SQL profiling is on.
+                main_engine = get_engine()
+                engine = get_db_read_engine()
+                if engine is None:
+                    engine = main_engine
+                    session_factory = _session_factory
+                else:
+                    session_factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+                    if query_profiler is not None:
+                        query_profiler.attach(engine, session_factory)
+                _read_session_factory = session_factory
+                _read_engine = engine
+    return _read_engine
+
+
+def get_session_factory() -> sessionmaker:
+    """
+    Returns the session factory bound to the database engine, creating both on first use.
+
+    Returns:
+        sessionmaker: The session factory.
+
+    """
+    get_engine()
+    return _session_factory
+
+
 @contextmanager
-def get_session():
+def get_session() -> Iterator[Session]:
     """
     Yields a SQLAlchemy database session.
 
     Changes are committed on success and rolled back on errors, session is closed on exit.
+    Inside unit_of_work() the unit of work's session is yielded instead. Changes are flushed on exit so later
+    queries see them, and are committed or rolled back with the unit of work.
 
     Yields:
         Session: A SQLAlchemy session object.
@@ -106,7 +270,13 @@ def get_session():
                    context block after rolling back the transaction.
 
     """
-    session = SessionLocal()
+    session = _unit_of_work_session.get()
+    if session is not None:
+        yield session
+        session.flush()
+        return
+
+    session = get_session_factory()()
     try:
         yield session
         session.commit()
@@ -118,24 +288,127 @@ def get_session():
         session.close()
 
 
+@contextmanager
+def get_read_session() -> Iterator[Session]:
+    """
+    Yields a SQLAlchemy session on the read engine, for queries that don't write.
+
+    Reads don't compete with generation writes for connections, and with a read replica not for the primary
+    either. A replica can lag behind the primary, so code that must see its own writes uses get_session().
+    Inside unit_of_work() the unit of work's session is yielded instead, so uncommitted writes stay visible.
+
+    Yields:
+        Session: A SQLAlchemy session object, closed on exit without committing.
+
+    """
+    session = _unit_of_work_session.get()
+    if session is not None:
+        yield session
+        return
+
+    get_read_engine()
+    session = _read_session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@contextmanager
+def unit_of_work() -> Iterator[Session]:
+    """
+    Runs every get_session() block within it on one session, connection and transaction.
+
+    The transaction is committed once on success and rolled back on errors, so everything written within the
+    unit of work is committed atomically. Nested units of work join the outer one.
+
+    Yields:
+        Session: The unit of work's session.
+
+    Raises:
+        Exception: Raises any exception that occurs within the
+                   context block after rolling back the transaction.
+
+    """
+    if _unit_of_work_session.get() is not None:
+        with get_session() as session:
+            yield session
+        return
+
+    session = get_session_factory()()
+    token = _unit_of_work_session.set(session)
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        log.exception("Unit of work failed and was undone.")
+        raise
+    finally:
+        _unit_of_work_session.reset(token)
+        session.close()
+
+
 def init_db() -> None:
     """
     Initializes the database schema.
 
     Creates all tables defined by SQLAlchemy models associated with the Base metadata.
+    Indexes added to a model after its table was created are created as well.
 
     """
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def log_query_report() -> dict | None:
+    """
+    Logs the top queries by total time if SQL profiling is enabled.
+
+    Returns:
+        dict | None: The logged report, or None if SQL profiling is disabled.
+
+    """
+    if query_profiler is None:
+        return None
+    return query_profiler.log_report(config.SQL_REPORT_TOP_N)
+
+
+def get_pool_metrics() -> dict:
+    """
+    Returns the status and wait statistics of the write and read connection pools.
+
+    Returns:
+        dict: The pool status under "write", and under "read" if reads use a separate engine, see
+            shared.db_pool.get_pool_status().
+
+    """
+    metrics = {"write": get_pool_status(get_engine())}
+    if get_read_engine() is not _engine:
+        metrics["read"] = get_pool_status(_read_engine)
+    return metrics
 
 
 def close_db() -> None:
-    """Closes the Cloud SQL connector if running in production or cloud development."""
-    if config.ENV in ("prod", "cloud_dev"):
-        connector = engine.cloudsql_connector
+    """Closes the Cloud SQL connectors if running in production or cloud development and the engines were created."""
+    if config.ENV not in ("prod", "cloud_dev"):
+        return
+    for engine in {_engine, _read_engine} - {None}:
+        connector = getattr(engine, "cloudsql_connector", None)
         if connector:
             connector.close()
 
 
 Base = declarative_base()
-engine = get_db_engine()
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+_engine: sqlalchemy.engine.base.Engine | None = None
+_session_factory: sessionmaker | None = None
+_read_engine: sqlalchemy.engine.base.Engine | None = None
+_read_session_factory: sessionmaker | None = None
+query_profiler: QueryProfiler | None = None
+# Engines are created on first use, possibly by several threads at once, e.g. API requests or upload workers, which
+# would otherwise each create an engine with its own pool and Cloud SQL connector.
+_engine_lock = threading.Lock()
+_read_engine_lock = threading.Lock()
@@ -1,24 +1,29 @@
-from dataclasses import dataclass
-from datetime import datetime, timezone
+from array import array
+from collections.abc import Iterable, Iterator
+from datetime import date, datetime, timezone
+from itertools import islice
+from typing import NamedTuple
 
 from sqlalchemy import (
     DECIMAL,
     Boolean,
+    Date,
     DateTime,
     Float,
     ForeignKeyConstraint,
+    Index,
     Integer,
+    LargeBinary,
     Numeric,
     PrimaryKeyConstraint,
     Text,
 )
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.orm import InstrumentedAttribute, Mapped, mapped_column
 
 from shared.db_connection import Base
 
 
-@dataclass
-class Product:
+class Product(NamedTuple):
     item_sku: str
     item_price: float
     release_date: datetime
@@ -28,8 +33,7 @@ class Product:
     item_popularity: float
 
 
-@dataclass
-class User:
+class User(NamedTuple):
     user_id: int
     user_name: str
     user_address: str
@@ -38,8 +42,7 @@ class User:
     date_created: datetime
 
 
-@dataclass
-class Order:
+class Order(NamedTuple):
     order_line_id: int
     order_id: int
     user_id: int
@@ -49,9 +52,108 @@ class Order:
     date_created: datetime
 
 
+class RecordBatch:
+    """
+    Column oriented container for many records of the same type.
+
+    Numeric columns listed in typecodes are stored in compact arrays, all other columns in lists, so a large batch
+    holds one list per column instead of one object per row.
+
+    Attributes:
+        record (type): The record named tuple, its fields define the columns.
+        columns (dict[str, list | array]): The column values keyed by field name.
+
+    """
+
+    def __init__(self, record: type, typecodes: dict[str, str] | None = None, rows: Iterable[tuple] = ()) -> None:
+        typecodes = typecodes or {}
+        self.record = record
+        self.names = record._fields
+        self.columns = {name: array(typecodes[name]) if name in typecodes else [] for name in self.names}
+        self.extend(rows)
+
+    def __len__(self) -> int:
+        return len(self.columns[self.names[0]])
+
+    def __iter__(self) -> Iterator[tuple]:
+        return map(self.record._make, self.rows())
+
+    def append(self, **values: object) -> None:
+        """
+        Append a row.
+
+        Args:
+            **values (object): A value for every column.
+
+        """
+        for name in self.names:
+            self.columns[name].append(values[name])
+
+    def extend(self, rows: Iterable[tuple]) -> None:
+        """
+        Append rows given as tuples in column order, such as query result rows.
+
+        Args:
+            rows (Iterable[tuple]): The rows to append.
+
+        """
+        columns = list(self.columns.values())
+        for row in rows:
+            for column, value in zip(columns, row, strict=True):
+                column.append(value)
+
+    def rows(self, start: int = 0, stop: int | None = None) -> Iterator[tuple]:
+        """
+        Iterate over rows as plain tuples in column order.
+
+        Args:
+            start (int): Index of the first row.
+            stop (int | None): Index after the last row, None for all remaining rows.
+
+        Returns:
+            Iterator[tuple]: The rows.
+
+        """
+        return islice(zip(*self.columns.values(), strict=True), start, stop)
+
+    def records(self, start: int = 0, stop: int | None = None) -> list:
+        """
+        Get rows as records.
+
+        Args:
+            start (int): Index of the first row.
+            stop (int | None): Index after the last row, None for all remaining rows.
+
+        Returns:
+            list: Record instances.
+
+        """
+        return list(map(self.record._make, self.rows(start, stop)))
+
+
+def record_columns(record: type, model: type) -> list[InstrumentedAttribute]:
+    """
+    Get the model columns matching the fields of a record, in field order.
+
+    Querying these columns returns rows that can be converted with record._make(row), skipping ORM object loading.
+
+    Args:
+        record (type): The record named tuple.
+        model (type): The SQLAlchemy model to select from.
+
+    Returns:
+        list[InstrumentedAttribute]: The model columns in record field order.
+
+    """
+    return [getattr(model, name) for name in record._fields]
+
+
 class ProductsModel(Base):
     __tablename__ = "products"
-    __table_args__ = (PrimaryKeyConstraint("item_sku", name="products_pkey"),)
+    __table_args__ = (
+        PrimaryKeyConstraint("item_sku", name="products_pkey"),
+        Index("products_date_updated_idx", "date_updated", "item_sku"),
+    )
     item_sku: Mapped[str] = mapped_column(Text, primary_key=True)
     item_price: Mapped[float] = mapped_column(Numeric(12, 2))
     release_date: Mapped[datetime] = mapped_column(DateTime)
@@ -62,10 +164,10 @@ class ProductsModel(Base):
 
     def to_plain(self) -> Product:
         """
-        Convert a ProductsModel instance into a plain Product dataclass object.
+        Convert a ProductsModel instance into a plain Product record.
 
         Returns:
-            Product: A plain data dataclass object with the same field values as the ProductsModel instance.
+            Product: A plain record with the same field values as the ProductsModel instance.
 
         """
         return Product(
@@ -81,6 +183,7 @@ class ProductsModel(Base):
 
 class UsersModel(Base):
     __tablename__ = "users"
+    __table_args__ = (Index("users_date_created_idx", "date_created"),)
     user_id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True)
     user_name: Mapped[str] = mapped_column(Text)
     user_address: Mapped[str] = mapped_column(Text)
@@ -90,10 +193,10 @@ class UsersModel(Base):
 
     def to_plain(self) -> User:
         """
-        Convert a UsersModel instance into a plain User dataclass object.
+        Convert a UsersModel instance into a plain User record.
 
         Returns:
-            User: A plain data dataclass object with the same field values as the UsersModel instance.
+            User: A plain record with the same field values as the UsersModel instance.
 
         """
         return User(
@@ -114,13 +217,14 @@ class OrdersModel(Base):
             ["users.user_id"],
             name="orders_user_id_fkey",
         ),
+        Index("orders_user_id_idx", "user_id"),
     )
     order_line_id: Mapped[int] = mapped_column(
         Integer,
         autoincrement=True,
         primary_key=True,
     )
-    order_id: Mapped[int] = mapped_column(Integer)
+    order_id: Mapped[int] = mapped_column(Integer, index=True)
     user_id: Mapped[int] = mapped_column(Integer)
     item_sku: Mapped[str] = mapped_column(Text)
     qty: Mapped[int] = mapped_column(Integer)
@@ -129,10 +233,10 @@ class OrdersModel(Base):
 
     def to_plain(self) -> Order:
         """
-        Convert a OrdersModel instance into a plain Order dataclass object.
+        Convert a OrdersModel instance into a plain Order record.
 
         Returns:
-            Order: A plain data dataclass object with the same field values as the OrdersModel instance.
+            Order: A plain record with the same field values as the OrdersModel instance.
 
         """
         return Order(
@@ -144,3 +248,71 @@ class OrdersModel(Base):
             item_price=self.item_price,
             date_created=self.date_created,
         )
+
+
+class DailySalesModel(Base):
+    __tablename__ = "daily_sales"
+    sales_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    num_orders: Mapped[int] = mapped_column(Integer, default=0)
+    num_order_lines: Mapped[int] = mapped_column(Integer, default=0)
+    units: Mapped[int] = mapped_column(Integer, default=0)
+    revenue: Mapped[float] = mapped_column(DECIMAL(14, 2), default=0)
+    new_customers: Mapped[int] = mapped_column(Integer, default=0)
+    returning_customers: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class DailySkuSalesModel(Base):
+    __tablename__ = "daily_sku_sales"
+    __table_args__ = (PrimaryKeyConstraint("sales_date", "item_sku", name="daily_sku_sales_pkey"),)
+    sales_date: Mapped[date] = mapped_column(Date)
+    item_sku: Mapped[str] = mapped_column(Text)
+    num_orders: Mapped[int] = mapped_column(Integer, default=0)
+    units: Mapped[int] = mapped_column(Integer, default=0)
+    revenue: Mapped[float] = mapped_column(DECIMAL(14, 2), default=0)
+
+
+class DailyCountrySalesModel(Base):
+    __tablename__ = "daily_country_sales"
+    __table_args__ = (PrimaryKeyConstraint("sales_date", "user_country", name="daily_country_sales_pkey"),)
+    sales_date: Mapped[date] = mapped_column(Date)
+    user_country: Mapped[str] = mapped_column(Text)
+    num_orders: Mapped[int] = mapped_column(Integer, default=0)
+    units: Mapped[int] = mapped_column(Integer, default=0)
+    revenue: Mapped[float] = mapped_column(DECIMAL(14, 2), default=0)
+
+
+class IdAllocatorModel(Base):
+    __tablename__ = "id_allocators"
+    name: Mapped[str] = mapped_column(Text, primary_key=True)
+    next_id: Mapped[int] = mapped_column(Integer)
+
+
+class RunSequenceModel(Base):
+    __tablename__ = "run_sequences"
+    run_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    next_day: Mapped[date | None] = mapped_column(Date, nullable=True)
+    failed: Mapped[bool] = mapped_column(Boolean, default=False)
+    date_updated: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class ExportWatermarkModel(Base):
+    __tablename__ = "export_watermarks"
+    table_name: Mapped[str] = mapped_column(Text, primary_key=True)
+    last_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    last_date_updated: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_key: Mapped[str | None] = mapped_column(Text, nullable=True)
+    date_exported: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class PopularitySnapshotModel(Base):
+    __tablename__ = "popularity_snapshots"
+    name: Mapped[str] = mapped_column(Text, primary_key=True)
+    catalogue_version: Mapped[int] = mapped_column(Integer)
+    built_version: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    num_products: Mapped[int] = mapped_column(Integer, default=0)
+    skus: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    prices: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    popularities: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    release_dates: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    dates_created: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    date_built: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,104 @@
+import threading
+import time
+from dataclasses import asdict, dataclass, replace
+
+import sqlalchemy
+from sqlalchemy.pool import ConnectionPoolEntry, QueuePool
+
+
+@dataclass
+class PoolWaitStats:
+    """
+    Time spent waiting for connections from a pool.
+
+    Attributes:
+        checkouts (int): Connections handed out.
+        timeouts (int): Checkouts that gave up after the pool timeout.
+        total_wait_ms (float): Total time spent waiting in checkouts, including opening new connections.
+        max_wait_ms (float): Longest single wait.
+
+    """
+
+    checkouts: int = 0
+    timeouts: int = 0
+    total_wait_ms: float = 0.0
+    max_wait_ms: float = 0.0
+
+
+class MonitoredQueuePool(QueuePool):
+    """
+    A QueuePool that records how long each checkout waits for a connection.
+
+    Pass it as create_engine(poolclass=MonitoredQueuePool). A wait beyond a few milliseconds means every pooled and
+    overflow connection was in use, i.e. the pool is too small for the concurrency it's serving.
+
+    Attributes:
+        wait_stats (PoolWaitStats): Wait statistics since the pool was created.
+
+    """
+
+    # SQLAlchemy names pool loggers after their class's module, which would put this one outside the "sqlalchemy"
+    # logger and log every checkout and return whenever the application logs at DEBUG.
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.MonitoredQueuePool"
+
+    def __init__(self, *args: object, **kwargs: object) -> None:
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except sqlalchemy.exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            wait_ms = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                stats = self.wait_stats
+                if timed_out:
+                    stats.timeouts += 1
+                else:
+                    stats.checkouts += 1
+                stats.total_wait_ms += wait_ms
+                stats.max_wait_ms = max(stats.max_wait_ms, wait_ms)
+
+    def get_wait_stats(self) -> PoolWaitStats:
+        """Returns a consistent copy of the wait statistics."""
+        with self._stats_lock:
+            return replace(self.wait_stats)
+
+
+def get_pool_status(engine: sqlalchemy.engine.base.Engine) -> dict:
+    """
+    Describe an engine's connection pool, with its wait statistics if it's a MonitoredQueuePool.
+
+    Args:
+        engine (sqlalchemy.engine.base.Engine): The engine whose pool to describe.
+
+    Returns:
+        dict: The pool class, its size, checked in, checked out and overflow connections, timeout, and wait
+            statistics, as far as the pool class supports them.
+
+    """
+    pool = engine.pool
+    status: dict = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            timeout_seconds=pool.timeout(),
+        )
+    if isinstance(pool, MonitoredQueuePool):
+        wait_stats = asdict(pool.get_wait_stats())
+        wait_stats["total_wait_ms"] = round(wait_stats["total_wait_ms"], 3)
+        wait_stats["max_wait_ms"] = round(wait_stats["max_wait_ms"], 3)
+        wait_stats["avg_wait_ms"] = (
+            round(wait_stats["total_wait_ms"] / wait_stats["checkouts"], 3) if wait_stats["checkouts"] else 0.0
+        )
+        status["waits"] = wait_stats
+    return status
@@ -0,0 +1,208 @@
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+from shared.logger import get_logger
+
+log = get_logger(__name__)
+
+MAX_STATEMENT_LENGTH = 500
+
+
+@dataclass
+class QueryStats:
+    """
+    Aggregated execution statistics for one SQL statement.
+
+    Attributes:
+        statement (str): The SQL text, with parameter placeholders.
+        calls (int): Number of executions.
+        total_ms (float): Total execution time in milliseconds.
+        max_ms (float): Slowest execution time in milliseconds.
+
+    """
+
+    statement: str
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+
+class QueryProfiler:
+    """
+    Times every statement executed by an engine using SQLAlchemy event hooks.
+
+    Statements slower than slow_query_ms are logged as warnings, optionally with their query plan.
+    Statements are also counted per session.
+
+    Attributes:
+        slow_query_ms (float): The slow query threshold in milliseconds.
+        explain (bool): Whether to capture the query plan of slow queries.
+        stats (dict[str, QueryStats]): Statistics keyed by statement text.
+        session_statements (Counter): Number of statements executed by each session.
+
+    """
+
+    def __init__(self, slow_query_ms: float, *, explain: bool = False) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.explain = explain
+        self.stats: dict[str, QueryStats] = {}
+        self.session_statements: Counter = Counter()
+
+    def attach(self, engine: sqlalchemy.engine.base.Engine, session_factory: sessionmaker | None = None) -> None:
+        """
+        Register the profiling hooks on an engine and, optionally, the sessions it creates.
+
+        Args:
+            engine (sqlalchemy.engine.base.Engine): The engine to profile.
+            session_factory (sessionmaker | None): The session factory whose sessions statements are counted for.
+
+        """
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+        if session_factory is not None:
+            event.listen(session_factory, "after_begin", self._after_begin)
+            event.listen(engine, "commit", self._end_session_transaction)
+            event.listen(engine, "rollback", self._end_session_transaction)
+        log.info(
+            "SQL profiling enabled: slow_query_ms=%s, explain=%s.",
+            self.slow_query_ms,
+            self.explain,
+        )
+
+    def _after_begin(self, session: Session, transaction: object, connection: sqlalchemy.Connection) -> None:
+        connection.info["profiler_session_id"] = id(session)
+
+    def _end_session_transaction(self, conn: sqlalchemy.Connection) -> None:
+        # Connection.info belongs to the pooled DBAPI connection, so clear the session before it's checked in and
+        # statements from whoever checks it out next are counted against it.
+        conn.info.pop("profiler_session_id", None)
+
+    def _before_cursor_execute(
+        self,
+        conn: sqlalchemy.Connection,
+        cursor: object,
+        statement: str,
+        parameters: object,
+        context: object,
+        executemany: bool,
+    ) -> None:
+        conn.info.setdefault("profiler_start_times", []).append(time.perf_counter())
+
+    def _after_cursor_execute(
+        self,
+        conn: sqlalchemy.Connection,
+        cursor: object,
+        statement: str,
+        parameters: object,
+        context: object,
+        executemany: bool,
+    ) -> None:
+        elapsed_ms = (time.perf_counter() - conn.info["profiler_start_times"].pop()) * 1000
+
+        stats = self.stats.get(statement)
+        if stats is None:
+            stats = self.stats[statement] = QueryStats(statement=statement)
+        stats.calls += 1
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+        session_id = conn.info.get("profiler_session_id")
+        if session_id is not None:
+            self.session_statements[session_id] += 1
+
+        if elapsed_ms >= self.slow_query_ms:
+            plan = self._explain(conn, statement, parameters) if self.explain and not executemany else None
+            log.warning(
+                "Slow query took %.1fms: %s%s",
+                elapsed_ms,
+                statement[:MAX_STATEMENT_LENGTH],
+                f"\nQuery plan:\n{plan}" if plan else "",
+            )
+
+    def _handle_error(self, context: sqlalchemy.engine.ExceptionContext) -> None:
+        # A failed statement never reaches after_cursor_execute, so drop the start time it saved.
+        if context.connection is None or context.execution_context is None:
+            return
+        start_times = context.connection.info.get("profiler_start_times")
+        if start_times:
+            start_times.pop()
+
+    def _explain(self, conn: sqlalchemy.Connection, statement: str, parameters: object) -> str | None:
+        """
+        Capture the query plan of a statement on the connection that executed it.
+
+        The plan is fetched with a raw DBAPI cursor so the EXPLAIN statement doesn't trigger the profiling hooks.
+        Neither EXPLAIN nor EXPLAIN QUERY PLAN execute the statement.
+
+        Args:
+            conn (sqlalchemy.Connection): The connection the statement was executed on.
+            statement (str): The SQL text in the driver's parameter style.
+            parameters (object): The statement parameters.
+
+        Returns:
+            str | None: The query plan, or None if it couldn't be captured.
+
+        """
+        prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+        try:
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(prefix + statement, parameters)
+                return "\n".join(" | ".join(str(value) for value in row) for row in cursor.fetchall())
+            finally:
+                cursor.close()
+        except Exception:
+            log.debug("Could not capture query plan.", exc_info=True)
+            return None
+
+    def report(self, top_n: int = 10) -> dict:
+        """
+        Summarise the statements executed so far.
+
+        Args:
+            top_n (int): Number of statements to include, ordered by total time.
+
+        Returns:
+            dict: Statement and session counts and the top statements by total time.
+
+        """
+        top_queries = sorted(self.stats.values(), key=lambda stats: stats.total_ms, reverse=True)[:top_n]
+        return {
+            "statements": sum(stats.calls for stats in self.stats.values()),
+            "distinct_statements": len(self.stats),
+            "total_ms": round(sum(stats.total_ms for stats in self.stats.values()), 2),
+            "sessions": len(self.session_statements),
+            "max_statements_per_session": max(self.session_statements.values(), default=0),
+            "top_queries": [
+                {
+                    "statement": stats.statement[:MAX_STATEMENT_LENGTH],
+                    "calls": stats.calls,
+                    "total_ms": round(stats.total_ms, 2),
+                    "mean_ms": round(stats.total_ms / stats.calls, 2),
+                    "max_ms": round(stats.max_ms, 2),
+                }
+                for stats in top_queries
+            ],
+        }
+
+    def log_report(self, top_n: int = 10) -> dict:
+        """
+        Log the query report as one structured record.
+
+        Args:
+            top_n (int): Number of statements to include, ordered by total time.
+
+        Returns:
+            dict: The logged report.
+
+        """
+        report = self.report(top_n)
+        log.info("SQL query report: %s", json.dumps(report), extra={"json_fields": report})
+        return report
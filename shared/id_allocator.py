@@ -0,0 +1,62 @@
+from sqlalchemy import Connection, Select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from shared.db_connection import get_engine, get_session
+from shared.db_models import IdAllocatorModel
+from shared.logger import get_logger
+
+log = get_logger(__name__)
+
+
+def reserve_ids(name: str, count: int, last_id_query: Select) -> int:
+    """
+    Reserve a block of consecutive IDs from the central allocator table.
+
+    Each named counter is one row in id_allocators. Reserving a block is a single UPDATE ... RETURNING round
+    trip that increments it under a row lock, so concurrent workers are always handed disjoint blocks. A counter
+    is created on first use, continuing after the highest existing ID.
+
+    On Postgres the reservation is committed on its own connection, so the counter row isn't locked for the rest
+    of a worker's unit of work. SQLite only has one writer at a time, so it runs in the current session instead.
+
+    Args:
+        name (str): The counter name, e.g. 'orders.order_id'.
+        count (int): Number of IDs to reserve.
+        last_id_query (Select): Query returning the highest ID in use, used to create the counter.
+
+    Returns:
+        int: The first reserved ID.
+
+    """
+    engine = get_engine()
+    if engine.dialect.name == "sqlite":
+        with get_session() as db:
+            return _reserve_ids(db.connection(), name, count, last_id_query)
+
+    with engine.begin() as conn:
+        return _reserve_ids(conn, name, count, last_id_query)
+
+
+def _reserve_ids(conn: Connection, name: str, count: int, last_id_query: Select) -> int:
+    first_id = _increment(conn, name, count)
+    if first_id is None:
+        last_id = conn.execute(last_id_query).scalar() or 0
+        dialect_insert = sqlite_insert if conn.dialect.name == "sqlite" else postgresql_insert
+        conn.execute(
+            dialect_insert(IdAllocatorModel).values(name=name, next_id=last_id + 1).on_conflict_do_nothing(),
+        )
+        log.debug("Created ID allocator %s starting at %s.", name, last_id + 1)
+        first_id = _increment(conn, name, count)
+    log.debug("Reserved %s %s IDs from %s.", count, name, first_id)
+    return first_id
+
+
+def _increment(conn: Connection, name: str, count: int) -> int | None:
+    next_id = conn.execute(
+        update(IdAllocatorModel)
+        .where(IdAllocatorModel.name == name)
+        .values(next_id=IdAllocatorModel.next_id + count)
+        .returning(IdAllocatorModel.next_id),
+    ).scalar_one_or_none()
+    return None if next_id is None else next_id - count
@@ -1,7 +1,11 @@
+import atexit
+import copy
 import logging
+import queue
+import threading
 from logging import Logger
+from logging.handlers import QueueHandler
 
-import google.cloud.logging
 from dotenv import load_dotenv
 
 from shared.config import get_config
@@ -9,6 +13,101 @@ from shared.config import get_config
 load_dotenv()
 config = get_config()
 
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+# Loggers used by the cloud logging transport, logging them through the root logger would recurse.
+EXCLUDED_LOGGERS = ("google.cloud", "google.auth", "google_auth_httplib2", "urllib3")
+
+_listener: "BatchQueueListener | None" = None
+
+
+class ThreadQueueHandler(QueueHandler):
+    """
+    A queue handler for a listener thread in the same process.
+
+    QueueHandler formats records into text and drops their exception info so they can be pickled for another
+    process. A listener thread in the same process can use the exception info, so only the message is rendered
+    before queueing: in the calling thread, before mutable args can change and so side effects of their __str__,
+    such as database queries, don't run on the listener thread.
+
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """A stream handler that doesn't flush after every record, BatchQueueListener flushes it once per batch."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class BatchQueueListener:
+    """
+    A listener thread that takes records off a queue in batches and flushes its handlers once per batch.
+
+    Records are passed to each handler whose level they meet, like QueueListener(respect_handler_level=True).
+
+    Attributes:
+        log_queue (queue.SimpleQueue): The queue ThreadQueueHandler puts records on.
+        handlers (tuple[logging.Handler, ...]): The handlers records are passed to.
+        batch_size (int): Maximum number of records handled between flushes.
+
+    """
+
+    _STOP = object()
+
+    def __init__(self, log_queue: queue.SimpleQueue, *handlers: logging.Handler, batch_size: int = 100) -> None:
+        self.log_queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start the listener thread."""
+        self._thread = threading.Thread(target=self._drain, name="log-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Handle every record already on the queue, then stop the listener thread."""
+        if self._thread is None:
+            return
+        self.log_queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    def handle(self, record: logging.LogRecord) -> None:
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _drain(self) -> None:
+        while True:
+            batch = [self.log_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.log_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopped = False
+            for record in batch:
+                if record is self._STOP:
+                    stopped = True
+                    break
+                self.handle(record)
+            for handler in self.handlers:
+                handler.flush()
+            if stopped:
+                return
+
 
 def setup_logging() -> None:
     """
@@ -17,18 +116,52 @@ def setup_logging() -> None:
     Initializes a Google Cloud Logging client and attaches a handler to the root python logger if cloud logging is enabled
     else configures standard Python logging to output to the console with a formatted message.
 
+    With ASYNC_LOGGING the root logger only puts records on a queue and a listener thread formats and ships them
+    in batches, so log I/O never blocks the logging thread. The queue is drained when the process exits.
+
     """
-    if config.USE_CLOUD_LOGGING:
+    global _listener
+    level = getattr(logging, config.LOG_LEVEL)
+
+    if config.ASYNC_LOGGING:
+        if config.USE_CLOUD_LOGGING:
+            # Imported here so environments without cloud logging don't pay for the import at startup.
+            import google.cloud.logging
+
+            handler = google.cloud.logging.Client(_use_grpc=False).get_default_handler()
+            for name in EXCLUDED_LOGGERS:
+                excluded_logger = logging.getLogger(name)
+                excluded_logger.propagate = False
+                excluded_logger.addHandler(logging.StreamHandler())
+        else:
+            handler = BatchStreamHandler()
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        log_queue = queue.SimpleQueue()
+        root_logger = logging.getLogger()
+        root_logger.setLevel(level)
+        root_logger.addHandler(ThreadQueueHandler(log_queue))
+        _listener = BatchQueueListener(log_queue, handler, batch_size=config.LOG_BATCH_SIZE)
+        _listener.start()
+        atexit.register(stop_logging)
+    elif config.USE_CLOUD_LOGGING:
+        import google.cloud.logging
+
         client = google.cloud.logging.Client(_use_grpc=False)
-        client.setup_logging(log_level=getattr(logging, config.LOG_LEVEL))
+        client.setup_logging(log_level=level)
     else:
-        logging.basicConfig(
-            level=getattr(logging, config.LOG_LEVEL),
-            format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-        )
+        logging.basicConfig(level=level, format=LOG_FORMAT)
     logging.getLogger("faker").setLevel(logging.WARNING)
 
 
+def stop_logging() -> None:
+    """Stop the async logging listener, handling every record still on the queue."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def get_logger(name: str) -> Logger:
     """
     Creates and returns a named logger with configured log level.
@@ -0,0 +1,168 @@
+import json
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from shared.logger import get_logger
+
+log = get_logger(__name__)
+
+
+@dataclass
+class Stage:
+    """
+    The timing of one execution of a pipeline stage.
+
+    Attributes:
+        name (str): The stage name, dotted by component, e.g. 'orders.generate_lines'.
+        seconds (float): The duration of the stage.
+        rows (int | None): The number of rows the stage processed, if known.
+
+    """
+
+    name: str
+    seconds: float = 0.0
+    rows: int | None = None
+
+
+class RunMetrics:
+    """
+    Collects stage timings and counters for one run and summarises them.
+
+    Attributes:
+        stages (list[Stage]): Every completed stage, in completion order.
+        counters (Counter): Named counters.
+
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: list[Stage] = []
+        self.counters: Counter = Counter()
+
+    @contextmanager
+    def stage(self, name: str, rows: int | None = None) -> Iterator[Stage]:
+        """
+        Time a block of code as a named stage.
+
+        The row count can be passed up front or set on the yielded Stage once it is known.
+
+        Args:
+            name (str): The stage name.
+            rows (int | None): The number of rows the stage processes.
+
+        Yields:
+            Stage: The stage being timed.
+
+        """
+        current = Stage(name=name, rows=rows)
+        start = time.perf_counter()
+        try:
+            yield current
+        finally:
+            current.seconds = time.perf_counter() - start
+            self.stages.append(current)
+            log.debug("Stage %s took %.3fs, rows=%s.", name, current.seconds, current.rows)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """
+        Increment a named counter.
+
+        Args:
+            name (str): The counter name.
+            value (int): The amount to add.
+
+        """
+        self.counters[name] += value
+
+    def summary(self) -> dict:
+        """
+        Summarise the run, aggregating repeated stages by name.
+
+        Returns:
+            dict: Total duration, counters and per-stage calls, seconds, rows and rows/sec.
+
+        """
+        stages: dict[str, dict] = {}
+        for current in self.stages:
+            totals = stages.setdefault(current.name, {"calls": 0, "seconds": 0.0, "rows": None})
+            totals["calls"] += 1
+            totals["seconds"] += current.seconds
+            if current.rows is not None:
+                totals["rows"] = (totals["rows"] or 0) + current.rows
+
+        for totals in stages.values():
+            totals["rows_per_sec"] = (
+                round(totals["rows"] / totals["seconds"], 2) if totals["rows"] and totals["seconds"] > 0 else None
+            )
+            totals["seconds"] = round(totals["seconds"], 4)
+
+        return {
+            "duration_seconds": round(time.perf_counter() - self.started, 4),
+            "counters": dict(self.counters),
+            "stages": stages,
+        }
+
+
+_run = RunMetrics()
+
+
+def start_run() -> RunMetrics:
+    """
+    Start collecting metrics for a new run, discarding any previous ones.
+
+    Returns:
+        RunMetrics: The collector for the new run.
+
+    """
+    global _run
+    _run = RunMetrics()
+    return _run
+
+
+def stage(name: str, rows: int | None = None) -> Iterator[Stage]:
+    """
+    Time a block of code as a named stage of the current run.
+
+    Args:
+        name (str): The stage name.
+        rows (int | None): The number of rows the stage processes.
+
+    Returns:
+        Iterator[Stage]: A context manager yielding the stage being timed.
+
+    """
+    return _run.stage(name, rows)
+
+
+def count(name: str, value: int = 1) -> None:
+    """
+    Increment a named counter of the current run.
+
+    Args:
+        name (str): The counter name.
+        value (int): The amount to add.
+
+    """
+    _run.count(name, value)
+
+
+def emit_summary(run_name: str) -> dict:
+    """
+    Log one structured summary record for the current run.
+
+    The summary is attached as json_fields so Cloud Logging stores it in the entry's jsonPayload, where every
+    field can be indexed and queried. It is also included in the message for console logging.
+
+    Args:
+        run_name (str): The name of the run, e.g. 'data_generator'.
+
+    Returns:
+        dict: The logged summary.
+
+    """
+    summary = {"run": run_name, **_run.summary()}
+    log.info("Run summary: %s", json.dumps(summary), extra={"json_fields": summary})
+    return summary